@@ -1,6 +1,56 @@
 """instapy: image filters in Python"""
 
 import importlib
+import importlib.util
+import os
+from pathlib import Path
+from typing import List
+
+# the filter implementations
+implementations = ["python", "bytes", "numpy", "numba", "cython", "parallel"]
+
+# the colour filters, see `instapy.spatial` and `instapy.levels` for the others
+colour_filters = ("color2gray", "color2sepia")
+
+
+def installed_implementations() -> List[str]:
+    """Return the implementations whose module is installed
+
+    The modules are found without importing them (or numpy), so this is
+    cheap enough for building the command-line options. The cython
+    implementation is only found once compiled. An implementation found
+    here may still fail to import, if e.g. numba is not installed.
+    """
+    return [
+        implementation
+        for implementation in implementations
+        if importlib.util.find_spec(f"instapy.{implementation}_filters") is not None
+    ]
+
+
+def filter_names() -> List[str]:
+    """Return the names of every filter: colour, spatial and contrast
+
+    Not every implementation has every filter, see `get_filter`.
+    """
+    from . import levels, spatial
+
+    return [*colour_filters, *spatial.filters, *levels.filters]
+
+
+def user_cache_dir() -> Path:
+    """Return the directory for instapy's per-user cache files
+
+    Uses $INSTAPY_CACHE_DIR if set, otherwise `instapy` in $XDG_CACHE_HOME
+    (default ~/.cache). The directory is created if it does not exist.
+    """
+    path = os.environ.get("INSTAPY_CACHE_DIR")
+    if not path:
+        cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+        path = Path(cache_home) / "instapy"
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
 
 
 def get_filter(filter: str = "color2gray", implementation: str = "python"):
@@ -13,19 +63,45 @@ def get_filter(filter: str = "color2gray", implementation: str = "python"):
         filter (str):
             The name of the filter ('color2gray' or 'color2sepia')
         implementation (str):
-            The name of the implementation (python, cython, etc.)
+            The name of the implementation (python, cython, etc.),
+            or 'auto' to pick the fastest one for each image
 
     Returns:
         filter_function (function):
             The filter function, which should take an image
-            (a 3D numpy array of uint8)
+            (a numpy array of uint8, see `instapy.channels`
+            for the supported layouts)
             and return the filtered image
-            (numpy array of same shape and type as input)
+            (rgb, with alpha if the input has it, of the same type as input)
+
+    Raises:
+        ImportError: if the implementation is not available
+        AttributeError: if the implementation does not have the filter
     """
 
+    if implementation == "auto":
+        from .autotune import auto_filter
+
+        return auto_filter(filter)
+
     # get the module (instapy.python_filters)
     module = importlib.import_module(f"instapy.{implementation}_filters")
     # construct filter function name (python_color2gray)
     filter_name = f"{implementation}_{filter}"
     # return the resolved function (instapy.python.python_color2gray)
-    return getattr(module, filter_name)
+    try:
+        return getattr(module, filter_name)
+    except AttributeError:
+        # e.g. the spatial filters, which the bytes backend does not have
+        raise AttributeError(
+            f"the {implementation} implementation has no {filter} filter"
+        ) from None
+
+
+def __getattr__(name: str):
+    """Import `compose` on first use, to keep `import instapy` light"""
+    if name == "compose":
+        from .pipeline import compose
+
+        return compose
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
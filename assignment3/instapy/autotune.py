@@ -0,0 +1,146 @@
+"""Automatic selection of the fastest filter implementation
+
+The first time a filter is run on an image of a given size (and value type,
+channels and filter parameters), every available implementation is timed
+on that image, and the fastest is remembered in a
+per-user cache file. Later calls, also from other processes, dispatch
+straight to the remembered implementation.
+"""
+
+import json
+import os
+import tempfile
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+import instapy
+from .timing import time_one
+
+cache_filename = "autotune.json"
+
+
+def size_bucket(image: np.array) -> int:
+    """Return the size bucket of an image
+
+    Images are bucketed by their number of pixels, rounded down
+    to a power of two, so e.g. all images between 0.5 and 1 megapixels
+    share a bucket.
+    """
+    return max(image.shape[0] * image.shape[1], 1).bit_length()
+
+
+def cache_key(filter: str, image: np.array, *args, **kwargs) -> str:
+    """Return the key of the calibration for a filter call
+
+    Calls share a calibration if their images are in the same size bucket,
+    with the same value type and number of channels, and the filter
+    parameters are the same, since e.g. the blur radius can change which
+    implementation is fastest. The number of cores is included too.
+    """
+    channels = image.shape[2] if image.ndim == 3 else 1
+    params = json.dumps([args, kwargs], sort_keys=True, default=str)
+    return (
+        f"{filter}/{size_bucket(image)}/{image.dtype.name}x{channels}"
+        f"/{params}/{os.cpu_count()}"
+    )
+
+
+def available_implementations(filter: str) -> Dict[str, Callable]:
+    """Return the implementations of `filter` which can be imported
+
+    The pure Python implementations are only included if no other
+    implementation is available, since they are always by far the slowest,
+    and calibrating them on a large image would take seconds to minutes.
+    """
+    filters = {}
+    for implementation in instapy.implementations:
+        try:
+            filters[implementation] = instapy.get_filter(filter, implementation)
+        except (ImportError, AttributeError):
+            # not built (cython) or filter not implemented by this backend
+            continue
+    pure_python = {"python", "bytes"}
+    if set(filters) - pure_python:
+        for implementation in pure_python:
+            filters.pop(implementation, None)
+    if not filters:
+        raise ValueError(f"No implementation of {filter!r} is available")
+    return filters
+
+
+def calibrate(
+    filters: Dict[str, Callable], image: np.array, *args, calls: int = 3, **kwargs
+) -> Dict[str, float]:
+    """Time every implementation on an image
+
+    Each implementation is called once before timing,
+    so that e.g. numba compilation is not included.
+
+    Returns:
+        times (dict):
+            The best time (in seconds) of `calls` calls for each implementation
+    """
+    times = {}
+    for implementation, filter_function in filters.items():
+        run = partial(filter_function, image, *args, **kwargs)
+        run()
+        times[implementation] = min(time_one(run, calls=1) for _ in range(calls))
+    return times
+
+
+def _load(path: Path) -> Dict:
+    try:
+        with path.open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # missing or corrupt cache, start over
+        return {}
+
+
+def _save(path: Path, results: Dict) -> None:
+    # write to a temporary file and rename,
+    # so concurrent processes never read a half-written cache
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def auto_filter(filter: str, cache_file: Optional[Path] = None) -> Callable:
+    """Return a filter function dispatching to the fastest implementation
+
+    Args:
+        filter (str):
+            The name of the filter
+        cache_file (Path, optional):
+            Where to store calibration results.
+            Default: autotune.json in `instapy.user_cache_dir()`
+    Returns:
+        filter_function (function):
+            Filter taking the same arguments as the implementations
+    """
+    filters = available_implementations(filter)
+    if cache_file is None:
+        cache_file = instapy.user_cache_dir() / cache_filename
+    cache_file = Path(cache_file)
+    choices = {}
+
+    def filter_function(image: np.array, *args, **kwargs) -> np.array:
+        key = cache_key(filter, image, *args, **kwargs)
+        if key not in choices:
+            results = _load(cache_file)
+            if key in results and results[key]["implementation"] in filters:
+                choices[key] = results[key]["implementation"]
+            else:
+                times = calibrate(filters, image, *args, **kwargs)
+                choices[key] = min(times, key=times.get)
+                results[key] = {"implementation": choices[key], "times": times}
+                _save(cache_file, results)
+        return filters[choices[key]](image, *args, **kwargs)
+
+    filter_function.__name__ = f"auto_{filter}"
+    filter_function.__doc__ = f"Run {filter} with the fastest implementation"
+    return filter_function
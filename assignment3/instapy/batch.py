@@ -0,0 +1,258 @@
+"""Pipelined batch filtering of many image files
+
+Decoding, filtering and encoding run as three stages, each with its own
+pool of worker threads, connected by bounded queues. PIL and numpy release
+the GIL for most of their work, so the stages overlap, and the throughput
+approaches that of the slowest stage rather than the sum of all three.
+"""
+
+import queue
+import threading
+import time
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import instapy
+from . import io
+
+# marks the end of the work in a queue
+_done = object()
+
+
+class Stage:
+    """One pipeline stage: workers taking items from `inbox`,
+    and passing the results of `work(item)` on to `outbox`
+
+    Keeps per-stage timing: the number of items processed,
+    the time spent working and the time spent waiting on the queues
+    (summed over all workers).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        work: Callable,
+        workers: int,
+        inbox: queue.Queue,
+        outbox: Optional[queue.Queue] = None,
+    ):
+        self.name = name
+        self.work = work
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.items = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+        self.errors = []
+        self._running = workers
+        self._lock = threading.Lock()
+
+    def run(self, downstream_workers: int = 0) -> None:
+        """Process items until the end marker, run by every worker thread
+
+        The last worker to finish passes one end marker on to each
+        of the `downstream_workers`.
+        """
+        try:
+            while True:
+                t0 = time.perf_counter()
+                item = self.inbox.get()
+                if item is _done:
+                    break
+                t1 = time.perf_counter()
+                try:
+                    result = self.work(item)
+                except Exception as e:
+                    with self._lock:
+                        self.errors.append((item, e))
+                    continue
+                t2 = time.perf_counter()
+                if self.outbox is not None:
+                    self.outbox.put(result)
+                t3 = time.perf_counter()
+                with self._lock:
+                    self.items += 1
+                    self.busy += t2 - t1
+                    self.waiting += (t1 - t0) + (t3 - t2)
+        finally:
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last and self.outbox is not None:
+                for _ in range(downstream_workers):
+                    self.outbox.put(_done)
+
+    def stats(self) -> Dict[str, float]:
+        """Return the timing of this stage"""
+        return {
+            "items": self.items,
+            "workers": self.workers,
+            "busy": self.busy,
+            "waiting": self.waiting,
+            # the rate this stage could sustain on its own
+            "items_per_s": self.items * self.workers / self.busy if self.busy else 0.0,
+        }
+
+
+def output_paths(
+    files: Sequence[str], out_dir: str, out_format: Optional[str] = None
+) -> List[Path]:
+    """Return the output file of each input file of `run_batch`
+
+    Outputs have the file names of their inputs, in `out_dir`.
+
+    Args:
+        files (list): the input image files
+        out_dir (str): the output directory
+        out_format (str, optional): file extension of the outputs,
+            default: the extension of each input
+    Raises:
+        ValueError: if two inputs would be written to the same file,
+            e.g. `a/image.png` and `b/image.png`
+    """
+    paths = []
+    inputs = {}
+    for file in files:
+        path = Path(file)
+        suffix = f".{out_format.lstrip('.')}" if out_format else path.suffix
+        out_path = Path(out_dir) / (path.stem + suffix)
+        if out_path in inputs:
+            raise ValueError(
+                f"{inputs[out_path]} and {file} would both be written to {out_path}"
+            )
+        inputs[out_path] = file
+        paths.append(out_path)
+    return paths
+
+
+def run_batch(
+    files: Sequence[str],
+    out_dir: str,
+    filter: str = "color2gray",
+    implementation: str = "numpy",
+    scale: float = 1,
+    out_format: Optional[str] = None,
+    decode_workers: int = 2,
+    compute_workers: int = 1,
+    encode_workers: int = 2,
+    queue_size: int = 4,
+    **kwargs,
+) -> Dict[str, Dict[str, float]]:
+    """Filter many image files, overlapping decode, filter and encode
+
+    Args:
+        files (list): the input image files
+        out_dir (str): directory to write the filtered images to,
+            with the same file names as the inputs
+        filter (str): the filter name
+        implementation (str): the filter implementation
+        scale (float): factor to scale images down by
+        out_format (str, optional):
+            file extension of the outputs, e.g. 'png'.
+            Default: the extension of each input
+        decode_workers, compute_workers, encode_workers (int):
+            the number of threads for each stage
+        queue_size (int):
+            the number of images which may wait between two stages,
+            bounding the memory used
+        **kwargs: passed on to the filter (e.g. precision)
+    Returns:
+        stats (dict):
+            timing for each stage (see `Stage.stats`),
+            and 'total' with the wall time and number of images
+    Raises:
+        ValueError: if a number of workers or `queue_size` is below 1,
+            or two inputs would be written to the same file
+            (see `output_paths`), before any file is processed.
+        Otherwise the first error raised while processing any file,
+        after all other files have been processed
+    """
+    counts = {
+        "decode_workers": decode_workers,
+        "compute_workers": compute_workers,
+        "encode_workers": encode_workers,
+        # 0 would be an unbounded queue
+        "queue_size": queue_size,
+    }
+    for name, count in counts.items():
+        if count < 1:
+            raise ValueError(f"{name} must be at least 1, got {count}")
+    paths = output_paths(files, out_dir, out_format)
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    filter_function = instapy.get_filter(filter, implementation)
+    if kwargs:
+        filter_function = partial(filter_function, **kwargs)
+
+    def decode(item):
+        file, out_path = item
+        return out_path, io.read_image(file, scale=scale)
+
+    def compute(item):
+        out_path, image = item
+        return out_path, filter_function(image)
+
+    def encode(item):
+        out_path, image = item
+        io.write_image(image, out_path)
+
+    files_queue = queue.Queue()
+    for item in zip(files, paths):
+        files_queue.put(item)
+    for _ in range(decode_workers):
+        files_queue.put(_done)
+    decoded = queue.Queue(maxsize=queue_size)
+    filtered = queue.Queue(maxsize=queue_size)
+
+    stages = [
+        Stage("decode", decode, decode_workers, files_queue, decoded),
+        Stage("compute", compute, compute_workers, decoded, filtered),
+        Stage("encode", encode, encode_workers, filtered),
+    ]
+    downstream = [compute_workers, encode_workers, 0]
+
+    t0 = time.perf_counter()
+    threads: List[threading.Thread] = []
+    for stage, downstream_workers in zip(stages, downstream):
+        for i in range(stage.workers):
+            thread = threading.Thread(
+                target=stage.run,
+                args=(downstream_workers,),
+                name=f"instapy-{stage.name}-{i}",
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - t0
+
+    stats = {stage.name: stage.stats() for stage in stages}
+    stats["total"] = {
+        "items": stages[-1].items,
+        "wall": wall,
+        "items_per_s": stages[-1].items / wall if wall else 0.0,
+    }
+    for stage in stages:
+        if stage.errors:
+            item, error = stage.errors[0]
+            raise error
+    return stats
+
+
+def print_stats(stats: Dict[str, Dict[str, float]]) -> None:
+    """Print the per-stage timing of a batch run"""
+    for name, stage in stats.items():
+        if name == "total":
+            continue
+        print(
+            f"{name:>8}: {stage['items']} images, {stage['workers']} workers,"
+            f" busy {stage['busy']:.3f}s, waiting {stage['waiting']:.3f}s,"
+            f" capacity {stage['items_per_s']:.1f} images/s"
+        )
+    total = stats["total"]
+    print(
+        f"   total: {total['items']} images in {total['wall']:.3f}s"
+        f" ({total['items_per_s']:.1f} images/s)"
+    )
@@ -0,0 +1,295 @@
+"""
+Benchmarking our filter implementations.
+
+Unlike `instapy.timing`, which reports the mean of a few back-to-back calls,
+every call is timed separately after a number of warm-up calls,
+over several image sizes, and summarized with min/median/p95/stddev
+and throughput in megapixels per second, along with the peak memory
+of one call (see `instapy.timing.measure_memory`).
+
+Can be executed as `python3 -m instapy.benchmark --json results.json`,
+and compared against a saved baseline with `--baseline results.json`.
+"""
+import argparse
+import csv
+import json
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import io
+from .autotune import available_implementations
+from .timing import measure_memory
+
+default_sizes = [(320, 240), (640, 480), (1920, 1080), (3840, 2160)]
+default_filters = ["color2gray", "color2sepia"]
+
+# the fields of one benchmark result, in csv column order
+fields = [
+    "filter",
+    "implementation",
+    "width",
+    "height",
+    "samples",
+    "min",
+    "median",
+    "p95",
+    "mean",
+    "stddev",
+    "mpix_per_s",
+    "peak_bytes",
+    "native_allocations",
+]
+
+
+def sample(
+    filter_function: Callable, image: np.array, warmup: int = 2, repeat: int = 10
+) -> List[float]:
+    """Time `filter_function(image)`, one call at a time
+
+    Args:
+        filter_function (callable): The filter function to time
+        image (np.array): The image to filter
+        warmup (int): The number of untimed calls to make first
+        repeat (int): The number of timed calls
+    Returns:
+        times (list): The time (in seconds) of each timed call
+    """
+    for _ in range(warmup):
+        filter_function(image)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        filter_function(image)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def summarize(times: Sequence[float], pixels: int) -> Dict[str, float]:
+    """Summarize timing samples
+
+    Args:
+        times (list): sample times, in seconds
+        pixels (int): the number of pixels processed by each call
+    Returns:
+        summary (dict):
+            min, median, 95th percentile, mean and standard deviation
+            of the times, and the throughput at the median time
+            in megapixels per second
+    """
+    median = statistics.median(times)
+    return {
+        "samples": len(times),
+        "min": min(times),
+        "median": median,
+        "p95": float(np.percentile(times, 95)),
+        "mean": statistics.fmean(times),
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "mpix_per_s": pixels / median / 1e6,
+    }
+
+
+def run_benchmarks(
+    filters: Sequence[str] = default_filters,
+    implementations: Optional[Sequence[str]] = None,
+    sizes: Sequence[Tuple[int, int]] = default_sizes,
+    warmup: int = 2,
+    repeat: int = 10,
+) -> List[Dict]:
+    """Benchmark every combination of filter, implementation and image size
+
+    Args:
+        filters (list): the filter names
+        implementations (list, optional):
+            the implementations to benchmark.
+            Default: every available implementation except pure Python
+        sizes (list): (width, height) of the images to use
+        warmup (int): untimed calls before sampling
+        repeat (int): timed calls per combination
+    Returns:
+        results (list): one dict per combination, with the keys in `fields`
+    """
+    import instapy
+
+    results = []
+    for width, height in sizes:
+        image = io.random_image(width, height)
+        for filter_name in filters:
+            if implementations is None:
+                filter_functions = available_implementations(filter_name)
+            else:
+                filter_functions = {
+                    implementation: instapy.get_filter(filter_name, implementation)
+                    for implementation in implementations
+                }
+            for implementation, filter_function in filter_functions.items():
+                times = sample(filter_function, image, warmup=warmup, repeat=repeat)
+                memory = measure_memory(filter_function, image)
+                result = {
+                    "filter": filter_name,
+                    "implementation": implementation,
+                    "width": width,
+                    "height": height,
+                }
+                result.update(summarize(times, width * height))
+                result["peak_bytes"] = memory["peak_bytes"]
+                result["native_allocations"] = memory["native_allocations"]
+                results.append(result)
+    return results
+
+
+def write_json(results: List[Dict], filename: str) -> None:
+    """Write benchmark results to a json file"""
+    with open(filename, "w") as f:
+        json.dump(results, f, indent=1)
+
+
+def read_json(filename: str) -> List[Dict]:
+    """Read benchmark results from a json file"""
+    with open(filename) as f:
+        return json.load(f)
+
+
+def write_csv(results: List[Dict], filename: str) -> None:
+    """Write benchmark results to a csv file"""
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def _key(result: Dict) -> Tuple:
+    return (result["filter"], result["implementation"], result["width"], result["height"])
+
+
+def compare(
+    results: List[Dict], baseline: List[Dict], tolerance: float = 0.1
+) -> List[Dict]:
+    """Find regressions against a baseline
+
+    A result is a regression if its median time, or its peak memory,
+    is more than `tolerance` (as a fraction) above the baseline
+    for the same filter, implementation and image size. The same
+    tolerance applies to both: 0.1 allows 10% slower and 10% more memory.
+
+    Returns:
+        regressions (list):
+            The regressed results, each with the added keys
+            'baseline_median' and 'slowdown' (ratio of the medians),
+            and 'baseline_peak_bytes' and 'memory_growth'
+            (ratio of the peaks, 1 if either has no peak)
+    """
+    baselines = {_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        base = baselines.get(_key(result))
+        if base is None:
+            continue
+        slowdown = result["median"] / base["median"]
+        memory_growth = 1.0
+        if result.get("peak_bytes") and base.get("peak_bytes"):
+            memory_growth = result["peak_bytes"] / base["peak_bytes"]
+        if slowdown > 1 + tolerance or memory_growth > 1 + tolerance:
+            regressions.append(
+                dict(
+                    result,
+                    baseline_median=base["median"],
+                    slowdown=slowdown,
+                    baseline_peak_bytes=base.get("peak_bytes"),
+                    memory_growth=memory_growth,
+                )
+            )
+    return regressions
+
+
+def print_results(results: List[Dict]) -> None:
+    """Print a table of benchmark results"""
+    print(
+        f"{'filter':<12} {'implementation':<15} {'size':>10}"
+        f" {'min':>9} {'median':>9} {'p95':>9} {'stddev':>9} {'MP/s':>8}"
+        f" {'peak MB':>8}"
+    )
+    for r in results:
+        size = f"{r['width']}x{r['height']}"
+        print(
+            f"{r['filter']:<12} {r['implementation']:<15} {size:>10}"
+            f" {r['min']:>9.3g} {r['median']:>9.3g} {r['p95']:>9.3g}"
+            f" {r['stddev']:>9.2g} {r['mpix_per_s']:>8.1f}"
+            f" {r['peak_bytes'] / 1e6:>8.2f}"
+        )
+
+
+def _size(text: str) -> Tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None) -> int:
+    """Run benchmarks from the command-line
+
+    Returns 1 if any regression against the baseline was found, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark instapy filters")
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=_size,
+        default=default_sizes,
+        metavar="WxH",
+        help="Image sizes to benchmark",
+    )
+    parser.add_argument("--filters", nargs="+", default=default_filters)
+    parser.add_argument(
+        "--implementations",
+        nargs="+",
+        help="Implementations to benchmark (default: all available but pure Python)",
+    )
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed calls")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed calls")
+    parser.add_argument("--json", metavar="FILE", help="Save results as json")
+    parser.add_argument("--csv", metavar="FILE", help="Save results as csv")
+    parser.add_argument(
+        "--baseline", metavar="FILE", help="json results to compare against"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed slowdown and peak memory growth against the baseline,"
+        " as a fraction",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        filters=args.filters,
+        implementations=args.implementations,
+        sizes=args.sizes,
+        warmup=args.warmup,
+        repeat=args.repeat,
+    )
+    print_results(results)
+    if args.json:
+        write_json(results, args.json)
+    if args.csv:
+        write_csv(results, args.csv)
+
+    if args.baseline:
+        regressions = compare(results, read_json(args.baseline), args.tolerance)
+        for r in regressions:
+            print(
+                f"Regression: {r['implementation']} {r['filter']}"
+                f" {r['width']}x{r['height']}: median {r['median']:.3g}s,"
+                f" baseline {r['baseline_median']:.3g}s ({r['slowdown']:.2f}x),"
+                f" peak memory {r['memory_growth']:.2f}x baseline"
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    # run as `python -m instapy.benchmark`
+    sys.exit(main())
@@ -0,0 +1,305 @@
+"""pure Python implementation of image filters, working on raw bytes
+
+The filters work on the raw pixel bytes of an image (e.g. from
+`PIL.Image.tobytes()`), using only the standard library, for hosts where
+numpy is not available. Instead of computing every product per pixel, each
+channel weight gets a precomputed table of its (fixed-point integer)
+products with all 256 byte values, and the channels are read and written
+with slices of the byte strings. 16-bit samples are handled the same way,
+as `array.array('H')` instead of bytes. The contrast filters
+(`instapy.levels`) count each channel's slice with a `Counter` and map it
+through its lookup table with `bytes.translate`, for 8-bit samples.
+
+Only the `bytes_<filter>` functions, which take and return numpy arrays
+like the other implementations, need numpy. The spatial filters
+(`instapy.spatial`) are not implemented on bytes, `instapy.get_filter`
+raises an AttributeError for them.
+"""
+
+from array import array
+from collections import Counter
+from typing import List, Sequence, Tuple, Union
+
+from . import levels
+from .spatial import GRAY_WEIGHTS
+
+# fixed-point fraction bits of the product tables
+SHIFT = 16
+
+SEPIA_MATRIX = (
+    (0.393, 0.769, 0.189),
+    (0.349, 0.686, 0.168),
+    (0.272, 0.534, 0.131),
+)
+
+
+def _maximum(data) -> int:
+    """The largest sample value of `data`, 255 for bytes"""
+    if isinstance(data, array):
+        return (1 << (8 * data.itemsize)) - 1
+    return 255
+
+
+def _samples(data, values) -> Union[bytes, array]:
+    """Pack sample values in the same type as `data`"""
+    if isinstance(data, array):
+        return array(data.typecode, values)
+    return bytes(values)
+
+
+def _tables(weights: Sequence[float], offset: float, maximum: int = 255):
+    """Return product tables for one output channel, and a clipping table
+
+    The clipping table is indexed by the shifted sum of the three products,
+    and maps it to a sample clipped to [0, maximum]. The smallest possible
+    sum is folded into the first table, so the index is never negative.
+    """
+    scale = 1 << SHIFT
+    tables = [
+        [round(weight * value * scale) for value in range(maximum + 1)]
+        for weight in weights
+    ]
+    base = round(offset * scale)
+    low = (base + sum(min(table) for table in tables)) >> SHIFT
+    high = (base + sum(max(table) for table in tables)) >> SHIFT
+    tables[0] = [value + base - (low << SHIFT) for value in tables[0]]
+    clip = [min(maximum, max(0, value)) for value in range(low, high + 1)]
+    return tables, clip
+
+
+def color_matrix_bytes(
+    data: Union[bytes, array],
+    matrix: Sequence[Sequence[float]],
+    offset: Sequence[float] = (0, 0, 0),
+    channels: int = 3,
+) -> Union[bytearray, array]:
+    """Apply an affine colour transform to raw pixel bytes
+
+    Args:
+        data (bytes or array):
+            pixel samples, `channels` per pixel, either bytes
+            or an `array.array` of 16-bit samples (typecode 'H')
+        matrix (3x3 sequence): row `i` gives the weights of channel `i`
+        offset (3 sequence): constant added to each channel
+        channels (int):
+            samples per pixel: 3 (rgb) or 4 (rgba), or
+            1 (gray) or 2 (gray and alpha), used as three equal channels.
+            Alpha is copied unchanged
+    Returns:
+        filtered (bytearray or array):
+            the filtered samples, rgb or rgba, of the same type as `data`
+    """
+    if channels not in (1, 2, 3, 4):
+        raise ValueError(f"channels must be 1-4, got {channels=}")
+    red = data[0::channels]
+    if channels >= 3:
+        green = data[1::channels]
+        blue = data[2::channels]
+    else:
+        green = blue = red
+    alpha = channels in (2, 4)
+    out_channels = 4 if alpha else 3
+    if isinstance(data, array):
+        filtered = array(data.typecode, [0]) * (len(red) * out_channels)
+    else:
+        filtered = bytearray(len(red) * out_channels)
+    if alpha:
+        filtered[3::out_channels] = data[channels - 1 :: channels]
+
+    maximum = _maximum(data)
+    done = {}
+    for c, (weights, constant) in enumerate(zip(matrix, offset)):
+        key = (tuple(weights), constant)
+        if key not in done:
+            (t_red, t_green, t_blue), clip = _tables(weights, constant, maximum)
+            done[key] = _samples(
+                data,
+                [
+                    clip[(t_red[r] + t_green[g] + t_blue[b]) >> SHIFT]
+                    for r, g, b in zip(red, green, blue)
+                ],
+            )
+        # channels with the same weights (e.g. gray) are only computed once
+        filtered[c::out_channels] = done[key]
+    return filtered
+
+
+def gray_bytes(data: Union[bytes, array], channels: int = 3) -> Union[bytearray, array]:
+    """Convert raw rgb pixel bytes to grayscale"""
+    return color_matrix_bytes(data, [GRAY_WEIGHTS] * 3, channels=channels)
+
+
+def sepia_bytes(
+    data: Union[bytes, array], k: float = 1, channels: int = 3
+) -> Union[bytearray, array]:
+    """Convert raw rgb pixel bytes to sepia
+
+    Args:
+        data (bytes or array): pixel samples
+        k (float): amount of sepia filter to apply, between 0 and 1
+        channels (int): samples per pixel
+    """
+    if not 0 <= k <= 1:
+        raise ValueError(f"k must be between [0-1], got {k=}")
+    matrix = [
+        [k * weight + (1 - k) * (i == j) for j, weight in enumerate(row)]
+        for i, row in enumerate(SEPIA_MATRIX)
+    ]
+    return color_matrix_bytes(data, matrix, channels=channels)
+
+
+def histogram_bytes(data: bytes, channels: int = 3) -> List[List[int]]:
+    """Count the values of each channel of raw pixel bytes
+
+    Args:
+        data (bytes): 8-bit pixel samples, `channels` per pixel
+        channels (int): samples per pixel, see `color_matrix_bytes`
+    Returns:
+        histogram (3x256 list): the count of each value, for each channel
+    """
+    if channels not in (1, 2, 3, 4):
+        raise ValueError(f"channels must be 1-4, got {channels=}")
+    histogram = []
+    for c in range(3) if channels >= 3 else [0]:
+        counts = Counter(data[c::channels])
+        histogram.append([counts[value] for value in range(256)])
+    # gray is used as three equal channels
+    return histogram * (3 // len(histogram))
+
+
+def lut_bytes(data: bytes, lut: Sequence[Sequence[int]], channels: int = 3) -> bytearray:
+    """Map each channel of raw pixel bytes through a lookup table
+
+    Args:
+        data (bytes): 8-bit pixel samples, `channels` per pixel
+        lut (3x256 sequence): the new value of each value, for each channel
+        channels (int): samples per pixel, see `color_matrix_bytes`
+    Returns:
+        mapped (bytearray): the mapped samples, rgb or rgba
+    """
+    if channels not in (1, 2, 3, 4):
+        raise ValueError(f"channels must be 1-4, got {channels=}")
+    out_channels = 4 if channels in (2, 4) else 3
+    mapped = bytearray(len(data) // channels * out_channels)
+    if out_channels == 4:
+        mapped[3::out_channels] = data[channels - 1 :: channels]
+    for c, table in enumerate(lut):
+        source = data[c if channels >= 3 else 0 :: channels]
+        mapped[c::out_channels] = source.translate(bytes(int(value) for value in table))
+    return mapped
+
+
+def _to_samples(image, uint8_only: bool = False) -> Tuple[Union[bytes, array], int]:
+    """Return the samples of an image array, and the samples per pixel"""
+    from . import channels
+
+    channels.check(image, channels.uint8_only if uint8_only else channels.dtypes)
+    data = image.tobytes()
+    if image.dtype.itemsize > 1:
+        data = array("H", data)
+    return data, image.shape[2] if image.ndim == 3 else 1
+
+
+def _from_samples(image, filtered: Union[bytearray, array]):
+    import numpy as np
+
+    from . import channels
+
+    return np.frombuffer(filtered, dtype=image.dtype).reshape(
+        channels.output_shape(image)
+    )
+
+
+def bytes_color2gray(image):
+    """Convert rgb pixel array to grayscale
+
+    Args:
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
+    Returns:
+        np.array: gray_image
+    """
+    data, channels = _to_samples(image)
+    return _from_samples(image, gray_bytes(data, channels=channels))
+
+
+def bytes_color2sepia(image, k: float = 1):
+    """Convert rgb pixel array to sepia
+
+    Args:
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
+        k (float): amount of sepia filter to apply (optional)
+    Returns:
+        np.array: sepia_image
+    """
+    data, channels = _to_samples(image)
+    return _from_samples(image, sepia_bytes(data, k=k, channels=channels))
+
+
+def bytes_color_matrix(image, matrix, offset=(0, 0, 0)):
+    """Apply an affine colour transform to an rgb pixel array
+
+    Args:
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
+        matrix (3x3 array-like): row `i` gives the weights of channel `i`
+        offset (3 array-like): constant added to each channel (optional)
+    Returns:
+        np.array: filtered_image
+    """
+    matrix = [[float(weight) for weight in row] for row in matrix]
+    offset = [float(value) for value in offset]
+    data, channels = _to_samples(image)
+    return _from_samples(
+        image, color_matrix_bytes(data, matrix, offset, channels=channels)
+    )
+
+
+def bytes_histogram(image) -> List[List[int]]:
+    """Count the values of each channel of an rgb pixel array
+
+    Args:
+        image (np.array): rgb(a) or gray(a), uint8
+    Returns:
+        list: histogram, 3x256 counts
+    """
+    data, channels = _to_samples(image, uint8_only=True)
+    return histogram_bytes(data, channels=channels)
+
+
+def bytes_apply_lut(image, lut):
+    """Map each channel of an rgb pixel array through a lookup table
+
+    Args:
+        image (np.array): rgb(a) or gray(a), uint8
+        lut (3x256 array-like): the new value of each value, for each channel
+    Returns:
+        np.array: mapped_image
+    """
+    data, channels = _to_samples(image, uint8_only=True)
+    return _from_samples(image, lut_bytes(data, lut, channels=channels))
+
+
+def bytes_auto_levels(image, clip: float = 0):
+    """Stretch the contrast of each channel of an rgb pixel array
+
+    Args:
+        image (np.array): rgb(a) or gray(a), uint8
+        clip (float): fraction of the darkest and brightest pixels to ignore
+    Returns:
+        np.array: stretched_image
+    """
+    data, channels = _to_samples(image, uint8_only=True)
+    lut = levels.lut("auto_levels", histogram_bytes(data, channels=channels), clip=clip)
+    return _from_samples(image, lut_bytes(data, lut, channels=channels))
+
+
+def bytes_equalize(image):
+    """Equalise the histogram of each channel of an rgb pixel array
+
+    Args:
+        image (np.array): rgb(a) or gray(a), uint8
+    Returns:
+        np.array: equalized_image
+    """
+    data, channels = _to_samples(image, uint8_only=True)
+    lut = levels.lut("equalize", histogram_bytes(data, channels=channels))
+    return _from_samples(image, lut_bytes(data, lut, channels=channels))
@@ -0,0 +1,127 @@
+"""Content-addressed cache of filtered images
+
+Filtered images are stored as encoded files, named by a hash of the input
+file's bytes, the filter, its parameters, the implementation and the output
+format. Filtering the same image again returns the stored file without
+decoding or computing. The implementation is part of the key, since the
+implementations round differently and their results may differ by 1.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+import instapy
+
+# default size limit of the cache, in bytes
+default_max_bytes = 1024 * 1024 * 1024
+
+
+def file_digest(filename: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the sha256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """A directory of filtered images, limited in size
+
+    When the total size exceeds `max_bytes`, the least recently used
+    entries are removed. Entries are marked as used by updating their
+    modification time, so the cache can be shared between processes.
+
+    Args:
+        directory (str, optional):
+            where to store the images.
+            Default: `results` in `instapy.user_cache_dir()`
+        max_bytes (int): the size limit
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = default_max_bytes):
+        if directory is None:
+            directory = instapy.user_cache_dir() / "results"
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def key(
+        self,
+        file: str,
+        filter: str,
+        params: Optional[Dict] = None,
+        out_format: str = "png",
+        implementation: Optional[str] = None,
+    ) -> str:
+        """Return the cache key of filtering `file`
+
+        Args:
+            file (str): the input image file
+            filter (str): the filter name
+            params (dict, optional):
+                everything else affecting the output, e.g. scale, sepia k
+            out_format (str): the output file extension, e.g. 'png'
+            implementation (str, optional): the implementation filtering
+        """
+        description = json.dumps(
+            {
+                "input": file_digest(file),
+                "filter": filter,
+                "params": params or {},
+                "implementation": implementation,
+            },
+            sort_keys=True,
+        )
+        digest = hashlib.sha256(description.encode()).hexdigest()
+        return f"{digest}.{out_format.lstrip('.').lower()}"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Return the path of a stored image, or None if not stored"""
+        path = self.directory / key
+        try:
+            # mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, filename: str) -> Path:
+        """Store a copy of an encoded image file
+
+        Returns:
+            path (Path): the stored file
+        """
+        path = self.directory / key
+        # copy to a temporary file and rename, so other processes
+        # never see a partially written entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as out, open(filename, "rb") as f:
+            shutil.copyfileobj(f, out)
+        os.replace(tmp, path)
+        self.evict()
+        return path
+
+    def evict(self) -> None:
+        """Remove least recently used entries until within `max_bytes`"""
+        entries = []
+        for path in self.directory.iterdir():
+            if path.suffix == ".tmp":
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # removed by another process
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
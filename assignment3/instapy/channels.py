@@ -0,0 +1,92 @@
+"""Channel layouts and value types of the images the filters accept
+
+The filters accept images of shape
+
+- (H, W, 3): rgb
+- (H, W, 4): rgb with alpha
+- (H, W): grayscale, used as rgb with three equal channels
+- (H, W, 2): grayscale with alpha
+
+with uint8 or uint16 values (the spatial and contrast filters take uint8
+only). The filters read the colour channels through strided views, rather
+than converting the image to (H, W, 3) uint8 first, and return rgb images
+(with alpha if the input has it) of the input's value type. Alpha is
+passed through unchanged.
+"""
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# the supported value types
+dtypes = ("uint8", "uint16")
+# the value types supported by the spatial and contrast filters
+uint8_only = ("uint8",)
+
+
+def check(image: np.array, dtypes: Sequence[str] = dtypes) -> None:
+    """Raise a ValueError if `image` is not a supported image"""
+    if image.dtype.name not in dtypes:
+        raise ValueError(f"Images must have dtype {' or '.join(dtypes)}, got {image.dtype}")
+    if image.ndim == 2 or (image.ndim == 3 and image.shape[2] in (2, 3, 4)):
+        return
+    raise ValueError(f"Images must be (H, W) or (H, W, 2-4), got shape {image.shape}")
+
+
+def max_value(image: np.array) -> int:
+    """The largest value of the image's value type, e.g. 255 for uint8"""
+    return int(np.iinfo(image.dtype).max)
+
+
+def has_alpha(image: np.array) -> bool:
+    return image.ndim == 3 and image.shape[2] in (2, 4)
+
+
+def rgb_view(image: np.array, dtypes: Sequence[str] = dtypes) -> np.array:
+    """Return an (H, W, 3) view of the colour channels, without copying
+
+    Grayscale images are repeated in three channels, with a zero stride.
+    Raises a ValueError for images of other shapes, or value types
+    not in `dtypes`.
+    """
+    check(image, dtypes)
+    if image.ndim == 2:
+        image = image[:, :, np.newaxis]
+    elif image.shape[2] == 2:
+        image = image[:, :, :1]
+    if image.shape[2] == 1:
+        return np.broadcast_to(image, (*image.shape[:2], 3))
+    return image[:, :, :3]
+
+
+def alpha_view(image: np.array) -> Optional[np.array]:
+    """Return an (H, W) view of the alpha channel, or None"""
+    if has_alpha(image):
+        return image[:, :, -1]
+    return None
+
+
+def output_shape(image: np.array) -> Tuple[int, int, int]:
+    """The shape of a filtered image: rgb, with alpha if the input has it"""
+    return (*image.shape[:2], 4 if has_alpha(image) else 3)
+
+
+def empty_output(image: np.array) -> np.array:
+    """Allocate a filtered image, with the alpha channel of `image` copied
+
+    Only the colour channels are left to fill.
+    """
+    out = np.empty(output_shape(image), dtype=image.dtype)
+    alpha = alpha_view(image)
+    if alpha is not None:
+        out[:, :, 3] = alpha
+    return out
+
+
+def with_alpha(image: np.array, rgb: np.array) -> np.array:
+    """Add the alpha channel of `image` (if any) to filtered colour channels"""
+    if not has_alpha(image):
+        return rgb
+    out = empty_output(image)
+    out[:, :, :3] = rgb
+    return out
@@ -1,13 +1,20 @@
 """Command-line (script) interface to instapy"""
 
 import argparse
+import shutil
 import sys
-
-import numpy as np
-from PIL import Image
+import tempfile
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional
 
 import instapy
-from . import io, timing
+
+if TYPE_CHECKING:
+    from .cache import ResultCache
+
+# numpy, PIL and the filter backends are imported when a filter is run,
+# so that `instapy --help` and argument errors return quickly
 
 
 def run_filter(
@@ -15,30 +22,294 @@ def run_filter(
     out_file: str = None,
     implementation: str = "python",
     filter: str = "color2gray",
-    scale: int = 1,
+    scale: float = 1,
     runtime: bool = False,
+    precision: str = "float64",
+    tile_mb: float = None,
+    cache: Optional["ResultCache"] = None,
+    preview: Callable = None,
+    preview_scale: float = 8,
+    **params,
 ) -> None:
-    """Run the selected filter"""
-    # load the image from a file
-    image = io.read_image(file)
-    if scale != 1:
-        # Resize image, if needed
-        im = Image.open(file)
-        resized = im.resize((im.width // scale, im.height // scale))
-        image = np.asarray(resized)
+    """Run the selected filter
+
+    Further keyword arguments are passed on to the filter, e.g. `sigma`
+    for 'gaussian_blur' (see `instapy.spatial`).
+
+    `precision` selects the float type the numpy and numba filters
+    compute in, 'float32' is faster and at most 1 off from 'float64'.
+
+    With `tile_mb`, the image is filtered in bands of at most that many
+    megabytes, and `.npy`/`.raw` input and output files are memory-mapped,
+    so images larger than memory can be filtered. Without it, raw files
+    are still read and written without decoding or encoding (see
+    `instapy.io`), e.g. for intermediate images.
+
+    With a `cache` (an `instapy.cache.ResultCache`), an image filtered
+    before with the same filter and parameters is copied from the cache,
+    without decoding or filtering it again.
+
+    With a `preview` callback, the image is first filtered scaled down by
+    `preview_scale` (decoded at reduced size, see `instapy.progressive`),
+    and `preview` is called with the result before the full image is
+    filtered.
+    """
+    from . import io
+
+    kwargs = dict(params)
+    if precision != "float64":
+        # only the numpy and numba filters take a precision
+        kwargs["precision"] = precision
+
+    def show_preview():
+        if preview is not None:
+            from . import progressive
+
+            preview(
+                progressive.preview(
+                    file, filter, implementation, scale=scale * preview_scale, **kwargs
+                )
+            )
+
+    if tile_mb:
+        if not out_file or scale != 1:
+            raise ValueError("Tiled filtering needs an output file, and no scaling")
+        from .tiled import run_tiled
+
+        show_preview()
+        run_tiled(
+            file,
+            out_file,
+            implementation=implementation,
+            filter=filter,
+            tile_bytes=int(tile_mb * 2**20),
+            **kwargs,
+        )
+        return
+
+    key = None
+    # a cached .raw file would lose its sidecar, and raw files
+    # are written at disk speed anyway
+    if cache is not None and not runtime and not (out_file and io.is_raw(out_file)):
+        out_format = Path(out_file).suffix if out_file else "png"
+        key = cache.key(
+            file, filter, dict(kwargs, scale=scale), out_format, implementation=implementation
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            if out_file:
+                shutil.copyfile(cached, out_file)
+            else:
+                io.display(io.read_image(cached))
+            return
+
+    show_preview()
+    # load the image from a file, decoding it directly at reduced size
+    image = io.read_image(file, scale=scale)
 
     # Apply the filter
     filter_func = instapy.get_filter(filter, implementation)
+    if kwargs:
+        filter_func = partial(filter_func, **kwargs)
     if runtime:
+        from . import timing
+
         time = timing.time_one(filter_func, image)
         print(f"Average time over 3 runs: {time}s")
     filtered = filter_func(image)
     if out_file:
         # save the file
         io.write_image(filtered, out_file)
+        if key:
+            cache.put(key, out_file)
     else:
         # not asked to save, display it instead
         io.display(filtered)
+        if key:
+            with tempfile.TemporaryDirectory() as tmp:
+                io.write_image(filtered, Path(tmp) / key)
+                cache.put(key, Path(tmp) / key)
+
+
+def add_filter_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the (mutually exclusive, required) filter options to a parser"""
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("-g", "--gray", action="store_true", help="Select gray filter")
+    group.add_argument(
+        "-se", "--sepia", action="store_true", help="Select sepia filter"
+    )
+    group.add_argument(
+        "-b",
+        "--blur",
+        metavar="SIGMA",
+        nargs="?",
+        const=1.0,
+        type=float,
+        help="Select Gaussian blur, with standard deviation SIGMA (default: 1)",
+    )
+    group.add_argument(
+        "--box-blur",
+        metavar="RADIUS",
+        nargs="?",
+        const=1,
+        type=int,
+        help="Select box blur, averaging (2*RADIUS+1)^2 pixels (default: 1)",
+    )
+    group.add_argument(
+        "--sharpen",
+        metavar="AMOUNT",
+        nargs="?",
+        const=1.0,
+        type=float,
+        help="Select sharpen filter, with strength AMOUNT (default: 1)",
+    )
+    group.add_argument(
+        "--sobel", action="store_true", help="Select Sobel edge detection"
+    )
+    group.add_argument(
+        "-a",
+        "--auto-levels",
+        metavar="CLIP",
+        nargs="?",
+        const=0.0,
+        type=float,
+        help="Select auto-levels, stretching each channel to [0, 255],"
+        " ignoring the CLIP fraction of darkest and brightest pixels (default: 0)",
+    )
+    group.add_argument(
+        "-e", "--equalize", action="store_true", help="Select histogram equalisation"
+    )
+
+
+def selected_filter(args: argparse.Namespace) -> tuple:
+    """Return the filter name and parameters chosen with the filter options"""
+    if args.sepia:
+        return "color2sepia", {}
+    if args.blur is not None:
+        return "gaussian_blur", {"sigma": args.blur}
+    if args.box_blur is not None:
+        return "box_blur", {"radius": args.box_blur}
+    if args.sharpen is not None:
+        return "sharpen", {"amount": args.sharpen}
+    if args.sobel:
+        return "sobel", {}
+    if args.auto_levels is not None:
+        return "auto_levels", {"clip": args.auto_levels}
+    if args.equalize:
+        return "equalize", {}
+    return "color2gray", {}
+
+
+def positive_int(text: str) -> int:
+    """Parse a whole number of at least 1, for argparse"""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+
+def check_filter(parser: argparse.ArgumentParser, filter: str, implementation: str) -> None:
+    """Exit with a usage error if `implementation` cannot run `filter`"""
+    if implementation == "auto":
+        return
+    try:
+        instapy.get_filter(filter, implementation)
+    except ImportError as e:
+        parser.error(f"the {implementation} implementation is not available: {e}")
+    except AttributeError as e:
+        parser.error(str(e))
+
+
+def warmup(argv=None):
+    """Compile the numba filters ahead of use
+
+    Compiled code is stored in numba's on-disk cache,
+    so later invocations of instapy skip the JIT compilation.
+    """
+    parser = argparse.ArgumentParser(
+        prog="instapy warmup", description="Precompile the numba filters"
+    )
+    parser.parse_args(argv)
+
+    from .numba_filters import warmup
+
+    warmup()
+    print("Compiled numba filters")
+
+
+def batch(argv=None):
+    """Filter many files, overlapping decoding, filtering and encoding"""
+    parser = argparse.ArgumentParser(
+        prog="instapy batch", description="Apply a filter to many images"
+    )
+    parser.add_argument("files", nargs="+", help="The files to apply filter to")
+    parser.add_argument(
+        "-o", "--out", metavar="OUTDIR", required=True, help="The output directory"
+    )
+    add_filter_arguments(parser)
+    parser.add_argument(
+        "-i",
+        "--implementation",
+        choices=[*instapy.installed_implementations(), "auto"],
+        default="numpy",
+        help="The implementation",
+    )
+    parser.add_argument(
+        "-sc", "--scale", metavar="SCALE", default=1, type=float,
+        help="Factor to scale images down by",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        help="Output file format, e.g. png, or npy/raw for raw pixel arrays"
+        " (default: as input)",
+    )
+    parser.add_argument("--decode-workers", type=positive_int, default=2)
+    parser.add_argument("--compute-workers", type=positive_int, default=1)
+    parser.add_argument("--encode-workers", type=positive_int, default=2)
+    parser.add_argument(
+        "--queue-size", type=positive_int, default=4, help="Images waiting between stages"
+    )
+    args = parser.parse_args(argv)
+
+    from .batch import output_paths, print_stats, run_batch
+
+    filter, params = selected_filter(args)
+    check_filter(parser, filter, args.implementation)
+    try:
+        output_paths(args.files, args.out, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+
+    stats = run_batch(
+        args.files,
+        args.out,
+        filter=filter,
+        implementation=args.implementation,
+        scale=args.scale,
+        out_format=args.format,
+        decode_workers=args.decode_workers,
+        compute_workers=args.compute_workers,
+        encode_workers=args.encode_workers,
+        queue_size=args.queue_size,
+        **params,
+    )
+    print_stats(stats)
+
+
+def serve(argv=None):
+    """Serve the filters over HTTP, see `instapy.server`"""
+    from .server import main
+
+    main(argv)
+
+
+# subcommands, dispatched on the first argument
+commands = {
+    "warmup": warmup,
+    "batch": batch,
+    "serve": serve,
+}
 
 
 def main(argv=None):
@@ -46,33 +317,78 @@ def main(argv=None):
     if argv is None:
         argv = sys.argv[1:]
 
+    if argv and argv[0] in commands:
+        return commands[argv[0]](argv[1:])
+
     parser = argparse.ArgumentParser(description="Apply a filter to an image")
 
     # filename is positional and required
-    parser.add_argument("file", help="The filename to apply filter to")
-    parser.add_argument("-o", "--out", metavar="OUT", help="The output filename")
+    parser.add_argument(
+        "file", help="The filename to apply filter to (.npy/.raw: raw pixel array)"
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        metavar="OUT",
+        help="The output filename (.npy/.raw: raw pixel array, no encoding)",
+    )
 
     # Add required arguments
-    group = parser.add_mutually_exclusive_group(required=True)
-    group.add_argument("-g", "--gray", action="store_true", help="Select gray filter")
-    group.add_argument(
-        "-se", "--sepia", action="store_true", help="Select sepia filter"
-    )
+    add_filter_arguments(parser)
     parser.add_argument(
         "-sc",
         "--scale",
         metavar="SCALE",
         default=1,
-        type=int,
-        help="Factor to scale image by",
+        type=float,
+        help="Factor to scale image down by",
     )
     parser.add_argument(
         "-i",
         "--implementation",
-        choices=["python", "numpy", "numba"],
+        choices=[*instapy.installed_implementations(), "auto"],
         default="numpy",
         help="The implementation",
     )
+    parser.add_argument(
+        "-p",
+        "--precision",
+        choices=["float64", "float32"],
+        default="float64",
+        help="Float type to compute in (numpy and numba only)",
+    )
+    parser.add_argument(
+        "-t",
+        "--tile-mb",
+        metavar="MB",
+        type=float,
+        help="Filter in bands of at most MB megabytes (memory-maps .npy/.raw files)",
+    )
+    parser.add_argument(
+        "-c",
+        "--cache",
+        nargs="?",
+        const="",
+        metavar="DIR",
+        help="Reuse previously filtered images stored in DIR"
+        " (default: ~/.cache/instapy/results)",
+    )
+    parser.add_argument(
+        "--cache-mb",
+        metavar="MB",
+        type=float,
+        default=1024,
+        help="Size limit of the cache, least recently used images are removed",
+    )
+    parser.add_argument(
+        "--preview",
+        metavar="SCALE",
+        nargs="?",
+        const=8,
+        type=float,
+        help="First show (or save as OUT.preview) the image filtered"
+        " scaled down by SCALE (default: 8)",
+    )
     parser.add_argument(
         "-r",
         "--runtime",
@@ -81,9 +397,32 @@ def main(argv=None):
     )
 
     # parse arguments and call run_filter
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    if args.precision != "float64" and args.implementation in ("python", "bytes"):
+        parser.error(
+            f"--precision is not supported by the {args.implementation} implementation"
+        )
+
+    cache = None
+    if args.cache is not None:
+        from .cache import ResultCache
+
+        cache = ResultCache(args.cache or None, max_bytes=int(args.cache_mb * 2**20))
+
+    preview = None
+    if args.preview:
+        from . import io
+
+        if args.out:
+            out = Path(args.out)
+            preview_file = out.with_name(f"{out.stem}.preview{out.suffix}")
+            preview = partial(io.write_image, filename=preview_file)
+        else:
+            preview = io.display
 
-    filter = "color2sepia" if args.sepia else "color2gray"
+    filter, params = selected_filter(args)
+    check_filter(parser, filter, args.implementation)
     run_filter(
         args.file,
         out_file=args.out,
@@ -91,4 +430,10 @@ def main(argv=None):
         filter=filter,
         scale=args.scale,
         runtime=args.runtime,
+        precision=args.precision,
+        tile_mb=args.tile_mb,
+        cache=cache,
+        preview=preview,
+        preview_scale=args.preview or 8,
+        **params,
     )
@@ -2,27 +2,214 @@
 
 for reading, writing, and displaying image files
 as numpy arrays
+
+Besides the image formats of PIL, images can be stored as raw pixel arrays,
+chosen by the file extension:
+
+- `.npy`: a NumPy array file, with its shape and dtype in the header
+- `.raw`: the bare pixel bytes, with the shape and dtype
+  in a JSON sidecar file next to it (`image.raw.json`)
+
+Raw files are read memory-mapped and written without encoding,
+so intermediate images can be stored and loaded at disk speed, losslessly
+and with any value type (e.g. 16-bit rgb, which PIL cannot write).
 """
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Tuple, Union
+
+# numpy and PIL are imported in the functions using them,
+# so importing instapy.io does not pay for them up front
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
+
+
+# extensions of the raw pixel array formats
+raw_formats = (".npy", ".raw")
+
+# PIL modes read as they are, see `instapy.channels`
+array_modes = ("RGB", "RGBA", "L", "LA", "I;16")
+
+
+def read_image(filename: str, scale: float = 1) -> np.array:
+    """Read an image file to a pixel array
+
+    rgb, rgba, grayscale (with or without alpha) and 16-bit grayscale images
+    are read without conversion, other modes (e.g. palette, CMYK)
+    are converted to rgb, or rgba if they have transparency.
+
+    Args:
+        filename (str): the image file
+        scale (float): factor to scale the image down by (optional)
+
+    Raw `.npy`/`.raw` files are memory-mapped (read-only), not decoded, and
+    scaled by sampling the pixel nearest the centre of each output pixel,
+    so only those pixels are read from disk. When scaling, JPEG images are
+    decoded directly at reduced size (1/2, 1/4 or 1/8, see
+    `PIL.Image.draft`), and any remaining factor is applied with an
+    area-averaging (box) downscale, so the full resolution image is never
+    decoded. Both give images of `int(height / scale)` by
+    `int(width / scale)` pixels.
+    """
+    if is_raw(filename):
+        image = read_image_memmap(filename)
+        if scale != 1:
+            image = sample(image, scale)
+        return image
+
+    from PIL import Image
+
+    return from_pil(Image.open(filename), scale)
+
+
+def scaled_size(width: int, height: int, scale: float) -> Tuple[int, int]:
+    """The (width, height) of an image scaled down by a factor"""
+    return max(1, int(width / scale)), max(1, int(height / scale))
+
+
+def sample(image: np.array, scale: float) -> np.array:
+    """Scale a pixel array by a factor, taking the nearest pixels
+
+    Args:
+        image (np.array): the image, e.g. memory-mapped
+        scale (float): factor to scale the image down by
+    Returns:
+        image (np.array):
+            the image of size (width / scale, height / scale), a view of
+            `image` when `scale` is a whole number, else a copy
+    """
+    import numpy as np
+
+    height, width = image.shape[:2]
+    out_width, out_height = scaled_size(width, height, scale)
+    if scale == int(scale):
+        step = int(scale)
+        # the middle pixel of each step x step block
+        start = step // 2
+        return image[start::step, start::step][:out_height, :out_width]
+    rows = ((np.arange(out_height) + 0.5) * (height / out_height)).astype(np.intp)
+    columns = ((np.arange(out_width) + 0.5) * (width / out_width)).astype(np.intp)
+    return image[rows][:, columns]
 
-import numpy as np
-from PIL import Image
 
+def from_pil(image: Image.Image, scale: float = 1) -> np.array:
+    """Convert an opened PIL image to a pixel array, see `read_image`"""
+    import numpy as np
 
-def read_image(filename: str) -> np.array:
-    """Read an image file to an rgb array"""
-    return np.asarray(Image.open(filename))
+    mode = None
+    if image.mode not in array_modes:
+        transparent = "A" in image.mode or "transparency" in image.info
+        mode = "RGBA" if transparent else "RGB"
+    if scale != 1:
+        image = downscale(image, scale, mode)
+    elif mode is not None:
+        image = image.convert(mode)
+    return np.asarray(image)
+
+
+def downscale(image: Image.Image, scale: float, mode: Optional[str] = None) -> Image.Image:
+    """Scale a PIL image down by a factor, decoding as little as possible
+
+    Args:
+        image (PIL.Image): an opened image, preferably not yet loaded
+        scale (float): factor to scale the image down by
+        mode (str, optional):
+            mode to convert to, after decoding at reduced size
+            and before resizing
+    Returns:
+        image (PIL.Image): the image of size (width / scale, height / scale)
+    """
+    from PIL import Image
+
+    size = scaled_size(image.width, image.height, scale)
+    # let the JPEG decoder skip detail we would average away,
+    # this picks the largest reduction keeping the image at least `size`
+    # (a no-op for other formats, or images that are already loaded)
+    image.draft(image.mode, size)
+    if mode is not None and image.mode != mode:
+        # e.g. palette images, which only resize with the nearest pixel
+        image = image.convert(mode)
+    if image.size != size:
+        image = image.resize(size, Image.BOX)
+    return image
+
+
+def is_raw(filename: Union[str, Path]) -> bool:
+    """Whether a file is a raw pixel array, by its extension"""
+    return Path(filename).suffix.lower() in raw_formats
+
+
+def sidecar(filename: Union[str, Path]) -> Path:
+    """The JSON file with the shape and dtype of a `.raw` image"""
+    filename = Path(filename)
+    return filename.with_name(filename.name + ".json")
+
+
+def read_image_memmap(filename: str) -> np.memmap:
+    """Open a raw `.npy` or `.raw` pixel array without reading it into memory
+
+    Pixels are read from disk as they are accessed,
+    so arbitrarily large images can be processed in parts.
+    """
+    import numpy as np
+
+    if Path(filename).suffix.lower() == ".raw":
+        header = json.loads(sidecar(filename).read_text())
+        return np.memmap(
+            filename, mode="r", dtype=header["dtype"], shape=tuple(header["shape"])
+        )
+    return np.load(filename, mmap_mode="r")
+
+
+def create_image_memmap(filename: str, shape: tuple, dtype: str = "uint8") -> np.memmap:
+    """Create a raw `.npy` or `.raw` pixel array on disk, mapped into memory
+
+    Pixels written to the returned array are flushed to the file,
+    without the whole image ever being held in memory.
+    """
+    import numpy as np
+
+    if Path(filename).suffix.lower() == ".raw":
+        header = {"shape": list(shape), "dtype": np.dtype(dtype).name}
+        sidecar(filename).write_text(json.dumps(header))
+        return np.memmap(filename, mode="w+", dtype=dtype, shape=tuple(shape))
+    return np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=shape)
 
 
 def write_image(array: np.array, filename: str) -> None:
-    """Write a numpy pixel array to a file"""
-    return Image.fromarray(array).save(filename)
+    """Write a numpy pixel array to a file
+
+    `.npy` and `.raw` files store the array as it is. PIL cannot write
+    16-bit colour images, so uint16 rgb(a) arrays are written to
+    other formats with their 8 most significant bits.
+    """
+    if is_raw(filename):
+        out = create_image_memmap(filename, array.shape, array.dtype)
+        out[...] = array
+        out.flush()
+        return
+    return to_pil(array).save(filename)
+
+
+def to_pil(array: np.array) -> Image.Image:
+    """Convert a pixel array to a PIL image, 16-bit colour to 8 bits"""
+    from PIL import Image
+
+    if array.ndim == 3 and array.dtype.itemsize > 1:
+        array = (array >> 8).astype("uint8")
+    return Image.fromarray(array)
 
 
 def random_image(width: int = 320, height: int = 180) -> np.array:
     """Create a random image array of a given size"""
+    import numpy as np
+
     return np.random.randint(0, 255, size=(height, width, 3), dtype=np.uint8)
 
 
 def display(array: np.array):
     """Show an image array on the screen"""
-    Image.fromarray(array).show()
+    to_pil(array).show()
@@ -0,0 +1,101 @@
+"""Lookup tables of the contrast filters
+
+The contrast filters map every value of each channel through a 256-entry
+lookup table (LUT) derived from the histogram of that channel:
+
+- `auto_levels(image, clip=0)`:
+    stretch each channel so its darkest value becomes 0 and its brightest
+    255, ignoring the `clip` fraction of the darkest and brightest pixels
+- `equalize(image)`:
+    histogram equalisation, map each channel through its cumulative
+    distribution, spreading the values evenly over [0, 255]
+
+Each backend implements `histogram(image)`, counting the values of every
+channel in a single pass, and `apply_lut(image, lut)`. Since histograms
+of parts of an image add up to the histogram of the whole image, images
+can be filtered in bands (`instapy.tiled`): one pass over the bands to sum
+their histograms, and one to apply the table.
+"""
+
+from typing import List, Sequence
+
+# the names of the contrast filters
+filters = ("auto_levels", "equalize")
+
+Histogram = Sequence[Sequence[int]]
+Lut = List[List[int]]
+
+
+def _identity() -> List[int]:
+    return list(range(256))
+
+
+def levels_lut(histogram: Sequence[int], clip: float = 0) -> List[int]:
+    """Return the auto-levels table of one channel
+
+    Args:
+        histogram (list): the count of each of the 256 values
+        clip (float):
+            fraction of pixels to ignore at each end, between 0 and 0.5
+    """
+    if not 0 <= clip < 0.5:
+        raise ValueError(f"clip must be between [0-0.5), got {clip=}")
+    total = sum(histogram)
+    if not total:
+        return _identity()
+    ignore = clip * total
+
+    low, count = 0, 0
+    for low, n in enumerate(histogram):
+        count += n
+        if count > ignore:
+            break
+    high, count = 255, 0
+    for high in range(255, -1, -1):
+        count += histogram[high]
+        if count > ignore:
+            break
+    if high <= low:
+        # a single value, nothing to stretch
+        return _identity()
+
+    scale = 255 / (high - low)
+    return [min(255, max(0, int((value - low) * scale + 0.5))) for value in range(256)]
+
+
+def equalize_lut(histogram: Sequence[int]) -> List[int]:
+    """Return the histogram equalisation table of one channel
+
+    The lowest value present maps to 0 and the highest to 255.
+    """
+    cumulative = []
+    count = 0
+    for n in histogram:
+        count += n
+        cumulative.append(count)
+    total = cumulative[-1]
+    # the number of pixels below the lowest value present
+    first = next((c for c in cumulative if c), 0)
+    if total == first:
+        # empty, or a single value
+        return _identity()
+    scale = 255 / (total - first)
+    return [max(0, int((c - first) * scale + 0.5)) for c in cumulative]
+
+
+def lut(filter: str, histogram: Histogram, clip: float = 0, **kwargs) -> Lut:
+    """Return the lookup table of a contrast filter, for every channel
+
+    Args:
+        filter (str): 'auto_levels' or 'equalize'
+        histogram (3x256 array-like): value counts of each channel
+        clip (float): see `levels_lut`
+        **kwargs: other filter parameters, which do not affect the table
+    Returns:
+        lut (3x256 list): the new value of each value, for each channel
+    """
+    if filter == "auto_levels":
+        return [levels_lut(list(channel), clip) for channel in histogram]
+    if filter == "equalize":
+        return [equalize_lut(list(channel)) for channel in histogram]
+    raise ValueError(f"{filter!r} is not a contrast filter, one of {filters}")
@@ -1,65 +1,434 @@
-"""numba-optimized filters"""
-from numba import jit
+"""numba-optimized filters
+
+The filters are compiled with `cache=True`, so compiled machine code is
+stored on disk and reused by later processes. Run `instapy warmup` (or
+`warmup()`) once after installing to compile the common signatures up
+front, the others are compiled (and cached) on first use.
+
+The compiled kernels take their weights as arrays, and do all arithmetic
+in the dtype of the weights, which the filters choose with `precision`.
+"""
+import numba
+from numba import jit, prange, types
 import numpy as np
 
+from . import channels, levels, spatial
+
+# the supported `precision` values
+precisions = ("float64", "float32")
+
+
+@jit(nopython=True, cache=True)
+def _color2gray(image: np.array, weights: np.array, out: np.array) -> np.array:
+    height, width = image.shape[0], image.shape[1]
+    # iterate through the pixels, and apply the grayscale transform
+    for i in range(height):
+        for j in range(width):
+            gray = (
+                image[i, j, 0] * weights[0]
+                + image[i, j, 1] * weights[1]
+                + image[i, j, 2] * weights[2]
+            )
+            out[i, j, 0] = gray
+            out[i, j, 1] = gray
+            out[i, j, 2] = gray
+
+    return out
 
-@jit(nopython=True)
-def numba_color2gray(image: np.array) -> np.array:
+
+def numba_color2gray(image: np.array, precision: str = "float64") -> np.array:
     """Convert rgb pixel array to grayscale
 
     Args:
-        image (np.array)
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
+        precision (str): float type to compute in, 'float64' or 'float32'
     Returns:
         np.array: gray_image
     """
-    gray_image = np.empty_like(image)
-    # iterate through the pixels, and apply the grayscale transform
+    weights = np.array([0.21, 0.72, 0.07], dtype=precision)
+    return _color2gray(channels.rgb_view(image), weights, channels.empty_output(image))
 
-    gray = np.clip(
-        image[:, :, 0] * 0.21 + image[:, :, 1] * 0.72 + image[:, :, 2] * 0.07, 0, 255
-    )
-    gray_image[:, :, 0] = gray
-    gray_image[:, :, 1] = gray
-    gray_image[:, :, 2] = gray
 
-    gray_image = gray_image.astype("uint8")
+@jit(nopython=True, cache=True)
+def _color2sepia(
+    image: np.array, sepia_matrix: np.array, maximum: float, out: np.array
+) -> np.array:
+    height, width = image.shape[0], image.shape[1]
+    # Iterate through the pixels
+    # applying the sepia matrix
+    for i in range(height):
+        for j in range(width):
+            red = image[i, j, 0]
+            green = image[i, j, 1]
+            blue = image[i, j, 2]
+            for c in range(3):
+                value = (
+                    red * sepia_matrix[c, 0]
+                    + green * sepia_matrix[c, 1]
+                    + blue * sepia_matrix[c, 2]
+                )
+                out[i, j, c] = min(value, maximum)
 
-    return gray_image
+    # Return image
+    # don't forget to make sure it's the right type!
+    return out
 
 
-@jit(nopython=True)
-def numba_color2sepia(image: np.array) -> np.array:
+def numba_color2sepia(image: np.array, precision: str = "float64") -> np.array:
     """Convert rgb pixel array to sepia
 
     Args:
-        image (np.array)
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
+        precision (str): float type to compute in, 'float64' or 'float32'
     Returns:
         np.array: sepia_image
     """
-    sepia_image = np.zeros_like(image)
     sepia_matrix = np.array(
         [
             [0.393, 0.769, 0.189],  # red
             [0.349, 0.686, 0.168],  # green
             [0.272, 0.534, 0.131],  # blue
-        ]
+        ],
+        dtype=precision,
+    )
+    maximum = sepia_matrix.dtype.type(channels.max_value(image))
+    return _color2sepia(
+        channels.rgb_view(image), sepia_matrix, maximum, channels.empty_output(image)
     )
-    # Iterate through the pixels
-    # applying the sepia matrix
-    for i in range(3):
-        sepia_image[:, :, i] = np.clip(
-            (
-                image[:, :, 0] * sepia_matrix[i, 0]
-                + image[:, :, 1] * sepia_matrix[i, 1]
-                + image[:, :, 2] * sepia_matrix[i, 2]
-            ),
-            0,
-            255,
-        )
-
-    sepia_image = sepia_image.astype("uint8")
-    # print(sepia_image)
 
-    # Return image
-    # don't forget to make sure it's the right type!
-    return sepia_image
+
+@jit(nopython=True, cache=True)
+def _color_matrix(
+    image: np.array, matrix: np.array, offset: np.array, maximum: float, out: np.array
+) -> np.array:
+    height, width = image.shape[0], image.shape[1]
+    for i in range(height):
+        for j in range(width):
+            red = image[i, j, 0]
+            green = image[i, j, 1]
+            blue = image[i, j, 2]
+            for c in range(3):
+                value = (
+                    matrix[c, 0] * red
+                    + matrix[c, 1] * green
+                    + matrix[c, 2] * blue
+                    + offset[c]
+                )
+                out[i, j, c] = min(max(value, 0), maximum)
+
+    return out
+
+
+def numba_color_matrix(
+    image: np.array,
+    matrix: np.array,
+    offset: np.array = None,
+    precision: str = "float64",
+) -> np.array:
+    """Apply an affine colour transform to an rgb pixel array
+
+    Every pixel is mapped to `matrix @ rgb + offset`, clipped to [0, 255]
+    (or [0, 65535] for uint16 images), in a single pass without temporary
+    arrays.
+
+    Args:
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
+        matrix (np.array): 3x3 matrix, row `i` gives the weights of channel `i`
+        offset (np.array): constant added to each channel (optional)
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: filtered_image
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=precision)
+    if offset is None:
+        offset = np.zeros(3, dtype=precision)
+    offset = np.ascontiguousarray(offset, dtype=precision)
+    maximum = matrix.dtype.type(channels.max_value(image))
+    return _color_matrix(
+        channels.rgb_view(image), matrix, offset, maximum, channels.empty_output(image)
+    )
+
+
+@jit(nopython=True, cache=True)
+def _round_to_uint8(value):
+    return np.uint8(min(max(value + 0.5, 0), 255))
+
+
+@jit(nopython=True, cache=True)
+def _gaussian_blur(image: np.array, kernel: np.array) -> np.array:
+    height, width = image.shape[0], image.shape[1]
+    radius = kernel.shape[0] // 2
+    # along the rows, then along the columns,
+    # clamping indices to repeat the edge pixels
+    rows = np.empty((height, width, 3), dtype=kernel.dtype)
+    for i in range(height):
+        for j in range(width):
+            for c in range(3):
+                value = kernel[0] * image[i, max(j - radius, 0), c]
+                for k in range(1, kernel.shape[0]):
+                    jk = min(max(j + k - radius, 0), width - 1)
+                    value += kernel[k] * image[i, jk, c]
+                rows[i, j, c] = value
+    blurred = np.empty((height, width, 3), dtype=np.uint8)
+    for i in range(height):
+        for j in range(width):
+            for c in range(3):
+                value = kernel[0] * rows[max(i - radius, 0), j, c]
+                for k in range(1, kernel.shape[0]):
+                    ik = min(max(i + k - radius, 0), height - 1)
+                    value += kernel[k] * rows[ik, j, c]
+                blurred[i, j, c] = _round_to_uint8(value)
+    return blurred
+
+
+def numba_gaussian_blur(
+    image: np.array, sigma: float = 1, precision: str = "float64"
+) -> np.array:
+    """Blur an rgb pixel array with a Gaussian kernel, in two 1-D passes
+
+    Args:
+        image (np.array)
+        sigma (float): standard deviation of the kernel, in pixels
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: blurred_image
+    """
+    kernel = np.array(spatial.gaussian_kernel(sigma), dtype=precision)
+    rgb = channels.rgb_view(image, channels.uint8_only)
+    return channels.with_alpha(image, _gaussian_blur(rgb, kernel))
+
+
+@jit(nopython=True, cache=True)
+def _box_blur(image: np.array, radius: int) -> np.array:
+    height, width = image.shape[0], image.shape[1]
+    size = 2 * radius + 1
+    # summed-area table of the image extended by `radius` edge pixels,
+    # table[i, j] is the sum of the first i rows and j columns
+    table = np.zeros((height + size, width + size, 3), dtype=np.int64)
+    for i in range(height + size - 1):
+        ii = min(max(i - radius, 0), height - 1)
+        for j in range(width + size - 1):
+            jj = min(max(j - radius, 0), width - 1)
+            for c in range(3):
+                table[i + 1, j + 1, c] = (
+                    image[ii, jj, c] + table[i, j + 1, c] + table[i + 1, j, c] - table[i, j, c]
+                )
+    area = size * size
+    blurred = np.empty((height, width, 3), dtype=np.uint8)
+    for i in range(height):
+        for j in range(width):
+            for c in range(3):
+                total = (
+                    table[i + size, j + size, c]
+                    - table[i, j + size, c]
+                    - table[i + size, j, c]
+                    + table[i, j, c]
+                )
+                blurred[i, j, c] = (total + area // 2) // area
+    return blurred
+
+
+def numba_box_blur(
+    image: np.array, radius: int = 1, precision: str = "float64"
+) -> np.array:
+    """Blur an rgb pixel array with the mean of a square around each pixel,
+    using a summed-area table
+
+    Args:
+        image (np.array)
+        radius (int): the square is 2*radius+1 pixels wide
+        precision (str): unused, the sums are computed exactly with integers
+    Returns:
+        np.array: blurred_image
+    """
+    rgb = channels.rgb_view(image, channels.uint8_only)
+    return channels.with_alpha(image, _box_blur(rgb, spatial.check_radius(radius)))
+
+
+@jit(nopython=True, cache=True)
+def _sharpen(image: np.array, amount: np.array) -> np.array:
+    height, width = image.shape[0], image.shape[1]
+    weight = amount[0]
+    center = 1 + 4 * weight
+    sharpened = np.empty((height, width, 3), dtype=np.uint8)
+    for i in range(height):
+        up = max(i - 1, 0)
+        down = min(i + 1, height - 1)
+        for j in range(width):
+            left = max(j - 1, 0)
+            right = min(j + 1, width - 1)
+            for c in range(3):
+                neighbours = (
+                    image[up, j, c] + image[down, j, c] + image[i, left, c] + image[i, right, c]
+                )
+                value = center * image[i, j, c] - weight * neighbours
+                sharpened[i, j, c] = _round_to_uint8(value)
+    return sharpened
+
+
+def numba_sharpen(
+    image: np.array, amount: float = 1, precision: str = "float64"
+) -> np.array:
+    """Sharpen an rgb pixel array with a Laplacian kernel
+
+    Args:
+        image (np.array)
+        amount (float): strength of the sharpening
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: sharpened_image
+    """
+    rgb = channels.rgb_view(image, channels.uint8_only)
+    amount = np.array([amount], dtype=precision)
+    return channels.with_alpha(image, _sharpen(rgb, amount))
+
+
+@jit(nopython=True, cache=True)
+def _sobel(image: np.array, weights: np.array) -> np.array:
+    height, width = image.shape[0], image.shape[1]
+    gray = np.empty((height, width), dtype=weights.dtype)
+    for i in range(height):
+        for j in range(width):
+            gray[i, j] = (
+                image[i, j, 0] * weights[0]
+                + image[i, j, 1] * weights[1]
+                + image[i, j, 2] * weights[2]
+            )
+    edges = np.empty((height, width, 3), dtype=np.uint8)
+    for i in range(height):
+        up = max(i - 1, 0)
+        down = min(i + 1, height - 1)
+        for j in range(width):
+            left = max(j - 1, 0)
+            right = min(j + 1, width - 1)
+            gradient_x = (
+                gray[up, right] + 2 * gray[i, right] + gray[down, right]
+            ) - (gray[up, left] + 2 * gray[i, left] + gray[down, left])
+            gradient_y = (
+                gray[down, left] + 2 * gray[down, j] + gray[down, right]
+            ) - (gray[up, left] + 2 * gray[up, j] + gray[up, right])
+            value = _round_to_uint8(np.sqrt(gradient_x**2 + gradient_y**2))
+            edges[i, j, 0] = value
+            edges[i, j, 1] = value
+            edges[i, j, 2] = value
+    return edges
+
+
+def numba_sobel(image: np.array, precision: str = "float64") -> np.array:
+    """Detect edges in an rgb pixel array, with the Sobel gradient magnitude
+
+    Args:
+        image (np.array)
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: edge_image, gray
+    """
+    weights = np.array(spatial.GRAY_WEIGHTS, dtype=precision)
+    rgb = channels.rgb_view(image, channels.uint8_only)
+    return channels.with_alpha(image, _sobel(rgb, weights))
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def _histogram(image: np.array, chunks: int) -> np.array:
+    height, width = image.shape[0], image.shape[1]
+    # one histogram per chunk of rows, so the threads
+    # never write to the same counts, summed at the end
+    partial = np.zeros((chunks, 3, 256), dtype=np.int64)
+    for chunk in prange(chunks):
+        for i in range(chunk * height // chunks, (chunk + 1) * height // chunks):
+            for j in range(width):
+                for c in range(3):
+                    partial[chunk, c, image[i, j, c]] += 1
+    return partial.sum(axis=0)
+
+
+def numba_histogram(image: np.array) -> np.array:
+    """Count the values of each channel of an rgb pixel array,
+    in parallel over chunks of rows
+
+    Returns:
+        np.array: histogram, 3x256 counts
+    """
+    rgb = channels.rgb_view(image, channels.uint8_only)
+    return _histogram(rgb, numba.get_num_threads())
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def _apply_lut(image: np.array, lut: np.array) -> np.array:
+    height, width = image.shape[0], image.shape[1]
+    mapped = np.empty((height, width, 3), dtype=np.uint8)
+    for i in prange(height):
+        for j in range(width):
+            for c in range(3):
+                mapped[i, j, c] = lut[c, image[i, j, c]]
+    return mapped
+
+
+def numba_apply_lut(image: np.array, lut: np.array) -> np.array:
+    """Map each channel of an rgb pixel array through a lookup table
+
+    Args:
+        image (np.array)
+        lut (3x256 array-like): the new value of each value, for each channel
+    Returns:
+        np.array: mapped_image
+    """
+    rgb = channels.rgb_view(image, channels.uint8_only)
+    lut = np.ascontiguousarray(lut, dtype=np.uint8)
+    return channels.with_alpha(image, _apply_lut(rgb, lut))
+
+
+def numba_auto_levels(
+    image: np.array, clip: float = 0, precision: str = "float64"
+) -> np.array:
+    """Stretch the contrast of each channel of an rgb pixel array
+
+    Args:
+        image (np.array)
+        clip (float): fraction of the darkest and brightest pixels to ignore
+        precision (str): unused, the lookup table is computed once
+    Returns:
+        np.array: stretched_image
+    """
+    lut = levels.lut("auto_levels", numba_histogram(image), clip=clip)
+    return numba_apply_lut(image, lut)
+
+
+def numba_equalize(image: np.array, precision: str = "float64") -> np.array:
+    """Equalise the histogram of each channel of an rgb pixel array
+
+    Args:
+        image (np.array)
+        precision (str): unused, the lookup table is computed once
+    Returns:
+        np.array: equalized_image
+    """
+    return numba_apply_lut(image, levels.lut("equalize", numba_histogram(image)))
+
+
+def warmup() -> None:
+    """Compile the filters for the images instapy usually passes them
+
+    That is uint8 C-contiguous images, computing in float64, either
+    read-only (from `instapy.io.read_image`) or writable (e.g. the result
+    of another filter). Other signatures (uint16 images, strided views,
+    float32) are compiled on first use, and cached on disk from then on.
+    The compiled code is written to the numba cache.
+    """
+    dtype = types.float64
+    matrix = types.Array(dtype, 2, "C")
+    vector = types.Array(dtype, 1, "C")
+    for readonly in (False, True):
+        image = types.Array(types.uint8, 3, "C", readonly=readonly)
+        out = types.Array(types.uint8, 3, "C")
+        _color2gray.compile((image, vector, out))
+        _color2sepia.compile((image, matrix, dtype, out))
+        _color_matrix.compile((image, matrix, vector, dtype, out))
+        _gaussian_blur.compile((image, vector))
+        _sharpen.compile((image, vector))
+        _sobel.compile((image, vector))
+        # the box blur sums integers, so its signature
+        # does not depend on the precision
+        _box_blur.compile((image, types.int64))
+        _histogram.compile((image, types.int64))
+        _apply_lut.compile((image, types.Array(types.uint8, 2, "C")))
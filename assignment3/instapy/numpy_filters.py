@@ -3,35 +3,45 @@
 from typing import Optional
 import numpy as np
 
+from . import channels, levels, spatial
 
-def numpy_color2gray(image: np.array) -> np.array:
+
+def numpy_color2gray(image: np.array, precision: str = "float64") -> np.array:
     """Convert rgb pixel array to grayscale
 
     Args:
-        image (np.array)
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
+        precision (str): float type to compute in, 'float64' or 'float32'
     Returns:
         np.array: gray_image
     """
     # Hint: use numpy slicing in order to have fast vectorized code
+    rgb = channels.rgb_view(image)
+
+    # compute in the requested precision, adding in place
+    # so there is only one float temporary
+    gray = np.multiply(rgb[:, :, 0], 0.21, dtype=precision)
+    gray += np.multiply(rgb[:, :, 1], 0.72, dtype=precision)
+    gray += np.multiply(rgb[:, :, 2], 0.07, dtype=precision)
 
-    gray = image[:, :, 0] * 0.21 + image[:, :, 1] * 0.72 + image[:, :, 2] * 0.07
-    gray_image = np.empty_like(image)
+    # the output has the type of the input (make sure it's the right type!)
+    gray_image = channels.empty_output(image)
     gray_image[:, :, 0] = gray
     gray_image[:, :, 1] = gray
     gray_image[:, :, 2] = gray
 
-    # Return image (make sure it's the right type!)
-    gray_image = gray_image.astype("uint8")
-
     return gray_image
 
 
-def numpy_color2sepia(image: np.array, k: Optional[float] = 1) -> np.array:
+def numpy_color2sepia(
+    image: np.array, k: Optional[float] = 1, precision: str = "float64"
+) -> np.array:
     """Convert rgb pixel array to sepia
 
     Args:
-        image (np.array)
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
         k (float): amount of sepia filter to apply (optional)
+        precision (str): float type to compute in, 'float64' or 'float32'
 
     The amount of sepia is given as a fraction, k=0 yields no sepia while
     k=1 yields full sepia.
@@ -58,6 +68,8 @@ def numpy_color2sepia(image: np.array, k: Optional[float] = 1) -> np.array:
         ]
     )
     tuned_matrix = k * (sepia_matrix - identity_matrix) + identity_matrix
+    # uint8 @ float32 is computed in float32
+    tuned_matrix = tuned_matrix.astype(precision)
 
     # HINT: For version without adaptive sepia filter, use the same matrix as in the pure python implementation
     # use Einstein sum to apply pixel transform matrix
@@ -65,11 +77,226 @@ def numpy_color2sepia(image: np.array, k: Optional[float] = 1) -> np.array:
     # Used einsum, but found matmul was faster
     # sepia_image = np.minimum(np.einsum('ijk,sk->ijs', image, sepia_matrix), 255)
 
-    # Apply the matrix filter
-    sepia_image = np.minimum(image @ tuned_matrix.transpose(), 255)
+    # Apply the matrix filter to the colour channels
+    sepia = channels.rgb_view(image) @ tuned_matrix.transpose()
 
-    # Check which entries have a value greater than 255 and set it to 255 since we can not display values bigger than 255
-    sepia_image = sepia_image.astype("uint8")
+    # Check which entries have a value greater than the maximum (255 for uint8) and set it to the maximum since we can not display values bigger than that
+    np.minimum(sepia, channels.max_value(image), out=sepia)
 
     # Return image (make sure it's the right type!)
+    sepia_image = channels.empty_output(image)
+    sepia_image[:, :, :3] = sepia
     return sepia_image
+
+
+def numpy_color_matrix(
+    image: np.array,
+    matrix: np.array,
+    offset: Optional[np.array] = None,
+    precision: str = "float64",
+) -> np.array:
+    """Apply an affine colour transform to an rgb pixel array
+
+    Every pixel is mapped to `matrix @ rgb + offset`, clipped to [0, 255]
+    (or [0, 65535] for uint16 images).
+
+    Args:
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
+        matrix (np.array): 3x3 matrix, row `i` gives the weights of channel `i`
+        offset (np.array): constant added to each channel (optional)
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: filtered_image
+    """
+    filtered = channels.rgb_view(image) @ np.asarray(matrix, dtype=precision).transpose()
+    if offset is not None:
+        filtered += np.asarray(offset, dtype=precision)
+    # clip in place, to avoid another float temporary
+    np.clip(filtered, 0, channels.max_value(image), out=filtered)
+    filtered_image = channels.empty_output(image)
+    filtered_image[:, :, :3] = filtered
+    return filtered_image
+
+
+def _pad(image: np.array, halo: int) -> np.array:
+    """Extend an image by `halo` pixels on each side, repeating the edges"""
+    return np.pad(image, ((halo, halo), (halo, halo), (0, 0)), mode="edge")
+
+
+def _round_to_uint8(filtered: np.array) -> np.array:
+    """Round float pixel values to the nearest integer, clipped to [0, 255]"""
+    # in place, to avoid more float temporaries
+    filtered += 0.5
+    np.clip(filtered, 0, 255, out=filtered)
+    return filtered.astype("uint8")
+
+
+def numpy_gaussian_blur(
+    image: np.array, sigma: float = 1, precision: str = "float64"
+) -> np.array:
+    """Blur an rgb pixel array with a Gaussian kernel
+
+    The 2-D kernel is separable, so the image is filtered along the rows
+    and then along the columns with the 1-D kernel.
+
+    Args:
+        image (np.array)
+        sigma (float): standard deviation of the kernel, in pixels
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: blurred_image
+    """
+    kernel = np.array(spatial.gaussian_kernel(sigma), dtype=precision)
+    radius = len(kernel) // 2
+    height, width = image.shape[:2]
+    padded = _pad(channels.rgb_view(image, channels.uint8_only), radius)
+
+    # along the rows, keeping the padding rows for the second pass
+    rows = np.zeros((padded.shape[0], width, 3), dtype=precision)
+    for i, weight in enumerate(kernel):
+        rows += padded[:, i : i + width] * weight
+    # along the columns
+    blurred = np.zeros((height, width, 3), dtype=precision)
+    for i, weight in enumerate(kernel):
+        blurred += rows[i : i + height] * weight
+    return channels.with_alpha(image, _round_to_uint8(blurred))
+
+
+def numpy_box_blur(
+    image: np.array, radius: int = 1, precision: str = "float64"
+) -> np.array:
+    """Blur an rgb pixel array with the mean of a square around each pixel
+
+    The sums are taken from a summed-area table, with four lookups per
+    pixel whatever the radius.
+
+    Args:
+        image (np.array)
+        radius (int): the square is 2*radius+1 pixels wide
+        precision (str): unused, the sums are computed exactly with integers
+    Returns:
+        np.array: blurred_image
+    """
+    radius = spatial.check_radius(radius)
+    size = 2 * radius + 1
+    padded = _pad(channels.rgb_view(image, channels.uint8_only), radius)
+    # table[i, j] is the sum of padded[:i, :j]
+    table = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1, 3), dtype=np.int64)
+    np.cumsum(padded, axis=0, dtype=np.int64, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    sums = table[size:, size:] - table[:-size, size:]
+    sums -= table[size:, :-size]
+    sums += table[:-size, :-size]
+    area = size * size
+    # integer division, rounding to nearest
+    return channels.with_alpha(image, ((sums + area // 2) // area).astype("uint8"))
+
+
+def numpy_sharpen(
+    image: np.array, amount: float = 1, precision: str = "float64"
+) -> np.array:
+    """Sharpen an rgb pixel array
+
+    Each pixel is moved away from its 4 direct neighbours by `amount` times
+    the difference (a Laplacian kernel).
+
+    Args:
+        image (np.array)
+        amount (float): strength of the sharpening
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: sharpened_image
+    """
+    padded = _pad(channels.rgb_view(image, channels.uint8_only), 1).astype(precision)
+    neighbours = padded[:-2, 1:-1] + padded[2:, 1:-1]
+    neighbours += padded[1:-1, :-2]
+    neighbours += padded[1:-1, 2:]
+    neighbours *= -amount
+    sharpened = padded[1:-1, 1:-1] * np.asarray(1 + 4 * amount, dtype=precision)
+    sharpened += neighbours
+    return channels.with_alpha(image, _round_to_uint8(sharpened))
+
+
+def numpy_sobel(image: np.array, precision: str = "float64") -> np.array:
+    """Detect edges in an rgb pixel array
+
+    Computes the magnitude of the Sobel gradient of the gray image,
+    with the separable kernels [1, 2, 1] and [-1, 0, 1].
+
+    Args:
+        image (np.array)
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: edge_image, gray
+    """
+    rgb = channels.rgb_view(image, channels.uint8_only)
+    gray = np.multiply(rgb[:, :, 0], spatial.GRAY_WEIGHTS[0], dtype=precision)
+    gray += np.multiply(rgb[:, :, 1], spatial.GRAY_WEIGHTS[1], dtype=precision)
+    gray += np.multiply(rgb[:, :, 2], spatial.GRAY_WEIGHTS[2], dtype=precision)
+    padded = np.pad(gray, 1, mode="edge")
+
+    # smooth across the gradient direction, then take the difference
+    smooth = padded[:-2] + 2 * padded[1:-1] + padded[2:]
+    gradient_x = smooth[:, 2:] - smooth[:, :-2]
+    smooth = padded[:, :-2] + 2 * padded[:, 1:-1] + padded[:, 2:]
+    gradient_y = smooth[2:] - smooth[:-2]
+
+    edges = _round_to_uint8(np.hypot(gradient_x, gradient_y))
+    edge_image = channels.empty_output(image)
+    edge_image[:, :, :3] = edges[:, :, np.newaxis]
+    return edge_image
+
+
+def numpy_histogram(image: np.array) -> np.array:
+    """Count the values of each channel of an rgb pixel array
+
+    Returns:
+        np.array: histogram, 3x256 counts
+    """
+    rgb = channels.rgb_view(image, channels.uint8_only)
+    return np.stack([np.bincount(rgb[:, :, c].ravel(), minlength=256) for c in range(3)])
+
+
+def numpy_apply_lut(image: np.array, lut: np.array) -> np.array:
+    """Map each channel of an rgb pixel array through a lookup table
+
+    Args:
+        image (np.array)
+        lut (3x256 array-like): the new value of each value, for each channel
+    Returns:
+        np.array: mapped_image
+    """
+    lut = np.asarray(lut, dtype=np.uint8)
+    rgb = channels.rgb_view(image, channels.uint8_only)
+    mapped = channels.empty_output(image)
+    for c in range(3):
+        mapped[:, :, c] = lut[c][rgb[:, :, c]]
+    return mapped
+
+
+def numpy_auto_levels(
+    image: np.array, clip: float = 0, precision: str = "float64"
+) -> np.array:
+    """Stretch the contrast of each channel of an rgb pixel array
+
+    Args:
+        image (np.array)
+        clip (float): fraction of the darkest and brightest pixels to ignore
+        precision (str): unused, the lookup table is computed once
+    Returns:
+        np.array: stretched_image
+    """
+    lut = levels.lut("auto_levels", numpy_histogram(image), clip=clip)
+    return numpy_apply_lut(image, lut)
+
+
+def numpy_equalize(image: np.array, precision: str = "float64") -> np.array:
+    """Equalise the histogram of each channel of an rgb pixel array
+
+    Args:
+        image (np.array)
+        precision (str): unused, the lookup table is computed once
+    Returns:
+        np.array: equalized_image
+    """
+    return numpy_apply_lut(image, levels.lut("equalize", numpy_histogram(image)))
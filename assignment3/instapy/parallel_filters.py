@@ -0,0 +1,270 @@
+"""multi-threaded numpy implementation of image filters
+
+The image is split into bands of rows small enough for their float
+temporaries to stay in the CPU cache, and the numpy filters are run on the
+bands in a thread pool, writing into one shared output array. numpy
+releases the GIL during ufuncs and matmul, so the bands run in parallel.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional
+
+import numpy as np
+
+from . import channels, levels, numpy_filters, spatial
+from .tiled import band_rows, filter_band, iter_bands
+
+# working set per band, about the size of a per-core L2 cache
+default_band_bytes = 1024 * 1024
+
+_executor = None
+
+
+def executor() -> ThreadPoolExecutor:
+    """Return the shared thread pool, creating it on first use
+
+    Uses one thread per available core.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 1, thread_name_prefix="instapy"
+        )
+    return _executor
+
+
+def filter_parallel(
+    filter_function: Callable,
+    image: np.array,
+    out: Optional[np.array] = None,
+    band_bytes: int = default_band_bytes,
+    halo: int = 0,
+    **kwargs,
+) -> np.array:
+    """Apply a filter to bands of an image in parallel
+
+    Args:
+        filter_function (callable): the filter to apply to each band
+        image (np.array): the image
+        out (np.array, optional):
+            array to write the result to. Default: a new array
+        band_bytes (int): memory budget for one band
+        halo (int):
+            rows of the neighbouring bands each band needs,
+            for spatial filters (see `instapy.spatial.halo`)
+        **kwargs: passed on to the filter
+    Returns:
+        out (np.array): the filtered image
+    """
+    if out is None:
+        out = np.empty(channels.output_shape(image), dtype=image.dtype)
+
+    if kwargs:
+        filter_function = partial(filter_function, **kwargs)
+
+    def run_band(start: int, stop: int) -> None:
+        out[start:stop] = filter_band(filter_function, image, start, stop, halo)
+
+    rows = band_rows(image, band_bytes, halo)
+    futures = [
+        executor().submit(run_band, start, stop)
+        for start, stop in iter_bands(image.shape[0], rows)
+    ]
+    for future in futures:
+        # re-raises any exception from the band
+        future.result()
+    return out
+
+
+def parallel_color2gray(image: np.array, precision: str = "float64") -> np.array:
+    """Convert rgb pixel array to grayscale
+
+    Args:
+        image (np.array)
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: gray_image
+    """
+    return filter_parallel(
+        numpy_filters.numpy_color2gray, image, precision=precision
+    )
+
+
+def parallel_color2sepia(
+    image: np.array, k: Optional[float] = 1, precision: str = "float64"
+) -> np.array:
+    """Convert rgb pixel array to sepia
+
+    Args:
+        image (np.array)
+        k (float): amount of sepia filter to apply (optional)
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: sepia_image
+    """
+    return filter_parallel(
+        numpy_filters.numpy_color2sepia, image, k=k, precision=precision
+    )
+
+
+def parallel_color_matrix(
+    image: np.array,
+    matrix: np.array,
+    offset: Optional[np.array] = None,
+    precision: str = "float64",
+) -> np.array:
+    """Apply an affine colour transform to an rgb pixel array
+
+    Args:
+        image (np.array)
+        matrix (np.array): 3x3 matrix, row `i` gives the weights of channel `i`
+        offset (np.array): constant added to each channel (optional)
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: filtered_image
+    """
+    return filter_parallel(
+        numpy_filters.numpy_color_matrix,
+        image,
+        matrix=matrix,
+        offset=offset,
+        precision=precision,
+    )
+
+
+def parallel_gaussian_blur(
+    image: np.array, sigma: float = 1, precision: str = "float64"
+) -> np.array:
+    """Blur an rgb pixel array with a Gaussian kernel
+
+    Args:
+        image (np.array)
+        sigma (float): standard deviation of the kernel, in pixels
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: blurred_image
+    """
+    return filter_parallel(
+        numpy_filters.numpy_gaussian_blur,
+        image,
+        halo=spatial.halo("gaussian_blur", sigma=sigma),
+        sigma=sigma,
+        precision=precision,
+    )
+
+
+def parallel_box_blur(
+    image: np.array, radius: int = 1, precision: str = "float64"
+) -> np.array:
+    """Blur an rgb pixel array with the mean of a square around each pixel
+
+    Args:
+        image (np.array)
+        radius (int): the square is 2*radius+1 pixels wide
+        precision (str): unused, the sums are computed exactly with integers
+    Returns:
+        np.array: blurred_image
+    """
+    return filter_parallel(
+        numpy_filters.numpy_box_blur,
+        image,
+        halo=spatial.halo("box_blur", radius=radius),
+        radius=radius,
+    )
+
+
+def parallel_sharpen(
+    image: np.array, amount: float = 1, precision: str = "float64"
+) -> np.array:
+    """Sharpen an rgb pixel array with a Laplacian kernel
+
+    Args:
+        image (np.array)
+        amount (float): strength of the sharpening
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: sharpened_image
+    """
+    return filter_parallel(
+        numpy_filters.numpy_sharpen,
+        image,
+        halo=spatial.halo("sharpen"),
+        amount=amount,
+        precision=precision,
+    )
+
+
+def parallel_sobel(image: np.array, precision: str = "float64") -> np.array:
+    """Detect edges in an rgb pixel array, with the Sobel gradient magnitude
+
+    Args:
+        image (np.array)
+        precision (str): float type to compute in, 'float64' or 'float32'
+    Returns:
+        np.array: edge_image, gray
+    """
+    return filter_parallel(
+        numpy_filters.numpy_sobel,
+        image,
+        halo=spatial.halo("sobel"),
+        precision=precision,
+    )
+
+
+def parallel_histogram(image: np.array, band_bytes: int = default_band_bytes) -> np.array:
+    """Count the values of each channel of an rgb pixel array
+
+    The bands are counted in parallel, and their histograms summed.
+
+    Returns:
+        np.array: histogram, 3x256 counts
+    """
+    rows = band_rows(image, band_bytes)
+    futures = [
+        executor().submit(numpy_filters.numpy_histogram, image[start:stop])
+        for start, stop in iter_bands(image.shape[0], rows)
+    ]
+    return sum(future.result() for future in futures)
+
+
+def parallel_apply_lut(image: np.array, lut: np.array) -> np.array:
+    """Map each channel of an rgb pixel array through a lookup table
+
+    Args:
+        image (np.array)
+        lut (3x256 array-like): the new value of each value, for each channel
+    Returns:
+        np.array: mapped_image
+    """
+    lut = np.asarray(lut, dtype=np.uint8)
+    return filter_parallel(numpy_filters.numpy_apply_lut, image, lut=lut)
+
+
+def parallel_auto_levels(
+    image: np.array, clip: float = 0, precision: str = "float64"
+) -> np.array:
+    """Stretch the contrast of each channel of an rgb pixel array
+
+    Args:
+        image (np.array)
+        clip (float): fraction of the darkest and brightest pixels to ignore
+        precision (str): unused, the lookup table is computed once
+    Returns:
+        np.array: stretched_image
+    """
+    lut = levels.lut("auto_levels", parallel_histogram(image), clip=clip)
+    return parallel_apply_lut(image, lut)
+
+
+def parallel_equalize(image: np.array, precision: str = "float64") -> np.array:
+    """Equalise the histogram of each channel of an rgb pixel array
+
+    Args:
+        image (np.array)
+        precision (str): unused, the lookup table is computed once
+    Returns:
+        np.array: equalized_image
+    """
+    return parallel_apply_lut(image, levels.lut("equalize", parallel_histogram(image)))
@@ -0,0 +1,162 @@
+"""Filter composition
+
+Chains of linear colour operations (gray, sepia, brightness, channel mixing)
+are all affine maps of the rgb values, so they can be folded into a single
+3x3 matrix and offset, and applied to the image in one pass.
+"""
+
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+import instapy
+from .spatial import GRAY_WEIGHTS
+
+SEPIA_MATRIX = (
+    (0.393, 0.769, 0.189),
+    (0.349, 0.686, 0.168),
+    (0.272, 0.534, 0.131),
+)
+
+# a step is either a filter name, a (name, parameters) pair, or a callable
+Step = Union[str, Tuple[str, Dict], Callable]
+# an affine colour transform, applied as `matrix @ rgb + offset`
+Affine = Tuple[np.ndarray, np.ndarray]
+
+
+def gray_matrix() -> Affine:
+    """Return the affine transform of the grayscale filter"""
+    matrix = np.array([GRAY_WEIGHTS] * 3)
+    return matrix, np.zeros(3)
+
+
+def sepia_matrix(k: float = 1) -> Affine:
+    """Return the affine transform of the sepia filter
+
+    Args:
+        k (float): amount of sepia filter to apply, between 0 and 1
+    """
+    if not 0 <= k <= 1:
+        raise ValueError(f"k must be between [0-1], got {k=}")
+    identity = np.eye(3)
+    matrix = k * (np.array(SEPIA_MATRIX) - identity) + identity
+    return matrix, np.zeros(3)
+
+
+def brightness_matrix(factor: float = 1, offset: float = 0) -> Affine:
+    """Return the affine transform scaling every channel by `factor`
+
+    Args:
+        factor (float): multiplier for every channel
+        offset (float): constant added to every channel afterwards
+    """
+    return factor * np.eye(3), np.full(3, float(offset))
+
+
+def channel_mix_matrix(matrix: Sequence, offset: Sequence = (0, 0, 0)) -> Affine:
+    """Return the affine transform of an arbitrary channel mix
+
+    Args:
+        matrix (3x3 array-like): row `i` holds the weights of output channel `i`
+        offset (3 array-like): constant added to each output channel
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    offset = np.asarray(offset, dtype=np.float64)
+    if matrix.shape != (3, 3) or offset.shape != (3,):
+        raise ValueError(
+            f"channel mix needs a 3x3 matrix and 3 offsets, got {matrix.shape} and {offset.shape}"
+        )
+    return matrix, offset
+
+
+LINEAR_FILTERS = {
+    "color2gray": gray_matrix,
+    "color2sepia": sepia_matrix,
+    "brightness": brightness_matrix,
+    "channel_mix": channel_mix_matrix,
+}
+
+
+def _parse_step(step: Step) -> Tuple[Union[str, Callable], Dict]:
+    """Split a step into its filter (name or callable) and its parameters"""
+    if isinstance(step, tuple):
+        name, params = step
+        return name, dict(params)
+    if isinstance(step, str) or callable(step):
+        return step, {}
+    raise TypeError(f"Cannot use {step!r} as a filter step")
+
+
+def fuse(steps: Sequence[Step]) -> List[Union[Affine, Tuple[Union[str, Callable], Dict]]]:
+    """Fold consecutive linear colour steps into single affine transforms
+
+    Args:
+        steps (list): filter steps, see `compose`
+    Returns:
+        stages (list):
+            Each stage is either an affine `(matrix, offset)` pair of arrays,
+            or a `(filter, params)` pair for a non-linear step
+    """
+    stages = []
+    current = None
+    for step in steps:
+        filter, params = _parse_step(step)
+        if isinstance(filter, str) and filter in LINEAR_FILTERS:
+            matrix, offset = LINEAR_FILTERS[filter](**params)
+            if current is None:
+                current = (matrix, offset)
+            else:
+                # A2 (A1 x + b1) + b2 = (A2 A1) x + (A2 b1 + b2)
+                previous_matrix, previous_offset = current
+                current = (matrix @ previous_matrix, matrix @ previous_offset + offset)
+            continue
+        if current is not None:
+            stages.append(current)
+            current = None
+        stages.append((filter, params))
+    if current is not None:
+        stages.append(current)
+    return stages
+
+
+def compose(steps: Sequence[Step], implementation: str = "numpy") -> Callable:
+    """Compose several filters into one filter function
+
+    Consecutive linear colour steps are fused, and applied with a single
+    call to the `color_matrix` kernel of the chosen implementation.
+    Non-linear steps break the fusion and are run as they are.
+
+    Note that fused steps are only clipped to [0, 255] once, at the end,
+    so the result can differ from running the filters one by one
+    when an intermediate result would have saturated.
+
+    Args:
+        steps (list):
+            The filters to apply, in order. Each step is a filter name
+            (e.g. 'color2sepia'), a `(name, params)` pair
+            (e.g. `('color2sepia', {'k': 0.5})`) or a callable taking
+            and returning an image.
+        implementation (str):
+            The implementation to run the filters with
+    Returns:
+        filter_function (function):
+            Function taking an image and returning the filtered image
+    """
+    kernels = []
+    for stage in fuse(steps):
+        if isinstance(stage[0], np.ndarray):
+            color_matrix = instapy.get_filter("color_matrix", implementation)
+            kernels.append((color_matrix, stage, {}))
+            continue
+        filter, params = stage
+        if isinstance(filter, str):
+            kernels.append((instapy.get_filter(filter, implementation), (), params))
+        else:
+            kernels.append((filter, (), params))
+
+    def composed(image: np.array) -> np.array:
+        for kernel, args, kwargs in kernels:
+            image = kernel(image, *args, **kwargs)
+        return image
+
+    return composed
@@ -1,19 +1,35 @@
 """
 Profiling (IN4110 only)
+
+Can be executed as `python3 -m instapy.profiling`,
+see `python3 -m instapy.profiling --help` for options.
+
+With `--output-dir`, every profile is also saved as
+`<implementation>_<filter>_<width>x<height>.prof` (cProfile stats,
+e.g. for snakeviz) and `.collapsed` (collapsed stacks, for flamegraph.pl
+or speedscope).
 """
 
-import pstats
+import argparse
 import cProfile
-import line_profiler
+import pstats
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
 
-import numpy
+try:
+    import line_profiler
+except ImportError:
+    line_profiler = None
 
 import instapy
 from . import io
 
 
-def profile_with_cprofile(filter, image, ncalls=3):
-    """Profile filter(image) with line_profiler
+def profile_with_cprofile(filter, image, ncalls=3, top=10, output=None):
+    """Profile filter(image) with cProfile
 
     Statistics will be printed to stdout.
 
@@ -22,14 +38,23 @@ def profile_with_cprofile(filter, image, ncalls=3):
         filter (callable): filter function
         image (ndarray): image to filter
         ncalls (int): number of repetitions to measure
+        top (int): number of functions to print
+        output (str, optional): file to save the stats to (.prof)
+    Returns:
+        stats (pstats.Stats): the collected statistics
     """
     profiler = cProfile.Profile()
     # run `filter(image)` in the profiler
-    ...
+    profiler.enable()
+    for _ in range(ncalls):
+        filter(image)
+    profiler.disable()
+    if output:
+        profiler.dump_stats(output)
     stats = pstats.Stats(profiler)
-    # print the top 10 results, sorted by cumulative time
-    # (check sort_stats and print_stats docstrings)
-    ...
+    # print the top results, sorted by cumulative time
+    stats.sort_stats("cumulative").print_stats(top)
+    return stats
 
 
 def profile_with_line_profiler(filter, image, ncalls=3):
@@ -43,49 +68,214 @@ def profile_with_line_profiler(filter, image, ncalls=3):
         image (ndarray): image to filter
         ncalls (int): number of repetitions to measure
     """
+    if line_profiler is None:
+        raise ImportError("line_profiler is needed: pip install line_profiler")
     # create the LineProfiler
     profiler = line_profiler.LineProfiler()
     # tell it to measure the function we are given
     profiler.add_function(filter)
     # Measure filter(image)
-    ...
+    profiler.enable()
+    for _ in range(ncalls):
+        filter(image)
+    profiler.disable()
     # print statistics
-    ...
+    profiler.print_stats()
+
+
+def _label(code) -> str:
+    """Return the name of a Python function in a collapsed stack"""
+    return f"{Path(code.co_filename).stem}.{code.co_name}"
+
+
+def collapsed_stacks(filter, image, ncalls=3) -> Dict[str, float]:
+    """Measure the time spent in every call stack of filter(image)
+
+    Uses `sys.setprofile` to follow every Python and builtin call,
+    and attributes elapsed time to the innermost function (self time).
+    Compiled code (numba, cython) shows up as time in its caller.
+
+    Args:
+
+        filter (callable): filter function
+        image (ndarray): image to filter
+        ncalls (int): number of repetitions to measure
+    Returns:
+        stacks (dict):
+            Maps each call stack, as function names joined by ';',
+            to the time (in seconds) spent in its innermost function
+    """
+    stacks = Counter()
+    stack = []
+    last = time.perf_counter()
 
+    def tracer(frame, event, arg):
+        nonlocal last
+        now = time.perf_counter()
+        if stack:
+            stacks[";".join(stack)] += now - last
+        if event == "call":
+            stack.append(_label(frame.f_code))
+        elif event == "c_call":
+            module = getattr(arg, "__module__", None) or "builtins"
+            stack.append(f"{module}.{getattr(arg, '__qualname__', arg.__name__)}")
+        elif stack:
+            # return, c_return or c_exception
+            stack.pop()
+        # exclude the time spent in the tracer itself
+        last = time.perf_counter()
 
-def run_profiles(profiler: str = "cprofile"):
+    for _ in range(ncalls):
+        sys.setprofile(tracer)
+        try:
+            filter(image)
+        finally:
+            sys.setprofile(None)
+            stack.clear()
+    return dict(stacks)
+
+
+def write_collapsed(stacks: Dict[str, float], filename: str) -> None:
+    """Write call stacks in the collapsed format read by flame graph tools
+
+    Every line is a stack followed by its time in microseconds,
+    e.g. `numpy_filters.numpy_color2gray;numpy.clip 1234`
+    """
+    with open(filename, "w") as f:
+        for stack, seconds in sorted(stacks.items()):
+            f.write(f"{stack} {round(seconds * 1e6)}\n")
+
+
+def print_hotspots(stacks: Dict[str, float], top: int = 10) -> None:
+    """Print the functions with the most self time"""
+    self_times = Counter()
+    for stack, seconds in stacks.items():
+        self_times[stack.rsplit(";", 1)[-1]] += seconds
+    total = sum(self_times.values()) or 1
+    print(f"Top {top} hotspots (self time):")
+    for function, seconds in self_times.most_common(top):
+        print(f"{seconds:10.4f}s {100 * seconds / total:5.1f}%  {function}")
+
+
+def run_profiles(
+    profiler: str = "cprofile",
+    sizes: Sequence[Tuple[int, int]] = ((640, 480),),
+    filter_names: Optional[Sequence[str]] = None,
+    implementations: Optional[Sequence[str]] = None,
+    output_dir: Optional[str] = None,
+    top: int = 10,
+):
     """Run profiles of every implementation
 
     Args:
 
         profiler (str): either 'line_profiler' or 'cprofile'
+        sizes (list): (width, height) of the random images to profile with
+        filter_names (list, optional): the filters to profile.
+            Default: every filter (`instapy.filter_names`)
+        implementations (list, optional): the implementations to profile.
+            Default: every installed implementation
+            (`instapy.installed_implementations`)
+        output_dir (str, optional):
+            directory to save .prof and .collapsed files to (cprofile only)
+        top (int): number of hotspots to print
     """
     # Select which profile function to use
     if profiler == "line_profiler":
-        profile_func = ...
+        profile_func = profile_with_line_profiler
     elif profiler.lower() == "cprofile":
-        profile_func = ...
+        profile_func = profile_with_cprofile
     else:
         raise ValueError(f"{profiler=} must be 'line_profiler' or 'cprofile'")
 
-    # construct a random 640x480 image
-    image = ...
+    if filter_names is None:
+        filter_names = instapy.filter_names()
+    if implementations is None:
+        implementations = instapy.installed_implementations()
 
-    filter_names = ...
-    implementations = ...
-    for filter_name in filter_names:
-        for implementation in implementations:
-            print(f"Profiling {implementation} {filter_name} with {profiler}:")
-            filter = instapy.get_filter(filter_name, implementation)  #
-            # call it once
-            filter(image)
-            profile_func(filter, image)
+    if output_dir:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    for width, height in sizes:
+        # construct a random image
+        image = io.random_image(width, height)
+        for filter_name in filter_names:
+            for implementation in implementations:
+                try:
+                    filter = instapy.get_filter(filter_name, implementation)
+                except AttributeError:
+                    # e.g. the spatial filters of the bytes implementation
+                    continue
+                except ImportError as e:
+                    print(f"Skipping {implementation}, not available: {e}")
+                    continue
+                print(
+                    f"Profiling {implementation} {filter_name}"
+                    f" ({width}x{height}) with {profiler}:"
+                )
+                # call it once
+                filter(image)
+                if profile_func is profile_with_line_profiler:
+                    profile_func(filter, image)
+                    continue
+                name = f"{implementation}_{filter_name}_{width}x{height}"
+                output = output_dir / f"{name}.prof" if output_dir else None
+                profile_func(filter, image, top=top, output=output)
+                stacks = collapsed_stacks(filter, image)
+                print_hotspots(stacks, top=top)
+                if output_dir:
+                    write_collapsed(stacks, output_dir / f"{name}.collapsed")
+
+
+def _size(text: str) -> Tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    """Run profiles from the command-line"""
+    parser = argparse.ArgumentParser(description="Profile instapy filters")
+    parser.add_argument(
+        "--profiler",
+        choices=["cprofile", "line_profiler", "both"],
+        default="both",
+    )
+    parser.add_argument(
+        "--sizes", nargs="+", type=_size, default=[(640, 480)], metavar="WxH"
+    )
+    parser.add_argument(
+        "--filters", nargs="+", help="Filters to profile (default: all)"
+    )
+    parser.add_argument(
+        "--implementations",
+        nargs="+",
+        help="Implementations to profile (default: all installed)",
+    )
+    parser.add_argument(
+        "--output-dir", help="Directory to save .prof and .collapsed files to"
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of hotspots to print"
+    )
+    args = parser.parse_args(argv)
+
+    profilers = ["cprofile", "line_profiler"] if args.profiler == "both" else [args.profiler]
+    for profiler in profilers:
+        if profiler == "line_profiler" and line_profiler is None:
+            print("line_profiler is not installed, skipping")
+            continue
+        print(f"Begin {profiler}")
+        run_profiles(
+            profiler,
+            sizes=args.sizes,
+            filter_names=args.filters,
+            implementations=args.implementations,
+            output_dir=args.output_dir,
+            top=args.top,
+        )
+        print(f"End {profiler}")
 
 
 if __name__ == "__main__":
-    print("Begin cProfile")
-    run_profiles("cprofile")
-    print("End cProfile")
-    print("Begin line_profiler")
-    run_profiles("line_profiler")
-    print("End line_profiler")
+    main()
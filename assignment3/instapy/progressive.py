@@ -0,0 +1,105 @@
+"""Progressive filtering: a low-resolution preview first, full resolution after
+
+Filtering a large image takes long before anything can be shown. A preview
+of the filtered image, from an image scaled down by e.g. 8 (64 times fewer
+pixels), is ready long before that. Image files are decoded directly at
+reduced size (see `instapy.io.read_image`), and decoded images are
+subsampled by striding, so the preview never touches every pixel.
+"""
+
+import inspect
+from typing import Callable, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+import instapy
+from . import io
+
+# default scales, coarsest first
+default_scales = (8, 1)
+
+
+def scale_params(
+    filter: str, params: dict, scale: float, filter_function: Optional[Callable] = None
+) -> dict:
+    """Scale the pixel sizes in filter parameters for an image scaled down
+
+    So a blur of an image scaled down by 8 looks like a preview of the blur
+    of the full image, rather than 8 times as strong. Sizes left out of
+    `params` are scaled from their defaults, read from the signature of
+    `filter_function` (default: the numpy implementation of `filter`).
+    """
+    if filter_function is None:
+        filter_function = instapy.get_filter(filter, "numpy")
+    defaults = {
+        name: parameter.default
+        for name, parameter in inspect.signature(filter_function).parameters.items()
+        if parameter.default is not parameter.empty
+    }
+    params = dict(params)
+    sizes = {**defaults, **params}
+    if filter == "gaussian_blur" and "sigma" in sizes:
+        params["sigma"] = sizes["sigma"] / scale
+    if filter == "box_blur" and "radius" in sizes:
+        params["radius"] = round(sizes["radius"] / scale)
+    return params
+
+
+def subsample(image: np.array, scale: int) -> np.array:
+    """Return a view of every `scale`th pixel of an image, in both directions"""
+    step = max(1, int(scale))
+    return image[::step, ::step]
+
+
+def iter_progressive(
+    source: Union[str, np.array],
+    filter: str = "color2gray",
+    implementation: str = "numpy",
+    scales: Sequence[float] = default_scales,
+    **kwargs,
+) -> Iterator[Tuple[float, np.array]]:
+    """Filter an image at increasing resolutions
+
+    Args:
+        source (str or np.array): an image file, or a decoded image
+        filter (str): the filter name
+        implementation (str): the filter implementation
+        scales (list):
+            factors to scale the image down by, coarsest first.
+            Files are decoded at each scale (JPEG in draft mode),
+            decoded images and `.npy`/`.raw` files are subsampled
+            by an integer step
+        **kwargs: passed on to the filter
+    Yields:
+        (scale, filtered): the filtered image at each scale
+    """
+    filter_function = instapy.get_filter(filter, implementation)
+    for scale in scales:
+        if isinstance(source, np.ndarray):
+            image = subsample(source, scale)
+        else:
+            # raw files are memory-mapped and subsampled,
+            # so only the subsampled pixels are read from disk
+            image = io.read_image(source, scale=scale)
+        if scale != 1:
+            # the auto filter takes any arguments, so has no defaults to read
+            params = scale_params(
+                filter, kwargs, scale, None if implementation == "auto" else filter_function
+            )
+        else:
+            params = kwargs
+        yield scale, filter_function(image, **params)
+
+
+def preview(
+    source: Union[str, np.array],
+    filter: str = "color2gray",
+    implementation: str = "numpy",
+    scale: float = default_scales[0],
+    **kwargs,
+) -> np.array:
+    """Return the filtered image scaled down by `scale`, see `iter_progressive`"""
+    [(_, filtered)] = iter_progressive(
+        source, filter, implementation, scales=[scale], **kwargs
+    )
+    return filtered
@@ -2,24 +2,26 @@
 
 import numpy as np
 
+from . import channels, levels, spatial
+
 
 def python_color2gray(image: np.array) -> np.array:
     """Convert rgb pixel array to grayscale
 
     Args:
-        image (np.array)
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
     Returns:
         np.array: gray_image
     """
 
     # iterate through the pixels, and apply the grayscale transform
-    gray_image = np.empty_like(image)
-    for j, ny in enumerate(image):
+    # (the alpha channel, if any, is already copied)
+    gray_image = channels.empty_output(image)
+    for j, ny in enumerate(channels.rgb_view(image)):
         for i, nx in enumerate(ny):
             red, green, blue = nx
             gray = red * 0.21 + green * 0.72 + blue * 0.07
-            gray_image[j][i] = [gray, gray, gray]
-    gray_image = gray_image.astype("uint8")
+            gray_image[j][i][:3] = [gray, gray, gray]
 
     return gray_image
 
@@ -28,11 +30,12 @@ def python_color2sepia(image: np.array) -> np.array:
     """Convert rgb pixel array to sepia
 
     Args:
-        image (np.array)
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
     Returns:
         np.array: sepia_image
     """
-    sepia_image = np.empty_like(image)
+    sepia_image = channels.empty_output(image)
+    maximum = channels.max_value(image)
     sepia_matrix = [
         [0.393, 0.769, 0.189],
         [0.349, 0.686, 0.168],
@@ -40,15 +43,274 @@ def python_color2sepia(image: np.array) -> np.array:
     ]
     # Iterate through the pixels
     # applying the sepia matrix
-    for j, ny in enumerate(image):
+    for j, ny in enumerate(channels.rgb_view(image)):
         for i, nx in enumerate(ny):
             for k, row in enumerate(sepia_matrix):
                 sepia_image[j][i][k] = min(
-                    255, sum([colour * weight for colour, weight in zip(nx, row)])
+                    maximum, sum([colour * weight for colour, weight in zip(nx, row)])
                 )
 
-    sepia_image = sepia_image.astype("uint8")
-
     # Return image
     # don't forget to make sure it's the right type!
     return sepia_image
+
+
+def python_color_matrix(image: np.array, matrix, offset=(0, 0, 0)) -> np.array:
+    """Apply an affine colour transform to an rgb pixel array
+
+    Every pixel is mapped to `matrix @ rgb + offset`, clipped to [0, 255]
+    (or [0, 65535] for uint16 images).
+
+    Args:
+        image (np.array): rgb(a) or gray(a), uint8 or uint16
+        matrix (3x3 array-like): row `i` gives the weights of channel `i`
+        offset (3 array-like): constant added to each channel (optional)
+    Returns:
+        np.array: filtered_image
+    """
+    filtered_image = channels.empty_output(image)
+    maximum = channels.max_value(image)
+    rows = [[float(weight) for weight in row] for row in matrix]
+    offset = [float(value) for value in offset]
+    for j, ny in enumerate(channels.rgb_view(image)):
+        for i, nx in enumerate(ny):
+            red, green, blue = (float(colour) for colour in nx)
+            filtered_image[j][i][:3] = [
+                min(maximum, max(0, row[0] * red + row[1] * green + row[2] * blue + b))
+                for row, b in zip(rows, offset)
+            ]
+
+    return filtered_image
+
+
+def _clamp(index: int, size: int) -> int:
+    """Clamp an index to [0, size), repeating the edge pixels"""
+    return min(max(index, 0), size - 1)
+
+
+def _round_to_uint8(value: float) -> int:
+    """Round to the nearest integer, clipped to [0, 255]"""
+    return int(min(max(value + 0.5, 0), 255))
+
+
+def python_gaussian_blur(image: np.array, sigma: float = 1) -> np.array:
+    """Blur an rgb pixel array with a Gaussian kernel, in two 1-D passes
+
+    Args:
+        image (np.array)
+        sigma (float): standard deviation of the kernel, in pixels
+    Returns:
+        np.array: blurred_image
+    """
+    kernel = spatial.gaussian_kernel(sigma)
+    radius = len(kernel) // 2
+    pixels = channels.rgb_view(image, channels.uint8_only).tolist()
+    height, width = len(pixels), len(pixels[0])
+
+    # along the rows
+    rows = []
+    for row in pixels:
+        rows.append(
+            [
+                [
+                    sum(
+                        weight * row[_clamp(i + k - radius, width)][c]
+                        for k, weight in enumerate(kernel)
+                    )
+                    for c in range(3)
+                ]
+                for i in range(width)
+            ]
+        )
+    # along the columns
+    blurred = [
+        [
+            [
+                _round_to_uint8(
+                    sum(
+                        weight * rows[_clamp(j + k - radius, height)][i][c]
+                        for k, weight in enumerate(kernel)
+                    )
+                )
+                for c in range(3)
+            ]
+            for i in range(width)
+        ]
+        for j in range(height)
+    ]
+    return channels.with_alpha(image, np.array(blurred, dtype="uint8"))
+
+
+def python_box_blur(image: np.array, radius: int = 1) -> np.array:
+    """Blur an rgb pixel array with the mean of a square around each pixel,
+    using a summed-area table
+
+    Args:
+        image (np.array)
+        radius (int): the square is 2*radius+1 pixels wide
+    Returns:
+        np.array: blurred_image
+    """
+    radius = spatial.check_radius(radius)
+    size = 2 * radius + 1
+    pixels = channels.rgb_view(image, channels.uint8_only).tolist()
+    height, width = len(pixels), len(pixels[0])
+
+    # table[j][i][c] is the sum of the first j rows and i columns
+    # of the image extended by `radius` edge pixels
+    table = [[[0, 0, 0] for _ in range(width + size)] for _ in range(height + size)]
+    for j in range(height + size - 1):
+        row = pixels[_clamp(j - radius, height)]
+        for i in range(width + size - 1):
+            pixel = row[_clamp(i - radius, width)]
+            for c in range(3):
+                table[j + 1][i + 1][c] = (
+                    pixel[c] + table[j][i + 1][c] + table[j + 1][i][c] - table[j][i][c]
+                )
+
+    area = size * size
+    blurred = [
+        [
+            [
+                (
+                    table[j + size][i + size][c]
+                    - table[j][i + size][c]
+                    - table[j + size][i][c]
+                    + table[j][i][c]
+                    + area // 2
+                )
+                // area
+                for c in range(3)
+            ]
+            for i in range(width)
+        ]
+        for j in range(height)
+    ]
+    return channels.with_alpha(image, np.array(blurred, dtype="uint8"))
+
+
+def python_sharpen(image: np.array, amount: float = 1) -> np.array:
+    """Sharpen an rgb pixel array with a Laplacian kernel
+
+    Args:
+        image (np.array)
+        amount (float): strength of the sharpening
+    Returns:
+        np.array: sharpened_image
+    """
+    pixels = channels.rgb_view(image, channels.uint8_only).tolist()
+    height, width = len(pixels), len(pixels[0])
+    sharpened = []
+    for j in range(height):
+        up = pixels[_clamp(j - 1, height)]
+        down = pixels[_clamp(j + 1, height)]
+        row = pixels[j]
+        sharpened.append(
+            [
+                [
+                    _round_to_uint8(
+                        (1 + 4 * amount) * row[i][c]
+                        - amount
+                        * (
+                            up[i][c]
+                            + down[i][c]
+                            + row[_clamp(i - 1, width)][c]
+                            + row[_clamp(i + 1, width)][c]
+                        )
+                    )
+                    for c in range(3)
+                ]
+                for i in range(width)
+            ]
+        )
+    return channels.with_alpha(image, np.array(sharpened, dtype="uint8"))
+
+
+def python_sobel(image: np.array) -> np.array:
+    """Detect edges in an rgb pixel array, with the Sobel gradient magnitude
+
+    Args:
+        image (np.array)
+    Returns:
+        np.array: edge_image, gray
+    """
+    weights = spatial.GRAY_WEIGHTS
+    gray = [
+        [red * weights[0] + green * weights[1] + blue * weights[2] for red, green, blue in row]
+        for row in channels.rgb_view(image, channels.uint8_only).tolist()
+    ]
+    height, width = len(gray), len(gray[0])
+    edges = []
+    for j in range(height):
+        up = gray[_clamp(j - 1, height)]
+        down = gray[_clamp(j + 1, height)]
+        row = gray[j]
+        edge_row = []
+        for i in range(width):
+            left = _clamp(i - 1, width)
+            right = _clamp(i + 1, width)
+            gradient_x = (up[right] + 2 * row[right] + down[right]) - (
+                up[left] + 2 * row[left] + down[left]
+            )
+            gradient_y = (down[left] + 2 * down[i] + down[right]) - (
+                up[left] + 2 * up[i] + up[right]
+            )
+            value = _round_to_uint8((gradient_x**2 + gradient_y**2) ** 0.5)
+            edge_row.append([value, value, value])
+        edges.append(edge_row)
+    return channels.with_alpha(image, np.array(edges, dtype="uint8"))
+
+
+def python_histogram(image: np.array) -> list:
+    """Count the values of each channel of an rgb pixel array
+
+    Returns:
+        list: histogram, 3x256 counts
+    """
+    histogram = [[0] * 256 for _ in range(3)]
+    red, green, blue = histogram
+    for row in channels.rgb_view(image, channels.uint8_only).tolist():
+        for r, g, b in row:
+            red[r] += 1
+            green[g] += 1
+            blue[b] += 1
+    return histogram
+
+
+def python_apply_lut(image: np.array, lut) -> np.array:
+    """Map each channel of an rgb pixel array through a lookup table
+
+    Args:
+        image (np.array)
+        lut (3x256 list): the new value of each value, for each channel
+    Returns:
+        np.array: mapped_image
+    """
+    red, green, blue = ([int(value) for value in channel] for channel in lut)
+    pixels = channels.rgb_view(image, channels.uint8_only).tolist()
+    mapped = [[[red[r], green[g], blue[b]] for r, g, b in row] for row in pixels]
+    return channels.with_alpha(image, np.array(mapped, dtype="uint8"))
+
+
+def python_auto_levels(image: np.array, clip: float = 0) -> np.array:
+    """Stretch the contrast of each channel of an rgb pixel array
+
+    Args:
+        image (np.array)
+        clip (float): fraction of the darkest and brightest pixels to ignore
+    Returns:
+        np.array: stretched_image
+    """
+    lut = levels.lut("auto_levels", python_histogram(image), clip=clip)
+    return python_apply_lut(image, lut)
+
+
+def python_equalize(image: np.array) -> np.array:
+    """Equalise the histogram of each channel of an rgb pixel array
+
+    Args:
+        image (np.array)
+    Returns:
+        np.array: equalized_image
+    """
+    return python_apply_lut(image, levels.lut("equalize", python_histogram(image)))
@@ -0,0 +1,592 @@
+"""HTTP service filtering images with a pool of warm worker processes
+
+`instapy serve` answers `POST /filter?name=<filter>&implementation=<impl>`
+with the filtered image, in the format of `format=` (default png). Any
+other query parameters are passed on to the filter, e.g. `sigma=2`.
+`GET /stats` returns the latency percentiles of the recent requests.
+
+The filters run in worker processes, started and warmed up (numba kernels
+loaded from the cache and called once) before the server accepts requests.
+Images are decoded and encoded in the server's request threads, and the
+pixels are passed to the workers in shared memory, so only the names of
+the shared memory blocks are pickled. Requests arriving while others are
+queued are sent to a worker together, as one batch.
+
+Uploads are decoded like `instapy.io.read_image`: rgba, grayscale and
+16-bit images reach the filters without conversion, and the alpha channel
+is returned in the response.
+"""
+
+import argparse
+import io as _io
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context, shared_memory
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+from PIL import Image
+
+import instapy
+from . import channels, io
+
+# the filters each worker calls once at startup
+warm_filters = instapy.filter_names()
+
+# the number of recent requests kept for the latency statistics
+stats_window = 10_000
+
+# seconds an HTTP request waits for its filtered image
+default_request_timeout = 60
+
+# the largest upload accepted, in bytes
+default_max_upload_bytes = 64 * 2**20
+
+
+def _warm_worker(implementations: Sequence[str]) -> None:
+    """Import and call every filter once, run when a worker starts"""
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    for implementation in implementations:
+        for filter in warm_filters:
+            try:
+                instapy.get_filter(filter, implementation)(image)
+            except (ImportError, AttributeError):
+                # not built (cython) or filter not implemented by this backend
+                continue
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _filter_batch(tasks: List[Dict]) -> List[Optional[Exception]]:
+    """Filter a batch of images in shared memory, run in a worker
+
+    Each task has the filter name, implementation and parameters, the image
+    value type and the shapes of the image and the result, and the names of the input and output shared memory blocks.
+
+    Returns:
+        errors (list): the exception raised by each task, or None
+    """
+    errors = []
+    for task in tasks:
+        source = shared_memory.SharedMemory(name=task["input"])
+        target = shared_memory.SharedMemory(name=task["output"])
+        try:
+            image = np.ndarray(task["shape"], dtype=task["dtype"], buffer=source.buf)
+            out = np.ndarray(task["out_shape"], dtype=task["dtype"], buffer=target.buf)
+            filter_function = instapy.get_filter(task["filter"], task["implementation"])
+            out[...] = filter_function(image, **task["params"])
+            errors.append(None)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # drop the views before closing the shared memory
+            image = out = None
+            source.close()
+            target.close()
+    return errors
+
+
+class _Request:
+    """An image waiting to be filtered, with its shared memory"""
+
+    def __init__(self, image: np.array, filter: str, implementation: str, params: Dict):
+        self.filter = filter
+        self.implementation = implementation
+        self.params = params
+        self.shape = image.shape
+        self.dtype = image.dtype.name
+        self.out_shape = channels.output_shape(image)
+        self.input = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+        try:
+            np.ndarray(image.shape, dtype=image.dtype, buffer=self.input.buf)[...] = image
+            out_bytes = int(np.prod(self.out_shape)) * image.itemsize
+            self.output = shared_memory.SharedMemory(create=True, size=max(out_bytes, 1))
+        except BaseException:
+            # e.g. /dev/shm is full: free the input, nothing else will
+            self.input.close()
+            self.input.unlink()
+            raise
+        self.future = Future()
+        self.queued = time.perf_counter()
+
+    def group(self) -> tuple:
+        """Requests with the same group can share a batch"""
+        return (self.filter, self.implementation, sorted(self.params.items()))
+
+    def task(self) -> Dict:
+        return {
+            "input": self.input.name,
+            "output": self.output.name,
+            "shape": self.shape,
+            "out_shape": self.out_shape,
+            "dtype": self.dtype,
+            "filter": self.filter,
+            "implementation": self.implementation,
+            "params": self.params,
+        }
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Copy out the result (or set the error), and free the shared memory"""
+        try:
+            if error is None:
+                result = np.ndarray(
+                    self.out_shape, dtype=self.dtype, buffer=self.output.buf
+                ).copy()
+                self.future.set_result(result)
+            else:
+                self.future.set_exception(error)
+        finally:
+            for block in (self.input, self.output):
+                block.close()
+                block.unlink()
+
+
+class FilterService:
+    """A pool of warm worker processes filtering images in batches
+
+    Args:
+        workers (int, optional): worker processes. Default: one per core
+        warm (list): implementations to warm up in every worker
+        max_batch (int): the most images sent to a worker at once
+        batch_window (float):
+            seconds to wait for more requests to fill a batch,
+            only when requests are already waiting for a worker
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        warm: Sequence[str] = ("numpy", "numba"),
+        max_batch: int = 8,
+        batch_window: float = 0.002,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        # spawn, since the server process runs threads
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_context("spawn"),
+            initializer=_warm_worker,
+            initargs=(tuple(warm),),
+        )
+        self._queue = queue.Queue()
+        # requests taken from the queue but left out of a batch, oldest
+        # first, dispatched before the queue so the order is kept.
+        # Only used by the dispatcher thread
+        self._pending = deque()
+        self._busy = threading.BoundedSemaphore(self.workers)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=stats_window)
+        self._http_latencies = deque(maxlen=stats_window)
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._requests = 0
+        self._errors = 0
+        self._dispatcher = None
+
+    def start(self) -> None:
+        """Start and warm up every worker, then start dispatching"""
+        # submitting one task per worker before any is idle starts them all,
+        # and each runs the warm-up before its first task
+        for future in [self._pool.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="instapy-dispatch", daemon=True
+        )
+        self._dispatcher.start()
+
+    def stop(self) -> None:
+        """Stop dispatching and shut down the workers"""
+        if self._dispatcher is not None:
+            self._queue.put(None)
+            self._dispatcher.join()
+            self._dispatcher = None
+        self._pool.shutdown()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def submit(
+        self,
+        image: np.array,
+        filter: str = "color2gray",
+        implementation: str = "numpy",
+        **params,
+    ) -> Future:
+        """Queue an image for filtering
+
+        Returns:
+            future (Future): resolves to the filtered image
+        """
+        channels.check(image)
+        request = _Request(np.ascontiguousarray(image), filter, implementation, params)
+        self._queue.put(request)
+        return request.future
+
+    def _next_batch(self, first: _Request) -> List[_Request]:
+        """Collect waiting requests sharing the filter of `first`
+
+        Requests for other filters are kept in `_pending`, in order.
+        """
+        batch = [first]
+        # earlier leftovers first, they are older than anything queued
+        waiting, self._pending = self._pending, deque()
+        while waiting:
+            request = waiting.popleft()
+            if (
+                request is not None
+                and len(batch) < self.max_batch
+                and request.group() == first.group()
+            ):
+                batch.append(request)
+            else:
+                self._pending.append(request)
+        if None in self._pending:
+            # stopping, do not wait for more
+            return batch
+
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    request = self._queue.get(timeout=timeout)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None and request.group() == first.group():
+                batch.append(request)
+            else:
+                self._pending.append(request)
+                if request is None:
+                    # stop after this batch
+                    break
+        return batch
+
+    def _dispatch(self) -> None:
+        """Send batches to the workers, as workers become free"""
+        while True:
+            # wait for a free worker first, so requests queue up meanwhile,
+            # and are then batched
+            self._busy.acquire()
+            first = self._pending.popleft() if self._pending else self._queue.get()
+            if first is None:
+                self._busy.release()
+                return
+            if self._queue.empty() and not self._pending:
+                batch = [first]
+            else:
+                batch = self._next_batch(first)
+            try:
+                future = self._pool.submit(
+                    _filter_batch, [request.task() for request in batch]
+                )
+            except Exception as e:
+                # the pool is broken (a worker died) or shut down:
+                # fail the batch, rather than the dispatcher
+                failed = Future()
+                failed.set_exception(e)
+                self._done(failed, batch)
+                continue
+            future.add_done_callback(lambda future, batch=batch: self._done(future, batch))
+
+    def _done(self, future: Future, batch: List[_Request]) -> None:
+        self._busy.release()
+        if future.exception() is not None:
+            # the worker died, e.g. BrokenProcessPool
+            errors = [future.exception()] * len(batch)
+        else:
+            errors = future.result()
+        now = time.perf_counter()
+        with self._lock:
+            self._batch_sizes.append(len(batch))
+            self._requests += len(batch)
+            self._errors += sum(error is not None for error in errors)
+            for request in batch:
+                self._latencies.append(now - request.queued)
+        for request, error in zip(batch, errors):
+            request.finish(error)
+
+    def record(self, latency: float) -> None:
+        """Record the total latency of an HTTP request"""
+        with self._lock:
+            self._http_latencies.append(latency)
+
+    def stats(self) -> Dict:
+        """Return request counts, latency percentiles and batch sizes
+
+        Latencies are in milliseconds, over the last `stats_window` requests:
+        'filter_ms' from queueing an image to its result,
+        and 'http_ms' for whole HTTP requests, including decode and encode.
+        """
+        with self._lock:
+            stats = {
+                "requests": self._requests,
+                "errors": self._errors,
+                "workers": self.workers,
+                "queued": self._queue.qsize() + len(self._pending),
+                "mean_batch": float(np.mean(self._batch_sizes)) if self._batch_sizes else 0.0,
+                "filter_ms": _percentiles(self._latencies),
+                "http_ms": _percentiles(self._http_latencies),
+            }
+        return stats
+
+
+def _percentiles(latencies: Sequence[float]) -> Dict[str, float]:
+    """Summarize latencies in seconds as percentiles in milliseconds"""
+    if not latencies:
+        return {}
+    milliseconds = np.array(latencies) * 1000
+    p50, p90, p99 = np.percentile(milliseconds, [50, 90, 99])
+    return {
+        "p50": p50,
+        "p90": p90,
+        "p99": p99,
+        "max": milliseconds.max(),
+        "mean": milliseconds.mean(),
+    }
+
+
+def _parse_value(value: str):
+    """Convert a query parameter to a number, if it is one"""
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            continue
+    return value
+
+
+class FilterHandler(BaseHTTPRequestHandler):
+    """Handles `POST /filter` and `GET /stats`, for `FilterService.server`"""
+
+    # set by `make_server`
+    service: FilterService = None
+    default_implementation = "numpy"
+    request_timeout = default_request_timeout
+    max_upload_bytes = default_max_upload_bytes
+
+    def send_json(self, status: HTTPStatus, content: Dict) -> None:
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/stats":
+            self.send_json(HTTPStatus.OK, self.service.stats())
+        elif path == "/health":
+            self.send_json(HTTPStatus.OK, {"status": "ok"})
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": f"no such path {path}"})
+
+    def do_POST(self):
+        t0 = time.perf_counter()
+        url = urlsplit(self.path)
+        if url.path != "/filter":
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": f"no such path {url.path}"})
+            return
+        params = {key: _parse_value(value) for key, value in parse_qsl(url.query)}
+        filter = str(params.pop("name", "color2gray"))
+        implementation = str(params.pop("implementation", self.default_implementation))
+        out_format = str(params.pop("format", "png"))
+        # file extension (jpg) to PIL format name (JPEG)
+        out_format = Image.registered_extensions().get(
+            f".{out_format.lower()}", out_format.upper()
+        )
+        try:
+            instapy.get_filter(filter, implementation)
+        except (ImportError, AttributeError):
+            self.send_json(
+                HTTPStatus.BAD_REQUEST,
+                {"error": f"no filter {filter!r} in implementation {implementation!r}"},
+            )
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            self.send_json(HTTPStatus.BAD_REQUEST, {"error": "invalid Content-Length"})
+            return
+        if length > self.max_upload_bytes:
+            # the body is not read, so the connection cannot be reused
+            self.close_connection = True
+            self.send_json(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                {"error": f"uploads are limited to {self.max_upload_bytes} bytes"},
+            )
+            return
+        try:
+            # rgba, gray and 16-bit images are kept as they are
+            image = io.from_pil(Image.open(_io.BytesIO(self.rfile.read(length))))
+        except Exception as e:
+            self.send_json(HTTPStatus.BAD_REQUEST, {"error": f"cannot decode image: {e}"})
+            return
+
+        try:
+            future = self.service.submit(image, filter, implementation, **params)
+            filtered = future.result(timeout=self.request_timeout)
+        except (TypeError, ValueError) as e:
+            # bad filter parameters
+            self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            return
+        except FutureTimeout:
+            # the worker still finishes the image, and frees its memory
+            self.send_json(
+                HTTPStatus.GATEWAY_TIMEOUT,
+                {"error": f"not filtered within {self.request_timeout}s"},
+            )
+            return
+        except Exception as e:
+            # e.g. a worker died (BrokenProcessPool)
+            self.send_json(
+                HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+            )
+            return
+
+        buffer = _io.BytesIO()
+        try:
+            encoded = io.to_pil(filtered)
+            if out_format == "JPEG" and encoded.mode == "RGBA":
+                # JPEG has no alpha channel
+                encoded = encoded.convert("RGB")
+            encoded.save(buffer, format=out_format)
+        except (KeyError, ValueError) as e:
+            self.send_json(HTTPStatus.BAD_REQUEST, {"error": f"cannot encode image: {e}"})
+            return
+        body = buffer.getvalue()
+        self.send_response(HTTPStatus.OK)
+        content_type = Image.MIME.get(out_format, "application/octet-stream")
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.service.record(time.perf_counter() - t0)
+
+    def log_message(self, format, *args):
+        # the access log is off, see /stats instead
+        pass
+
+
+def make_server(
+    service: FilterService,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    default_implementation: str = "numpy",
+    request_timeout: float = default_request_timeout,
+    max_upload_bytes: int = default_max_upload_bytes,
+) -> ThreadingHTTPServer:
+    """Create an HTTP server handling requests with a (started) service
+
+    Use port 0 to pick any free port, see `server.server_address`.
+    Requests not filtered within `request_timeout` seconds get a 504,
+    and uploads larger than `max_upload_bytes` a 413.
+    """
+    handler = type(
+        "Handler",
+        (FilterHandler,),
+        {
+            "service": service,
+            "default_implementation": default_implementation,
+            "request_timeout": request_timeout,
+            "max_upload_bytes": max_upload_bytes,
+        },
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None) -> None:
+    """Run the filter service from the command-line, until interrupted"""
+    parser = argparse.ArgumentParser(
+        prog="instapy serve", description="Serve instapy filters over HTTP"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument(
+        "-w", "--workers", type=int, help="Worker processes (default: one per core)"
+    )
+    parser.add_argument(
+        "-i",
+        "--implementation",
+        choices=instapy.installed_implementations(),
+        default="numba",
+        help="Implementation used when a request does not choose one",
+    )
+    parser.add_argument(
+        "--warm",
+        nargs="+",
+        choices=instapy.installed_implementations(),
+        help="Implementations to warm up in the workers (default: -i and numpy)",
+    )
+    parser.add_argument(
+        "--max-batch", type=int, default=8, help="Most images sent to a worker at once"
+    )
+    parser.add_argument(
+        "--batch-window",
+        type=float,
+        default=2,
+        metavar="MS",
+        help="Milliseconds to wait to fill a batch, when requests are queued",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=default_request_timeout,
+        metavar="S",
+        help="Seconds a request waits for its image before a 504",
+    )
+    parser.add_argument(
+        "--max-upload",
+        type=float,
+        default=default_max_upload_bytes / 2**20,
+        metavar="MB",
+        help="Largest upload accepted, in MiB, larger ones get a 413",
+    )
+    args = parser.parse_args(argv)
+
+    warm = args.warm or sorted({args.implementation, "numpy"})
+    service = FilterService(
+        workers=args.workers,
+        warm=warm,
+        max_batch=args.max_batch,
+        batch_window=args.batch_window / 1000,
+    )
+    print(f"Starting {service.workers} workers, warming up {', '.join(warm)}")
+    with service:
+        server = make_server(
+            service,
+            args.host,
+            args.port,
+            args.implementation,
+            args.timeout,
+            int(args.max_upload * 2**20),
+        )
+        host, port = server.server_address[:2]
+        print(f"Serving on http://{host}:{port}/filter")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,73 @@
+"""Kernels and border sizes of the spatial filters
+
+Unlike the colour filters, each output pixel of a spatial filter depends on
+its neighbours. Every backend implements the same filters:
+
+- `gaussian_blur(image, sigma=1)`:
+    Gaussian blur, as two 1-D passes (rows, then columns)
+- `box_blur(image, radius=1)`:
+    mean over a (2*radius+1)^2 square, from a summed-area table,
+    so the cost per pixel does not depend on the radius
+- `sharpen(image, amount=1)`:
+    `pixel + amount * (4 * pixel - the 4 direct neighbours)`
+- `sobel(image)`:
+    gradient magnitude of the gray image, clipped to 255,
+    in all three channels
+
+Pixels outside the image repeat the nearest edge pixel, and results are
+rounded to the nearest integer.
+
+To filter an image in bands of rows (`instapy.tiled`,
+`instapy.parallel_filters`), each band is extended by `halo(filter)` rows
+of its neighbours on both sides, so the bands give the same result as
+filtering the whole image.
+"""
+
+import math
+from typing import List
+
+# the names of the spatial filters
+filters = ("gaussian_blur", "box_blur", "sharpen", "sobel")
+
+GRAY_WEIGHTS = (0.21, 0.72, 0.07)
+
+
+def gaussian_radius(sigma: float) -> int:
+    """Return the radius of the Gaussian kernel, 3 standard deviations"""
+    if sigma <= 0:
+        raise ValueError(f"sigma must be positive, got {sigma=}")
+    return max(1, math.ceil(3 * sigma))
+
+
+def gaussian_kernel(sigma: float) -> List[float]:
+    """Return the normalized 1-D Gaussian kernel, of length 2*radius+1"""
+    radius = gaussian_radius(sigma)
+    weights = [math.exp(-0.5 * (x / sigma) ** 2) for x in range(-radius, radius + 1)]
+    total = sum(weights)
+    return [weight / total for weight in weights]
+
+
+def check_radius(radius: int) -> int:
+    """Validate a box blur radius"""
+    if radius < 0 or radius != int(radius):
+        raise ValueError(f"radius must be a non-negative integer, got {radius=}")
+    return int(radius)
+
+
+def halo(filter: str, sigma: float = 1, radius: int = 1, **kwargs) -> int:
+    """Return how many neighbouring rows each output row of `filter` depends on
+
+    Args:
+        filter (str): the filter name
+        sigma, radius: the parameters of the blur filters
+        **kwargs: other filter parameters, which do not affect the halo
+    Returns:
+        halo (int): 0 for the per-pixel (colour) filters
+    """
+    if filter == "gaussian_blur":
+        return gaussian_radius(sigma)
+    if filter == "box_blur":
+        return check_radius(radius)
+    if filter in ("sharpen", "sobel"):
+        return 1
+    return 0
@@ -0,0 +1,128 @@
+"""
+Timing how long the instapy command-line takes to start.
+
+Can be executed as `python3 -m instapy.startup > startup-report.txt`
+
+Import times are measured with `python -X importtime`,
+in a fresh interpreter for every measurement.
+"""
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# the commands to measure, as arguments to the python interpreter
+commands = {
+    "import instapy": ["-c", "import instapy"],
+    "import instapy.cli": ["-c", "import instapy.cli"],
+    "instapy --help": ["-m", "instapy", "--help"],
+}
+
+# modules which should not be imported before a filter is run
+heavy_modules = ["numpy", "PIL", "numba"]
+
+
+def measure(arguments: List[str]) -> Tuple[float, List[Tuple[int, str, int]]]:
+    """Run the interpreter once with `-X importtime`
+
+    Args:
+        arguments (list): arguments to the python interpreter
+    Returns:
+        wall (float):
+            The wall time of the run, in seconds
+        tree (list):
+            (depth, module, cumulative) for every import, in the order
+            they finished. Depth 0 are the imports made by the command
+            itself (or by site) and the others are nested in them.
+            Cumulative times are in microseconds.
+    """
+    t0 = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = time.perf_counter() - t0
+    tree = []
+    for line in result.stderr.splitlines():
+        # lines look like "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        # one space after the bar, then two more per level of nesting
+        name = module.lstrip()
+        depth = (len(module) - len(name) - 1) // 2
+        tree.append((depth, name.rstrip(), int(cumulative)))
+    return wall, tree
+
+
+def import_times(arguments: List[str]) -> Dict[str, int]:
+    """Return the cumulative import time of every module imported
+
+    Args:
+        arguments (list): arguments to the python interpreter
+    Returns:
+        times (dict):
+            Maps module names to their cumulative import time,
+            in microseconds
+    """
+    return {module: us for _, module, us in measure(arguments)[1]}
+
+
+def total_import_time(tree: List[Tuple[int, str, int]]) -> int:
+    """Return the total import time (in microseconds) of a `measure` tree
+
+    Only the outermost imports are counted, their cumulative times
+    already include the modules they import.
+    """
+    return sum(us for depth, _, us in tree if depth == 0)
+
+
+def best_runs(
+    commands: Dict[str, List[str]], calls: int = 5
+) -> Dict[str, Tuple[float, List[Tuple[int, str, int]]]]:
+    """Return the fastest of several `measure` runs of every command
+
+    The commands are run in turn, so a change in the load of the machine
+    affects them all alike. One run of each comes first and is not
+    counted, so every counted run finds the files in the OS cache.
+
+    Args:
+        commands (dict): maps names to arguments to the python interpreter
+        calls (int): the number of runs of each to take the fastest of
+    Returns:
+        runs (dict): maps names to (wall, tree), see `measure`
+    """
+    for arguments in commands.values():
+        measure(arguments)
+    best = {}
+    for _ in range(calls):
+        for name, arguments in commands.items():
+            run = measure(arguments)
+            if name not in best or run[0] < best[name][0]:
+                best[name] = run
+    return best
+
+
+def make_report(calls: int = 10):
+    """Print startup times of the instapy entry points
+
+    For every command, prints the wall time and total import time of its
+    fastest run, and which heavy modules were imported. The import times
+    include the modules imported by `site` at startup.
+    """
+    runs = best_runs({"python": ["-c", "pass"], **commands}, calls=calls)
+    print(f"Python interpreter startup: {runs['python'][0]:.3}s")
+    for name in commands:
+        wall, tree = runs[name]
+        imported = {module for _, module, _ in tree}
+        heavy = [module for module in heavy_modules if module in imported]
+        total = total_import_time(tree)
+        print(f"\n{name}: {wall:.3}s (total import time: {total / 1e6:.3}s)")
+        print(f"Heavy modules imported: {', '.join(heavy) or 'none'}")
+
+
+if __name__ == "__main__":
+    # run as `python -m instapy.startup`
+    make_report()
@@ -0,0 +1,164 @@
+"""Tiled (out-of-core) filtering of large images
+
+Images are processed in bands of rows, so only one band of input, its
+float temporaries and one band of output need to be in memory at a time.
+With memory-mapped input and output (raw `.npy`/`.raw` files, see
+`instapy.io.read_image_memmap`), images larger than memory can be filtered.
+"""
+
+from functools import partial
+from typing import Callable, Iterator, Optional, Tuple
+
+import numpy as np
+
+import instapy
+from . import channels, io, levels, spatial
+
+# default memory budget for one band, in bytes
+default_tile_bytes = 64 * 1024 * 1024
+
+
+def band_rows(image: np.array, tile_bytes: int = default_tile_bytes, halo: int = 0) -> int:
+    """Return how many rows of `image` fit in a band of `tile_bytes`
+
+    The filters compute in float64, so a band of rows needs about
+    8 bytes per channel per pixel for its temporaries.
+
+    Bands are at least 4 times the `halo` of a spatial filter, so at most
+    half of the rows filtered are the neighbours' rows, even if that
+    exceeds the budget.
+    """
+    row_bytes = 8 * int(np.prod(image.shape[1:]))
+    return max(1, 4 * halo, tile_bytes // row_bytes)
+
+
+def iter_bands(height: int, rows: int) -> Iterator[Tuple[int, int]]:
+    """Yield (start, stop) row ranges covering `height` rows"""
+    for start in range(0, height, rows):
+        yield start, min(start + rows, height)
+
+
+def filter_band(
+    filter_function: Callable, image: np.array, start: int, stop: int, halo: int = 0
+) -> np.array:
+    """Filter rows `start` to `stop` of an image
+
+    The band is extended by `halo` rows on both sides (where the image
+    has them) before filtering, and the extra rows are dropped after,
+    so the result is the same as for the whole image.
+    """
+    low = max(start - halo, 0)
+    high = min(stop + halo, image.shape[0])
+    return filter_function(image[low:high])[start - low : stop - low]
+
+
+def filter_tiled(
+    filter_function: Callable,
+    image: np.array,
+    out: Optional[np.array] = None,
+    tile_bytes: int = default_tile_bytes,
+    halo: int = 0,
+) -> np.array:
+    """Apply a filter to an image, one band of rows at a time
+
+    Args:
+        filter_function (callable): the filter to apply
+        image (np.array): the image, e.g. a memory-mapped array
+        out (np.array, optional):
+            array to write the result to, e.g. a memory-mapped array.
+            Default: a new rgb array (rgba if `image` has alpha),
+            of the same value type as `image`
+        tile_bytes (int): memory budget for one band
+        halo (int):
+            rows of the neighbouring bands each band needs,
+            for spatial filters (see `instapy.spatial.halo`)
+    Returns:
+        out (np.array): the filtered image
+    """
+    if out is None:
+        out = np.empty(channels.output_shape(image), dtype=image.dtype)
+    rows = band_rows(image, tile_bytes, halo)
+    for start, stop in iter_bands(image.shape[0], rows):
+        out[start:stop] = filter_band(filter_function, image, start, stop, halo)
+        if isinstance(out, np.memmap):
+            # write the band to disk, so dirty pages do not pile up
+            out.flush()
+    return out
+
+
+def histogram_tiled(
+    histogram_function: Callable, image: np.array, tile_bytes: int = default_tile_bytes
+) -> np.array:
+    """Sum the histograms of the bands of an image
+
+    Args:
+        histogram_function (callable):
+            counts the channel values of a band, e.g. `numpy_histogram`
+        image (np.array): the image, e.g. a memory-mapped array
+        tile_bytes (int): memory budget for one band
+    Returns:
+        histogram (np.array): 3x256 counts of the whole image
+    """
+    histogram = np.zeros((3, 256), dtype=np.int64)
+    for start, stop in iter_bands(image.shape[0], band_rows(image, tile_bytes)):
+        histogram += histogram_function(image[start:stop])
+    return histogram
+
+
+def run_tiled(
+    file: str,
+    out_file: str,
+    implementation: str = "numpy",
+    filter: str = "color2gray",
+    tile_bytes: int = default_tile_bytes,
+    **kwargs,
+) -> np.array:
+    """Run the selected filter on a file, one band at a time
+
+    Raw `.npy`/`.raw` input and output files are memory-mapped, so peak memory is
+    bounded by `tile_bytes`. Other formats are decoded (or encoded) whole,
+    but the filter still only holds one band of temporaries at a time.
+
+    Args:
+        file (str): the input image
+        out_file (str): the output image
+        implementation (str): the filter implementation
+        filter (str): the filter name
+        tile_bytes (int): memory budget for one band
+        **kwargs: passed on to the filter (e.g. precision, sigma)
+    Returns:
+        out (np.array): the filtered image
+    """
+    # raw files are memory-mapped
+    image = io.read_image(file)
+
+    if io.is_raw(out_file):
+        out = io.create_image_memmap(
+            out_file, channels.output_shape(image), dtype=image.dtype
+        )
+    else:
+        out = None
+
+    if filter in levels.filters:
+        # one pass for the histogram, and one to apply the lookup table
+        histogram = histogram_tiled(
+            instapy.get_filter("histogram", implementation), image, tile_bytes
+        )
+        filter_function = partial(
+            instapy.get_filter("apply_lut", implementation),
+            lut=levels.lut(filter, histogram, **kwargs),
+        )
+    else:
+        filter_function = instapy.get_filter(filter, implementation)
+        if kwargs:
+            filter_function = partial(filter_function, **kwargs)
+    out = filter_tiled(
+        filter_function,
+        image,
+        out=out,
+        tile_bytes=tile_bytes,
+        halo=spatial.halo(filter, **kwargs),
+    )
+    if not isinstance(out, np.memmap):
+        io.write_image(out, out_file)
+    return out
@@ -3,15 +3,28 @@ Timing our filter implementations.
 
 Can be executed as `python3 -m instapy.timing > timing-report.txt`
 
-For Task 6.
+For Task 6. See `instapy.benchmark` for repeated samples over several
+image sizes, with warm-up, percentiles and baseline comparison.
 """
+import gc
+import os
+import sys
 import time
+import tracemalloc
+from functools import partial
+
 import instapy
 from . import io
-from typing import Callable
+from typing import Callable, Dict, Optional
 import numpy as np
 from PIL import Image
 
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
 
 def time_one(filter_function: Callable, *arguments, calls: int = 3) -> float:
     """Return the time for one call
@@ -40,6 +53,118 @@ def time_one(filter_function: Callable, *arguments, calls: int = 3) -> float:
     return (t1 - t0) / calls
 
 
+def enable_native_statistics() -> bool:
+    """Let `measure_memory` count the allocations of numba compiled code
+
+    Sets NUMBA_NRT_STATS, which numba only reads when it is imported, so
+    call this before numba is imported (before a numba filter is used).
+    Off by default, since counting slows down every allocation.
+
+    Returns:
+        enabled (bool):
+            Whether allocations will be counted, False if numba
+            was already imported without statistics
+    """
+    if "numba" not in sys.modules:
+        os.environ["NUMBA_NRT_STATS"] = "1"
+    return os.environ.get("NUMBA_NRT_STATS") == "1"
+
+
+def _native_allocations() -> Optional[int]:
+    """Return the number of allocations made by numba compiled code so far
+
+    None if numba has not been imported, or was imported without
+    allocation statistics enabled (see `enable_native_statistics`).
+    """
+    if "numba" not in sys.modules:
+        return None
+    from numba.core.runtime import rtsys
+
+    try:
+        return rtsys.get_allocation_stats().alloc
+    except RuntimeError:
+        # NRT stats are disabled
+        return None
+
+
+def _peak_rss() -> Optional[int]:
+    """Return the peak resident memory of the process so far, in bytes"""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on linux (bytes on macOS, close enough)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _blocks(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    """Leave out the memory of tracemalloc's own snapshots"""
+    return snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def measure_memory(filter_function: Callable, image: np.array, **kwargs) -> Dict:
+    """Measure the memory used by one call of filter_function(image)
+
+    Python and numpy allocations are traced with tracemalloc, which gives
+    the peak and retained bytes, and (from snapshots before and after the
+    call) the number of blocks the call left allocated. Allocations made
+    by numba compiled code are counted from numba's runtime statistics,
+    when enabled (see `enable_native_statistics`). Since other native
+    code may allocate memory tracemalloc cannot see, the growth of the
+    process' peak RSS is also reported, which is only nonzero when the
+    call takes the process past its earlier peak (e.g. a first call).
+
+    Args:
+        filter_function (callable): the filter function to measure
+        image (np.array): the image to filter
+        **kwargs: passed on to the filter
+    Returns:
+        memory (dict):
+            peak_bytes: the peak traced memory during the call,
+            peak_ratio: peak_bytes relative to the size of `image`,
+                i.e. how many image-sized buffers were alive at once,
+            retained_bytes: traced memory still allocated after the call
+                (the result),
+            retained_blocks: the number of traced memory blocks still
+                allocated after the call (temporaries freed during the
+                call are not counted, see peak_bytes),
+            native_allocations: the number of allocations made by numba
+                compiled code (None if not available),
+            peak_rss_growth: how much the peak RSS of the process grew,
+                in bytes (None if not available)
+    """
+    gc.collect()
+    native_before = _native_allocations()
+    rss_before = _peak_rss()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        baseline, _ = tracemalloc.get_traced_memory()
+        # leave out the memory used while taking the snapshot
+        tracemalloc.reset_peak()
+        result = filter_function(image, **kwargs)
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    # filtered after tracing, so the filter's own allocations are not counted
+    blocks = _blocks(after).compare_to(_blocks(before), "filename")
+    native_after = _native_allocations()
+    rss_after = _peak_rss()
+    del result
+
+    peak_bytes = peak - baseline
+    return {
+        "peak_bytes": peak_bytes,
+        "peak_ratio": peak_bytes / image.nbytes,
+        "retained_bytes": current - baseline,
+        "retained_blocks": sum(stat.count_diff for stat in blocks),
+        "native_allocations": (
+            None if native_before is None or native_after is None
+            else native_after - native_before
+        ),
+        "peak_rss_growth": None if rss_before is None else rss_after - rss_before,
+    }
+
+
 def make_reports(filename: str = "test/rain.jpg", calls: int = 3):
     """
     Make timing reports for all implementations and filters,
@@ -66,6 +191,13 @@ def make_reports(filename: str = "test/rain.jpg", calls: int = 3):
             f"\nReference (pure Python) filter time {filter_name}: {reference_time:.3}s ({calls=})"
         )
 
+        # the pure Python filter on raw bytes, with integer tables
+        filter_time = time_one(instapy.get_filter(filter_name, "bytes"), image, calls=calls)
+        speedup = reference_time / filter_time
+        print(
+            f"Timing: bytes {filter_name}: average: {filter_time:.3}s ({speedup=:.2f}x)"
+        )
+
         # iterate through the implementations
         implementations = ["numpy", "numba"]
         for implementation in implementations:
@@ -81,7 +213,28 @@ def make_reports(filename: str = "test/rain.jpg", calls: int = 3):
                 f"Timing: {implementation} {filter_name}: first call: {first_time:.3}s, average after: {filter_time:.3}s ({speedup=:.2f}x)"
             )
 
+            # the same filter, computing in float32 instead of float64
+            filter32 = partial(filter, precision="float32")
+            # call it once first, to leave out numba compilation
+            filter32(image)
+            filter_time = time_one(filter32, image, calls=calls)
+            speedup = reference_time / filter_time
+            print(
+                f"Timing: {implementation} {filter_name} (float32): average: {filter_time:.3}s ({speedup=:.2f}x)"
+            )
+
+            # measure the memory used by one (warm) call
+            memory = measure_memory(filter, image)
+            native = memory["native_allocations"]
+            print(
+                f"Memory: {implementation} {filter_name}: peak {memory['peak_bytes'] / 1e6:.3}MB"
+                f" ({memory['peak_ratio']:.1f}x image), retained {memory['retained_bytes'] / 1e6:.3}MB"
+                f" in {memory['retained_blocks']} blocks"
+                + (f", native allocations: {native}" if native is not None else "")
+            )
+
 
 if __name__ == "__main__":
     # run as `python -m instapy.timing`
+    enable_native_statistics()
     make_reports()
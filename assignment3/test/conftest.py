@@ -3,12 +3,37 @@ from functools import lru_cache
 
 import pytest
 
-from instapy import io
+from instapy import io, timing
 from instapy.python_filters import python_color2gray, python_color2sepia
 
 test_dir = Path(__file__).absolute().parent
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark",
+        action="store_true",
+        help="run the performance tests (marked benchmark)",
+    )
+
+
+def pytest_configure(config):
+    # count numba allocations in the memory tests, before numba is imported
+    timing.enable_native_statistics()
+    config.addinivalue_line(
+        "markers", "benchmark: performance test, only run with --benchmark"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="performance test, run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
 @lru_cache()
 def default_image():
     return io.read_image(test_dir.joinpath("rain.jpg"))
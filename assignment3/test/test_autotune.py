@@ -0,0 +1,42 @@
+import json
+
+import numpy.testing as nt
+
+import instapy
+from instapy import autotune
+
+
+def test_auto_filter(image, reference_gray, tmp_path, monkeypatch):
+    monkeypatch.setenv("INSTAPY_CACHE_DIR", str(tmp_path))
+    gray = instapy.get_filter("color2gray", "auto")
+    nt.assert_allclose(gray(image), reference_gray, atol=1)
+
+    with (tmp_path / autotune.cache_filename).open() as f:
+        results = json.load(f)
+    [(key, result)] = results.items()
+    assert key.startswith(f"color2gray/{autotune.size_bucket(image)}/")
+    assert result["implementation"] == min(result["times"], key=result["times"].get)
+    assert "python" not in result["times"]
+
+
+def test_auto_filter_uses_cache(image, tmp_path, monkeypatch):
+    cache_file = tmp_path / "autotune.json"
+    sepia = autotune.auto_filter("color2sepia", cache_file=cache_file)
+    sepia(image)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("calibrated again")
+
+    # a new filter (e.g. in a new process) should reuse the stored choice
+    monkeypatch.setattr(autotune, "calibrate", fail)
+    sepia = autotune.auto_filter("color2sepia", cache_file=cache_file)
+    sepia(image)
+
+
+def test_cache_key(image):
+    key = autotune.cache_key("gaussian_blur", image, sigma=1)
+    assert key == autotune.cache_key("gaussian_blur", image.copy(), sigma=1)
+    # inputs the calibration was not measured on get their own
+    assert key != autotune.cache_key("gaussian_blur", image, sigma=8)
+    assert key != autotune.cache_key("gaussian_blur", image.astype("uint16"), sigma=1)
+    assert key != autotune.cache_key("gaussian_blur", image[:, :, 0], sigma=1)
@@ -0,0 +1,87 @@
+import numpy.testing as nt
+import pytest
+
+from instapy import cli, io
+from instapy.batch import run_batch
+from instapy.numpy_filters import numpy_color2gray
+
+
+@pytest.fixture
+def image_files(image, tmp_path):
+    files = []
+    for i in range(5):
+        path = tmp_path / "in" / f"image{i}.png"
+        path.parent.mkdir(exist_ok=True)
+        io.write_image(image[i:], path)
+        files.append(path)
+    return files
+
+
+def test_run_batch(image, image_files, tmp_path):
+    stats = run_batch(
+        image_files,
+        tmp_path / "out",
+        filter="color2gray",
+        implementation="numpy",
+        decode_workers=2,
+        compute_workers=2,
+        encode_workers=1,
+        queue_size=1,
+    )
+    for i, file in enumerate(image_files):
+        result = io.read_image(tmp_path / "out" / file.name)
+        nt.assert_array_equal(result, numpy_color2gray(image[i:]))
+
+    assert set(stats) == {"decode", "compute", "encode", "total"}
+    for name in ("decode", "compute", "encode"):
+        assert stats[name]["items"] == len(image_files)
+        assert stats[name]["busy"] > 0
+    assert stats["total"]["items"] == len(image_files)
+
+
+def test_run_batch_format(image_files, tmp_path):
+    run_batch(image_files, tmp_path / "out", out_format="jpg")
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == [
+        f"image{i}.jpg" for i in range(5)
+    ]
+
+
+def test_run_batch_error(image_files, tmp_path):
+    missing = tmp_path / "missing.png"
+    with pytest.raises(FileNotFoundError):
+        run_batch([*image_files, missing], tmp_path / "out")
+    # the other files are still processed
+    assert len(list((tmp_path / "out").iterdir())) == len(image_files)
+
+
+@pytest.mark.parametrize(
+    "counts", [{"decode_workers": 0}, {"compute_workers": 0}, {"encode_workers": -1}, {"queue_size": 0}]
+)
+def test_run_batch_counts(image_files, tmp_path, counts):
+    with pytest.raises(ValueError, match="must be at least 1"):
+        run_batch(image_files, tmp_path / "out", **counts)
+    assert not (tmp_path / "out").exists()
+
+
+def test_run_batch_same_name(image, image_files, tmp_path):
+    other = tmp_path / "other" / image_files[0].name
+    other.parent.mkdir()
+    io.write_image(image, other)
+    with pytest.raises(ValueError, match="would both be written to"):
+        run_batch([*image_files, other], tmp_path / "out")
+    # also with different input formats, written in the same format
+    jpg = tmp_path / "other" / "image1.jpg"
+    io.write_image(image, jpg)
+    with pytest.raises(ValueError, match="would both be written to"):
+        run_batch([image_files[1], jpg], tmp_path / "out", out_format="png")
+    assert not (tmp_path / "out").exists()
+
+
+def test_cli_batch_errors(image_files, tmp_path, capsys):
+    files = [str(file) for file in image_files]
+    with pytest.raises(SystemExit):
+        cli.main(["batch", *files, "-g", "-o", str(tmp_path / "out"), "--compute-workers", "0"])
+    assert "must be at least 1" in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        cli.main(["batch", files[0], files[0], "-g", "-o", str(tmp_path / "out")])
+    assert "would both be written to" in capsys.readouterr().err
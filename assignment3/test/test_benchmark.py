@@ -0,0 +1,60 @@
+import pytest
+
+from instapy import benchmark
+
+
+def test_summarize():
+    summary = benchmark.summarize([1.0, 2.0, 3.0, 4.0, 10.0], pixels=2_000_000)
+    assert summary["samples"] == 5
+    assert summary["min"] == 1.0
+    assert summary["median"] == 3.0
+    assert 4.0 < summary["p95"] <= 10.0
+    assert summary["mean"] == 4.0
+    assert summary["stddev"] == pytest.approx(3.535, rel=1e-3)
+    assert summary["mpix_per_s"] == pytest.approx(2 / 3)
+
+
+def test_run_benchmarks(tmp_path):
+    results = benchmark.run_benchmarks(
+        filters=["color2gray"],
+        implementations=["numpy"],
+        sizes=[(32, 24), (64, 48)],
+        warmup=1,
+        repeat=3,
+    )
+    assert len(results) == 2
+    for result in results:
+        assert set(result) == set(benchmark.fields)
+        assert result["min"] <= result["median"] <= result["p95"]
+
+    benchmark.write_json(results, tmp_path / "results.json")
+    assert benchmark.read_json(tmp_path / "results.json") == results
+    benchmark.write_csv(results, tmp_path / "results.csv")
+    lines = (tmp_path / "results.csv").read_text().splitlines()
+    assert lines[0] == ",".join(benchmark.fields)
+    assert len(lines) == 3
+
+
+def test_compare():
+    baseline = [
+        {"filter": "color2gray", "implementation": "numpy", "width": 1, "height": 1, "median": 1.0},
+        {"filter": "color2gray", "implementation": "numba", "width": 1, "height": 1, "median": 1.0},
+    ]
+    results = [
+        dict(baseline[0], median=1.05),
+        dict(baseline[1], median=1.5),
+        dict(baseline[1], width=2, median=5.0),
+    ]
+    [regression] = benchmark.compare(results, baseline, tolerance=0.1)
+    assert regression["implementation"] == "numba"
+    assert regression["slowdown"] == pytest.approx(1.5)
+
+
+def test_compare_memory():
+    baseline = [
+        {"filter": "color2gray", "implementation": "numpy", "width": 1, "height": 1, "median": 1.0, "peak_bytes": 100},
+    ]
+    [regression] = benchmark.compare([dict(baseline[0], peak_bytes=200)], baseline)
+    assert regression["memory_growth"] == pytest.approx(2)
+    assert regression["slowdown"] == pytest.approx(1)
+    assert benchmark.compare([dict(baseline[0], peak_bytes=105)], baseline) == []
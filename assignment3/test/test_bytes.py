@@ -0,0 +1,41 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+from instapy import bytes_filters, numpy_filters
+from instapy.bytes_filters import bytes_color2gray, bytes_color2sepia
+
+
+def test_color2gray(image, reference_gray):
+    result = bytes_color2gray(image)
+    assert result.shape == image.shape
+    assert result.dtype == np.uint8
+    nt.assert_array_equal(result[:, :, 0], result[:, :, 1])
+    nt.assert_array_equal(result[:, :, 1], result[:, :, 2])
+    # fixed-point rounding may only move values across an integer boundary
+    nt.assert_allclose(result, reference_gray, atol=1)
+
+
+@pytest.mark.parametrize("k", [1, 0.5, 0])
+def test_color2sepia(image, k):
+    result = bytes_color2sepia(image, k=k)
+    assert result.shape == image.shape
+    nt.assert_allclose(result, numpy_filters.numpy_color2sepia(image, k=k), atol=1)
+
+
+def test_color_matrix_clips(image):
+    matrix = [[1.5, 0, 0], [0, -1, 0], [0.5, 0.5, 0]]
+    offset = [10, 300, -20]
+    result = bytes_filters.bytes_color_matrix(image, matrix, offset)
+    expected = numpy_filters.numpy_color_matrix(image, np.array(matrix), np.array(offset))
+    nt.assert_allclose(result, expected, atol=1)
+
+
+def test_bytes_input():
+    # one red and one white pixel, with alpha
+    data = bytes([255, 0, 0, 7, 255, 255, 255, 9])
+    result = bytes_filters.gray_bytes(data, channels=4)
+    assert isinstance(result, bytearray)
+    assert result == bytearray([53, 53, 53, 7, 255, 255, 255, 9])
+    with pytest.raises(ValueError):
+        bytes_filters.sepia_bytes(data, k=2)
@@ -0,0 +1,73 @@
+import os
+
+import numpy.testing as nt
+import pytest
+
+import instapy
+from instapy import cli, io
+from instapy.cache import ResultCache
+
+
+@pytest.fixture
+def image_file(image, tmp_path):
+    path = tmp_path / "image.png"
+    io.write_image(image, path)
+    return path
+
+
+def test_key(image_file, tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    key = cache.key(image_file, "color2sepia", {"k": 0.5}, "png")
+    assert key.endswith(".png")
+    assert key == cache.key(image_file, "color2sepia", {"k": 0.5}, ".PNG")
+    assert key != cache.key(image_file, "color2sepia", {"k": 1}, "png")
+    assert key != cache.key(image_file, "color2gray", {"k": 0.5}, "png")
+    assert key != cache.key(image_file, "color2sepia", {"k": 0.5}, "jpg")
+    # implementations may round differently
+    assert key != cache.key(image_file, "color2sepia", {"k": 0.5}, "png", implementation="bytes")
+
+
+def test_put_get(image_file, tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    assert cache.get("missing.png") is None
+    path = cache.put("entry.png", image_file)
+    assert cache.get("entry.png") == path
+    assert path.read_bytes() == image_file.read_bytes()
+
+
+def test_evict_least_recently_used(tmp_path):
+    source = tmp_path / "source"
+    source.write_bytes(b"x" * 100)
+    cache = ResultCache(tmp_path / "cache", max_bytes=250)
+    for i, name in enumerate(["a", "b"]):
+        path = cache.put(name, source)
+        os.utime(path, ns=(i, i))
+    # use "a", so "b" is the least recently used
+    cache.get("a")
+    cache.put("c", source)
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_run_filter_cached(image, image_file, tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path / "cache")
+    out_file = tmp_path / "out.png"
+    cli.run_filter(image_file, out_file, implementation="numpy", cache=cache)
+    expected = io.read_image(out_file)
+    nt.assert_allclose(expected, instapy.get_filter("color2gray", "numpy")(image))
+    out_file.unlink()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("filtered again")
+
+    with monkeypatch.context() as m:
+        m.setattr(instapy, "get_filter", fail)
+        m.setattr(io, "read_image", fail)
+        cli.run_filter(image_file, out_file, implementation="numpy", cache=cache)
+    [entry] = (tmp_path / "cache").iterdir()
+    assert out_file.read_bytes() == entry.read_bytes()
+
+    # other implementations may round differently, and are stored apart
+    cli.run_filter(image_file, out_file, implementation="bytes", cache=cache)
+    assert len(list((tmp_path / "cache").iterdir())) == 2
@@ -0,0 +1,127 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+import instapy
+from instapy import channels, io
+
+colour_implementations = ["python", "bytes", "numpy", "numba", "parallel"]
+spatial_implementations = ["python", "numpy", "numba", "parallel"]
+colour_filters = ["color2gray", "color2sepia"]
+spatial_filters = ["gaussian_blur", "box_blur", "sharpen", "sobel"]
+levels_filters = ["auto_levels", "equalize"]
+
+
+@pytest.fixture
+def small_rgba():
+    rng = np.random.default_rng(4)
+    return rng.integers(0, 256, size=(12, 17, 4), dtype=np.uint8)
+
+
+def reference(filter, rgb):
+    return instapy.get_filter(filter, "numpy")(np.ascontiguousarray(rgb))
+
+
+def test_rgb_view_does_not_copy(small_rgba):
+    rgb = channels.rgb_view(small_rgba)
+    assert rgb.shape == (12, 17, 3)
+    assert np.shares_memory(rgb, small_rgba)
+
+    gray = small_rgba[:, :, 0]
+    view = channels.rgb_view(gray)
+    assert view.shape == (12, 17, 3)
+    assert view.strides[2] == 0
+    assert np.shares_memory(view, gray)
+
+
+def test_check_rejects():
+    with pytest.raises(ValueError):
+        channels.check(np.zeros((4, 4, 3), dtype=np.float64))
+    with pytest.raises(ValueError):
+        channels.check(np.zeros((4, 4, 5), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        channels.check(np.zeros((4, 4, 3), dtype=np.uint16), channels.uint8_only)
+
+
+@pytest.mark.parametrize("implementation", colour_implementations)
+@pytest.mark.parametrize("filter", colour_filters)
+def test_colour_alpha(small_rgba, implementation, filter):
+    result = instapy.get_filter(filter, implementation)(small_rgba)
+    assert result.shape == small_rgba.shape
+    assert result.dtype == np.uint8
+    # alpha is passed through untouched
+    nt.assert_array_equal(result[:, :, 3], small_rgba[:, :, 3])
+    nt.assert_allclose(result[:, :, :3], reference(filter, small_rgba[:, :, :3]), atol=1)
+
+
+@pytest.mark.parametrize("implementation", colour_implementations)
+@pytest.mark.parametrize("filter", colour_filters)
+def test_colour_gray(small_rgba, implementation, filter):
+    gray = small_rgba[:, :, 0]
+    gray_alpha = small_rgba[:, :, 2:]
+    expected = reference(filter, np.stack([gray] * 3, axis=-1))
+    filter_function = instapy.get_filter(filter, implementation)
+
+    result = filter_function(gray)
+    assert result.shape == (12, 17, 3)
+    nt.assert_allclose(result, expected, atol=1)
+
+    result = filter_function(gray_alpha)
+    assert result.shape == (12, 17, 4)
+    nt.assert_array_equal(result[:, :, 3], small_rgba[:, :, 3])
+    nt.assert_allclose(
+        result[:, :, :3], reference(filter, np.stack([small_rgba[:, :, 2]] * 3, axis=-1)), atol=1
+    )
+
+
+@pytest.mark.parametrize("implementation", colour_implementations)
+@pytest.mark.parametrize("filter", colour_filters)
+def test_colour_uint16(small_rgba, implementation, filter):
+    # the same image in 16 bits (v * 257 maps 255 to 65535)
+    image = small_rgba[:, :, :3].astype(np.uint16) * 257
+    result = instapy.get_filter(filter, implementation)(image)
+    assert result.dtype == np.uint16
+    assert result.shape == image.shape
+    expected = reference(filter, small_rgba[:, :, :3]).astype(np.float64) * 257
+    # 16-bit results are more precise, not rounded to multiples of 257
+    nt.assert_allclose(result, expected, atol=257)
+    if filter == "color2sepia":
+        # bright pixels clip to the uint16 maximum, not 255
+        assert result.max() == 65535
+
+
+@pytest.mark.parametrize(
+    "implementation, filter",
+    [(i, f) for i in spatial_implementations for f in spatial_filters + levels_filters]
+    # the bytes backend has the contrast filters, but not the spatial ones
+    + [("bytes", f) for f in levels_filters],
+)
+def test_other_filters_alpha(small_rgba, implementation, filter):
+    filter_function = instapy.get_filter(filter, implementation)
+    result = filter_function(small_rgba)
+    assert result.shape == small_rgba.shape
+    nt.assert_array_equal(result[:, :, 3], small_rgba[:, :, 3])
+    nt.assert_allclose(result[:, :, :3], reference(filter, small_rgba[:, :, :3]), atol=1)
+
+    gray = small_rgba[:, :, 0]
+    assert filter_function(gray).shape == (12, 17, 3)
+    # 16-bit images are only supported by the colour filters
+    with pytest.raises(ValueError):
+        filter_function(small_rgba.astype(np.uint16))
+
+
+@pytest.mark.parametrize("filter", spatial_filters)
+def test_bytes_no_spatial(filter):
+    with pytest.raises(AttributeError, match=f"bytes implementation has no {filter} filter"):
+        instapy.get_filter(filter, "bytes")
+
+
+def test_read_write_rgba(tmp_path, small_rgba):
+    filename = tmp_path / "rgba.png"
+    io.write_image(small_rgba, filename)
+    image = io.read_image(filename)
+    nt.assert_array_equal(image, small_rgba)
+
+    # 16-bit colour images are written with 8 bits
+    io.write_image(small_rgba.astype(np.uint16) * 257, filename)
+    nt.assert_array_equal(io.read_image(filename), small_rgba)
@@ -0,0 +1,103 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+import instapy
+from instapy import cli, io, levels, numpy_filters, tiled
+
+# (filter, parameters) covering every contrast filter
+cases = [
+    ("auto_levels", {}),
+    ("auto_levels", {"clip": 0.05}),
+    ("equalize", {}),
+]
+
+
+def test_levels_lut():
+    histogram = [0] * 256
+    histogram[50] = histogram[100] = histogram[200] = 10
+    lut = levels.levels_lut(histogram)
+    assert (lut[50], lut[100], lut[200]) == (0, 85, 255)
+    # one value only: unchanged
+    assert levels.levels_lut([0] * 100 + [5] + [0] * 155) == list(range(256))
+    with pytest.raises(ValueError):
+        levels.levels_lut(histogram, clip=0.5)
+
+
+def test_levels_lut_clip():
+    histogram = [0] * 256
+    histogram[0] = histogram[255] = 1
+    histogram[50] = histogram[150] = 49
+    # 1% at each end are ignored
+    lut = levels.levels_lut(histogram, clip=0.01)
+    assert (lut[0], lut[50], lut[150], lut[255]) == (0, 0, 255, 255)
+
+
+def test_equalize_lut():
+    histogram = [0] * 256
+    histogram[10] = histogram[11] = histogram[12] = histogram[13] = 25
+    lut = levels.equalize_lut(histogram)
+    assert [lut[v] for v in range(10, 14)] == [0, 85, 170, 255]
+    assert lut == sorted(lut)
+
+
+@pytest.mark.parametrize("implementation", ["python", "bytes", "numba", "parallel"])
+def test_histogram(image, implementation):
+    expected = numpy_filters.numpy_histogram(image)
+    assert expected.shape == (3, 256)
+    assert expected.sum() == 3 * image.shape[0] * image.shape[1]
+    for c in range(3):
+        nt.assert_array_equal(expected[c], np.bincount(image[:, :, c].ravel(), minlength=256))
+    result = instapy.get_filter("histogram", implementation)(image)
+    nt.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("implementation", ["python", "bytes", "numba", "parallel"])
+@pytest.mark.parametrize("filter, params", cases)
+def test_implementations(image, implementation, filter, params):
+    expected = instapy.get_filter(filter, "numpy")(image, **params)
+    result = instapy.get_filter(filter, implementation)(image, **params)
+    assert result.dtype == np.uint8
+    nt.assert_array_equal(result, expected)
+
+
+def test_auto_levels_range():
+    # a low-contrast image
+    image = np.random.randint(100, 150, size=(30, 40, 3), dtype=np.uint8)
+    result = numpy_filters.numpy_auto_levels(image)
+    for c in range(3):
+        assert result[:, :, c].min() == 0
+        assert result[:, :, c].max() == 255
+
+
+def test_equalize_flat_histogram(image):
+    result = numpy_filters.numpy_equalize(image)
+    # equalized values are spread evenly over [0, 255]
+    counts = np.bincount(result[:, :, 0].ravel(), minlength=256)
+    assert np.cumsum(counts)[127] == pytest.approx(counts.sum() / 2, rel=0.05)
+
+
+@pytest.mark.parametrize("implementation", ["numpy", "bytes"])
+@pytest.mark.parametrize("filter, params", cases)
+def test_run_tiled(image, tmp_path, implementation, filter, params):
+    np.save(tmp_path / "in.npy", image)
+    # 7 rows per band
+    tile_bytes = 8 * image.shape[1] * 3 * 7
+    tiled.run_tiled(
+        str(tmp_path / "in.npy"),
+        str(tmp_path / "out.npy"),
+        implementation=implementation,
+        filter=filter,
+        tile_bytes=tile_bytes,
+        **params,
+    )
+    expected = instapy.get_filter(filter, "numpy")(image, **params)
+    nt.assert_array_equal(np.load(tmp_path / "out.npy"), expected)
+
+
+def test_cli(image, tmp_path):
+    io.write_image(image, tmp_path / "in.png")
+    cli.main([str(tmp_path / "in.png"), "-a", "0.01", "-o", str(tmp_path / "out.png")])
+    nt.assert_array_equal(
+        io.read_image(tmp_path / "out.png"), numpy_filters.numpy_auto_levels(image, clip=0.01)
+    )
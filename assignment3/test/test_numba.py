@@ -1,6 +1,9 @@
+from pathlib import Path
+
 from instapy.numba_filters import numba_color2gray, numba_color2sepia
 
 import numpy.testing as nt
+import pytest
 import numpy as np
 from PIL import Image
 
@@ -46,3 +49,35 @@ def test_color2sepia(image, reference_sepia):
         np.clip(image[:, :] @ sepia_matrix.transpose(), 0, 255), result[:, :], atol=1.5
     )
     # according to the sepia matrix
+
+
+@pytest.mark.parametrize("filter", [numba_color2gray, numba_color2sepia])
+def test_float32(image, filter):
+    reference = filter(image)
+    result = filter(image, precision="float32")
+    assert result.shape == image.shape
+    assert result.dtype == np.uint8
+    # float32 rounding may only move values across an integer boundary
+    nt.assert_allclose(result, reference, atol=1)
+    assert np.mean(result != reference) < 0.01
+
+
+# compiles every warmup signature, which takes a while
+@pytest.mark.benchmark
+def test_warmup_covers_read_images():
+    """Images from read_image, and filter results, need no further compilation"""
+    from instapy import io, numba_filters
+
+    numba_filters.warmup()
+    kernels = [
+        numba_filters._color2gray,
+        numba_filters._color2sepia,
+        numba_filters._gaussian_blur,
+        numba_filters._histogram,
+        numba_filters._apply_lut,
+    ]
+    compiled = [len(kernel.signatures) for kernel in kernels]
+    image = io.read_image(Path(__file__).parent / "rain.jpg")
+    numba_filters.numba_gaussian_blur(numba_color2sepia(numba_color2gray(image)))
+    numba_filters.numba_equalize(image)
+    assert [len(kernel.signatures) for kernel in kernels] == compiled
@@ -3,6 +3,7 @@ from instapy.numpy_filters import numpy_color2gray, numpy_color2sepia
 import numpy.testing as nt
 from PIL import Image
 import numpy as np
+import pytest
 
 
 def test_color2gray(image, reference_gray):
@@ -48,6 +49,17 @@ def test_color2sepia(image, reference_sepia):
     nt.assert_allclose(result, reference_sepia)
 
 
+@pytest.mark.parametrize("filter", [numpy_color2gray, numpy_color2sepia])
+def test_float32(image, filter):
+    reference = filter(image)
+    result = filter(image, precision="float32")
+    assert result.shape == image.shape
+    assert result.dtype == np.uint8
+    # float32 rounding may only move values across an integer boundary
+    nt.assert_allclose(result, reference, atol=1)
+    assert np.mean(result != reference) < 0.01
+
+
 if __name__ == "__main__":
     image = np.asarray(Image.open("rain.jpg"))
     test_color2gray(image, 1)
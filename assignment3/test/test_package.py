@@ -53,7 +53,7 @@ def test_dependencies(dep):
 )
 @pytest.mark.parametrize(
     "implementation",
-    ["python", "numpy", "numba"],
+    ["python", "bytes", "numpy", "numba", "parallel"],
 )
 def test_get_filter(filter_name, implementation):
     """Can we load our filter functions"""
@@ -71,3 +71,140 @@ def test_io():
     assert len(image.shape) == 3
     assert image.dtype == np.uint8
     assert image.shape[2] == 3
+
+
+def test_lazy_imports():
+    """Importing the command-line should not import numpy, PIL or numba"""
+    from instapy.startup import heavy_modules, import_times
+
+    for arguments in (["-c", "import instapy.cli"], ["-m", "instapy", "--help"]):
+        times = import_times(arguments)
+        assert "instapy.cli" in times
+        for module in heavy_modules:
+            assert module not in times
+
+
+def test_total_import_time():
+    """Nested imports should not be counted twice in the total"""
+    from instapy.startup import measure, total_import_time
+
+    wall, tree = measure(["-c", "import instapy"])
+    # instapy imports its submodules, counted in its own cumulative time
+    assert (0, "instapy", max(us for _, module, us in tree if module == "instapy")) in tree
+    assert any(depth > 0 for depth, _, _ in tree)
+    total = total_import_time(tree)
+    assert 0 < total / 1e6 <= wall
+
+
+@pytest.mark.parametrize("scale", [2, 3, 2.5])
+def test_io_scale(scale):
+    """Can we read an image scaled down"""
+    from instapy import io
+
+    full = io.read_image(test_dir.joinpath("rain.jpg"))
+    image = io.read_image(test_dir.joinpath("rain.jpg"), scale=scale)
+    assert image.dtype == np.uint8
+    assert image.shape == (int(full.shape[0] / scale), int(full.shape[1] / scale), 3)
+    # the downscaled image should look like the original
+    assert abs(image.mean() - full.mean()) < 2
+
+
+@pytest.mark.parametrize("suffix", [".npy", ".raw"])
+def test_io_raw(tmp_path, suffix):
+    """Raw pixel arrays are stored losslessly, with any value type"""
+    from instapy import io
+
+    rng = np.random.default_rng(1)
+    image = rng.integers(0, 2**16, size=(31, 17, 4), dtype=np.uint16)
+    filename = tmp_path / f"image{suffix}"
+    io.write_image(image, filename)
+    if suffix == ".raw":
+        assert io.sidecar(filename).exists()
+        assert filename.stat().st_size == image.nbytes
+
+    result = io.read_image(filename)
+    assert isinstance(result, np.memmap)
+    assert result.dtype == np.uint16
+    np.testing.assert_array_equal(result, image)
+    # scaling takes the middle pixel of each 2x2 block, without reading the rest
+    np.testing.assert_array_equal(io.read_image(filename, scale=2), image[1::2, 1::2])
+
+
+@pytest.mark.parametrize("scale", [0.5, 1.5, 2, 2.5, 3, 7])
+def test_io_scale_raw_like_pil(tmp_path, scale):
+    """Raw and encoded images are scaled to the same size"""
+    from instapy import io
+
+    image = io.read_image(test_dir.joinpath("rain.jpg"))[:101, :203]
+    io.write_image(image, tmp_path / "image.png")
+    io.write_image(image, tmp_path / "image.npy")
+    encoded = io.read_image(tmp_path / "image.png", scale=scale)
+    raw = io.read_image(tmp_path / "image.npy", scale=scale)
+    assert raw.shape == encoded.shape
+    assert raw.shape == (int(101 / scale), int(203 / scale), 3)
+    # nearest pixels against area averages
+    assert abs(raw.mean() - encoded.mean()) < 2
+
+
+def test_io_scale_converts_after_draft(tmp_path, monkeypatch):
+    """Converted modes are decoded at reduced size before converting"""
+    from PIL import Image
+
+    from instapy import io
+
+    cmyk = Image.fromarray(io.read_image(test_dir.joinpath("rain.jpg"))).convert("CMYK")
+    cmyk.save(tmp_path / "cmyk.jpg")
+    converted = []
+    convert = Image.Image.convert
+
+    def spy(self, mode=None, *args, **kwargs):
+        converted.append(self.size)
+        return convert(self, mode, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, "convert", spy)
+    image = io.read_image(tmp_path / "cmyk.jpg", scale=4)
+    assert image.shape == (100, 150, 3)
+    # decoded at 1/4 size by the JPEG decoder, not converted at full size
+    assert converted == [(150, 100)]
+
+
+@pytest.mark.parametrize("suffix", [".npy", ".raw"])
+def test_cli_raw(tmp_path, suffix):
+    """The command line reads and writes raw files by their extension"""
+    from instapy import cli, io
+    from instapy.numpy_filters import numpy_color2gray, numpy_color2sepia
+
+    image = io.read_image(test_dir.joinpath("rain.jpg"))
+    in_file = tmp_path / f"in{suffix}"
+    out_file = tmp_path / f"out{suffix}"
+    io.write_image(image, in_file)
+    cli.main([str(in_file), "-g", "-o", str(tmp_path / f"gray{suffix}")])
+    cli.main([str(tmp_path / f"gray{suffix}"), "-se", "-o", str(out_file)])
+    np.testing.assert_array_equal(
+        io.read_image(out_file), numpy_color2sepia(numpy_color2gray(image))
+    )
+
+
+def test_cli_unavailable_implementation(monkeypatch, capsys):
+    """Implementations that cannot run are usage errors, not tracebacks"""
+    import instapy
+    from instapy import cli
+
+    rain = str(test_dir.joinpath("rain.jpg"))
+    if "cython" not in instapy.installed_implementations():
+        with pytest.raises(SystemExit):
+            cli.main([rain, "-g", "-i", "cython"])
+        assert "invalid choice: 'cython'" in capsys.readouterr().err
+
+    def not_installed(filter, implementation):
+        raise ImportError("No module named 'numba'")
+
+    # the bytes backend only has the colour filters
+    with pytest.raises(SystemExit):
+        cli.main([rain, "-b", "2", "-i", "bytes"])
+    assert "bytes implementation has no gaussian_blur filter" in capsys.readouterr().err
+
+    monkeypatch.setattr(instapy, "get_filter", not_installed)
+    with pytest.raises(SystemExit):
+        cli.main([rain, "-g", "-i", "numba"])
+    assert "numba implementation is not available" in capsys.readouterr().err
@@ -0,0 +1,35 @@
+import numpy.testing as nt
+import pytest
+
+from instapy import numpy_filters, parallel_filters
+from instapy.parallel_filters import parallel_color2gray, parallel_color2sepia
+
+
+def test_color2gray(image, reference_gray):
+    result = parallel_color2gray(image)
+    assert result.shape == image.shape
+    nt.assert_array_equal(result, numpy_filters.numpy_color2gray(image))
+    nt.assert_allclose(result, reference_gray, atol=1)
+
+
+@pytest.mark.parametrize("k", [1, 0.5])
+def test_color2sepia(image, k):
+    result = parallel_color2sepia(image, k=k, precision="float32")
+    expected = numpy_filters.numpy_color2sepia(image, k=k, precision="float32")
+    nt.assert_array_equal(result, expected)
+
+
+def test_filter_parallel_small_bands(image):
+    # one row per band
+    result = parallel_filters.filter_parallel(
+        numpy_filters.numpy_color2sepia, image, band_bytes=1
+    )
+    nt.assert_array_equal(result, numpy_filters.numpy_color2sepia(image))
+
+
+def test_filter_parallel_errors(image):
+    def fail(band):
+        raise RuntimeError("band failed")
+
+    with pytest.raises(RuntimeError):
+        parallel_filters.filter_parallel(fail, image)
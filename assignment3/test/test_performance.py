@@ -0,0 +1,102 @@
+"""Performance regression tests
+
+Run with `python -m pytest --benchmark`, they are skipped otherwise.
+The budgets are in `perf_thresholds.json`.
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+import instapy
+from instapy import io
+from instapy.benchmark import sample
+from instapy.timing import measure_memory
+
+pytestmark = pytest.mark.benchmark
+
+# the version of perf_thresholds.json this file understands
+thresholds_version = 1
+
+thresholds = json.loads(
+    Path(__file__).absolute().parent.joinpath("perf_thresholds.json").read_text()
+)
+
+
+def cases(budget):
+    """(implementation, filter) pairs of a budget in the thresholds file"""
+    return [
+        (implementation, filter)
+        for implementation, filters in thresholds[budget].items()
+        for filter in filters
+    ]
+
+
+def get_filter(filter, implementation):
+    try:
+        return instapy.get_filter(filter, implementation)
+    except ImportError as e:
+        pytest.skip(f"{implementation} is not available: {e}")
+
+
+@pytest.fixture(scope="module")
+def reference_image():
+    return io.random_image(*thresholds["reference_size"])
+
+
+@pytest.fixture(scope="module")
+def latency_image():
+    return io.random_image(*thresholds["latency_size"])
+
+
+@pytest.fixture(scope="module")
+def reference_times(reference_image):
+    """The fastest of two calls of each pure Python filter"""
+    return {
+        filter: min(sample(get_filter(filter, "python"), reference_image, warmup=0, repeat=2))
+        for filter in ("color2gray", "color2sepia")
+    }
+
+
+def test_thresholds_version():
+    assert thresholds["version"] == thresholds_version
+
+
+@pytest.mark.parametrize("implementation, filter", cases("min_speedup"))
+def test_speedup(implementation, filter, reference_image, reference_times):
+    filter_function = get_filter(filter, implementation)
+    best = min(sample(filter_function, reference_image, warmup=1, repeat=5))
+    speedup = reference_times[filter] / best
+    minimum = thresholds["min_speedup"][implementation][filter]
+    assert speedup >= minimum, f"{speedup=:.0f}x, below {minimum}x"
+
+
+@pytest.mark.parametrize("implementation, filter", cases("max_ms_per_mpix"))
+def test_latency(implementation, filter, latency_image):
+    filter_function = get_filter(filter, implementation)
+    best = min(sample(filter_function, latency_image, warmup=1, repeat=3))
+    megapixels = latency_image.shape[0] * latency_image.shape[1] / 1e6
+    ms_per_mpix = best * 1000 / megapixels
+    maximum = thresholds["max_ms_per_mpix"][implementation][filter]
+    assert ms_per_mpix <= maximum, f"{ms_per_mpix=:.1f}, above {maximum}"
+
+
+@pytest.mark.parametrize("implementation, filter", cases("max_peak_ratio"))
+def test_peak_memory(implementation, filter, latency_image):
+    filter_function = get_filter(filter, implementation)
+    # compile (numba) for the same layout before measuring
+    filter_function(latency_image[:2])
+    peak_ratio = measure_memory(filter_function, latency_image)["peak_ratio"]
+    maximum = thresholds["max_peak_ratio"][implementation][filter]
+    assert peak_ratio <= maximum, f"{peak_ratio=:.2f} image sizes, above {maximum}"
+
+
+@pytest.mark.parametrize("implementation, filter", cases("max_native_allocations"))
+def test_native_allocations(implementation, filter, latency_image):
+    filter_function = get_filter(filter, implementation)
+    filter_function(latency_image[:2])
+    allocations = measure_memory(filter_function, latency_image)["native_allocations"]
+    if allocations is None:
+        pytest.skip("numba allocation statistics are not available")
+    maximum = thresholds["max_native_allocations"][implementation][filter]
+    assert allocations <= maximum, f"{allocations=}, above {maximum}"
@@ -0,0 +1,49 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+import instapy
+from instapy.pipeline import fuse, sepia_matrix
+
+
+def test_fuse_linear_steps():
+    stages = fuse(["color2gray", ("color2sepia", {"k": 0.5}), ("brightness", {"factor": 2})])
+    assert len(stages) == 1
+    matrix, offset = stages[0]
+    sepia, _ = sepia_matrix(0.5)
+    gray = np.array([[0.21, 0.72, 0.07]] * 3)
+    nt.assert_allclose(matrix, 2 * sepia @ gray)
+    nt.assert_allclose(offset, 0)
+
+
+def test_fuse_breaks_at_non_linear_steps():
+    stages = fuse(["color2gray", np.flipud, "color2sepia", "color2gray"])
+    assert len(stages) == 3
+    assert stages[1] == (np.flipud, {})
+
+
+def test_channel_mix_validation():
+    with pytest.raises(ValueError):
+        fuse([("channel_mix", {"matrix": np.eye(2)})])
+
+
+@pytest.mark.parametrize("implementation", ["python", "numpy", "numba"])
+def test_compose_matches_sequential(image, implementation):
+    composed = instapy.compose(
+        [("brightness", {"factor": 0.5}), "color2gray"], implementation
+    )
+    result = composed(image)
+    assert result.shape == image.shape
+    assert result.dtype == np.uint8
+    gray = instapy.get_filter("color2gray", "numpy")
+    expected = gray((image * 0.5).astype(np.uint8))
+    nt.assert_allclose(result, expected, atol=1)
+
+
+@pytest.mark.parametrize("implementation", ["python", "numba"])
+def test_color_matrix(image, implementation):
+    matrix, offset = sepia_matrix(0.3)
+    offset = offset + 10
+    reference = instapy.get_filter("color_matrix", "numpy")(image, matrix, offset)
+    result = instapy.get_filter("color_matrix", implementation)(image, matrix, offset)
+    nt.assert_allclose(result, reference, atol=1)
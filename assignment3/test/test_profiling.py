@@ -0,0 +1,47 @@
+import pstats
+
+from instapy import profiling
+from instapy.numpy_filters import numpy_color2sepia
+
+
+def test_profile_with_cprofile(image, tmp_path, capsys):
+    output = tmp_path / "sepia.prof"
+    profiling.profile_with_cprofile(numpy_color2sepia, image, ncalls=2, output=output)
+    assert "numpy_color2sepia" in capsys.readouterr().out
+    stats = pstats.Stats(str(output))
+    assert any(name == "numpy_color2sepia" for _, _, name in stats.stats)
+
+
+def test_collapsed_stacks(image, tmp_path, capsys):
+    stacks = profiling.collapsed_stacks(numpy_color2sepia, image, ncalls=2)
+    assert "numpy_filters.numpy_color2sepia" in stacks
+    assert all(stack.startswith("numpy_filters.numpy_color2sepia") for stack in stacks)
+    assert "numpy_filters.numpy_color2sepia;builtins.ndarray.astype" in stacks
+
+    output = tmp_path / "sepia.collapsed"
+    profiling.write_collapsed(stacks, output)
+    for line in output.read_text().splitlines():
+        stack, microseconds = line.rsplit(" ", 1)
+        assert stack in stacks
+        assert int(microseconds) >= 0
+
+    profiling.print_hotspots(stacks, top=3)
+    assert "numpy_filters.numpy_color2sepia" in capsys.readouterr().out
+
+
+def test_run_profiles_defaults(capsys):
+    """Every installed implementation and filter is profiled by default"""
+    import instapy
+
+    profiling.run_profiles("cprofile", sizes=[(8, 6)], top=1)
+    out = capsys.readouterr().out
+    for implementation in instapy.installed_implementations():
+        for filter in instapy.filter_names():
+            try:
+                instapy.get_filter(filter, implementation)
+            except (ImportError, AttributeError):
+                assert f"Profiling {implementation} {filter} " not in out
+            else:
+                assert f"Profiling {implementation} {filter} (8x6)" in out
+    assert "Profiling bytes equalize (8x6)" in out
+    assert "Profiling bytes gaussian_blur" not in out
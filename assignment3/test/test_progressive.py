@@ -0,0 +1,66 @@
+import numpy as np
+import numpy.testing as nt
+
+from instapy import cli, io, numpy_filters, progressive
+
+
+def test_iter_progressive_array(image):
+    results = list(progressive.iter_progressive(image, "color2sepia", scales=(4, 2, 1)))
+    assert [scale for scale, _ in results] == [4, 2, 1]
+    nt.assert_array_equal(results[0][1], numpy_filters.numpy_color2sepia(image[::4, ::4]))
+    nt.assert_array_equal(results[-1][1], numpy_filters.numpy_color2sepia(image))
+
+
+def test_iter_progressive_file(image, tmp_path):
+    io.write_image(image, tmp_path / "in.png")
+    np.save(tmp_path / "in.npy", image)
+    height, width = image.shape[:2]
+    for name in ["in.png", "in.npy"]:
+        (_, small), (_, full) = progressive.iter_progressive(str(tmp_path / name))
+        assert abs(small.shape[0] - height / 8) <= 1
+        assert abs(small.shape[1] - width / 8) <= 1
+        nt.assert_array_equal(full, numpy_filters.numpy_color2gray(image))
+
+
+def test_scale_params():
+    assert progressive.scale_params("gaussian_blur", {"sigma": 8}, 4) == {"sigma": 2}
+    assert progressive.scale_params("box_blur", {"radius": 5}, 8) == {"radius": 1}
+    assert progressive.scale_params("color2sepia", {"k": 0.5}, 8) == {"k": 0.5}
+    # the defaults are scaled too
+    assert progressive.scale_params("gaussian_blur", {}, 4) == {"sigma": 0.25}
+    assert progressive.scale_params("box_blur", {}, 0.5) == {"radius": 2}
+
+    def blur(image, radius=6):
+        return image
+
+    assert progressive.scale_params("box_blur", {}, 2, blur) == {"radius": 3}
+
+
+def test_run_filter_preview(image, tmp_path):
+    io.write_image(image, tmp_path / "in.png")
+    out_file = tmp_path / "out.png"
+    previews = []
+
+    def preview(filtered):
+        # called before the full image is written
+        assert not out_file.exists()
+        previews.append(filtered)
+
+    cli.run_filter(
+        str(tmp_path / "in.png"),
+        str(out_file),
+        implementation="numpy",
+        filter="color2sepia",
+        preview=preview,
+        preview_scale=4,
+    )
+    [small] = previews
+    assert small.shape[0] < image.shape[0] / 3
+    nt.assert_array_equal(io.read_image(out_file), numpy_filters.numpy_color2sepia(image))
+
+
+def test_cli_preview(image, tmp_path):
+    io.write_image(image, tmp_path / "in.png")
+    cli.main([str(tmp_path / "in.png"), "-g", "--preview", "-o", str(tmp_path / "out.png")])
+    assert io.read_image(tmp_path / "out.preview.png").shape[0] < image.shape[0] / 7
+    assert io.read_image(tmp_path / "out.png").shape == image.shape
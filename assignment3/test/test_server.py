@@ -0,0 +1,191 @@
+import http.client
+import io as _io
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import numpy.testing as nt
+import pytest
+from PIL import Image
+
+from instapy import numpy_filters, server
+
+
+@pytest.fixture(scope="module")
+def service():
+    with server.FilterService(workers=1, warm=["numpy"]) as service:
+        yield service
+
+
+@pytest.fixture(scope="module")
+def url(service):
+    http = server.make_server(service, port=0)
+    thread = threading.Thread(target=http.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{http.server_address[1]}"
+    http.shutdown()
+    http.server_close()
+
+
+def test_submit(service, image):
+    result = service.submit(image, "color2sepia", "numpy", k=0.5).result()
+    nt.assert_array_equal(result, numpy_filters.numpy_color2sepia(image, k=0.5))
+    with pytest.raises(ValueError):
+        service.submit(image, "color2sepia", "numpy", k=2).result()
+
+
+def test_batching(service, image):
+    # a slow request keeps the worker busy, so the others queue up
+    slow = service.submit(np.zeros((1000, 1000, 3), np.uint8), "gaussian_blur", sigma=5)
+    futures = [service.submit(image, "color2gray") for _ in range(8)]
+    slow.result()
+    for future in futures:
+        nt.assert_array_equal(future.result(), numpy_filters.numpy_color2gray(image))
+    assert service.stats()["mean_batch"] > 1
+
+
+def post(url, body):
+    response = urllib.request.urlopen(urllib.request.Request(url, data=body))
+    return np.asarray(Image.open(_io.BytesIO(response.read())))
+
+
+def test_http(url, image):
+    buffer = _io.BytesIO()
+    Image.fromarray(image).save(buffer, format="PNG")
+    body = buffer.getvalue()
+
+    result = post(f"{url}/filter?name=box_blur&implementation=numpy&radius=2", body)
+    nt.assert_array_equal(result, numpy_filters.numpy_box_blur(image, radius=2))
+
+    for query in ["name=nonexistent", "name=box_blur&radius=-1", "name=sobel&format=nope"]:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post(f"{url}/filter?{query}", body)
+        assert error.value.code == 400
+    with pytest.raises(urllib.error.HTTPError) as error:
+        post(f"{url}/filter", b"not an image")
+    assert error.value.code == 400
+
+    stats = json.loads(urllib.request.urlopen(f"{url}/stats").read())
+    assert stats["requests"] >= 1
+    assert stats["errors"] >= 1
+    latency = stats["http_ms"]
+    assert 0 < latency["p50"] <= latency["p90"] <= latency["p99"] <= latency["max"]
+
+
+def test_http_content_length(service, image):
+    buffer = _io.BytesIO()
+    Image.fromarray(image).save(buffer, format="PNG")
+    body = buffer.getvalue()
+    httpd = server.make_server(service, port=0, max_upload_bytes=len(body))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    def status(length, body=b""):
+        connection = http.client.HTTPConnection(*httpd.server_address[:2], timeout=30)
+        try:
+            connection.putrequest("POST", "/filter?name=color2gray")
+            connection.putheader("Content-Length", length)
+            connection.endheaders(body)
+            return connection.getresponse().status
+        finally:
+            connection.close()
+
+    try:
+        assert status(str(len(body)), body) == 200
+        for length in ["nope", "-1"]:
+            assert status(length) == 400
+        # refused before the body is read
+        assert status(str(len(body) + 1)) == 413
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_request_frees_input_on_failure(image, monkeypatch):
+    created = []
+    SharedMemory = server.shared_memory.SharedMemory
+
+    class FailingOutput(SharedMemory):
+        def __init__(self, *args, **kwargs):
+            if created:
+                raise OSError("no space left for the output")
+            super().__init__(*args, **kwargs)
+            created.append(self.name)
+
+    monkeypatch.setattr(server.shared_memory, "SharedMemory", FailingOutput)
+    with pytest.raises(OSError):
+        server._Request(image, "color2gray", "numpy", {})
+    # the input block was unlinked
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=created[0])
+
+
+class FakeRequest:
+    def __init__(self, name, filter):
+        self.name = name
+        self.filter = filter
+
+    def group(self):
+        return (self.filter,)
+
+
+def test_next_batch_keeps_order():
+    service = server.FilterService(workers=1, batch_window=0)
+    a, b, c, d, e = (
+        FakeRequest(name, filter)
+        for name, filter in zip("abcde", ["gray", "sepia", "gray", "sepia", "gray"])
+    )
+    for request in (b, c, d):
+        service._queue.put(request)
+    assert service._next_batch(a) == [a, c]
+    service._queue.put(e)
+    # the requests left out go first, in the order they came
+    first = service._pending.popleft()
+    assert first is b
+    assert service._next_batch(first) == [b, d]
+    assert list(service._pending) == [e]
+    service._pool.shutdown()
+
+
+def test_worker_failure(image):
+    with server.FilterService(workers=1, warm=[]) as service:
+        http = server.make_server(service, port=0, request_timeout=30)
+        thread = threading.Thread(target=http.serve_forever, daemon=True)
+        thread.start()
+        url = f"http://127.0.0.1:{http.server_address[1]}"
+        try:
+            for process in list(service._pool._processes.values()):
+                process.kill()
+            # the requests fail, rather than wait forever
+            with pytest.raises(Exception):
+                service.submit(image, "color2gray").result(timeout=30)
+            with pytest.raises(Exception):
+                service.submit(image, "color2gray").result(timeout=30)
+
+            buffer = _io.BytesIO()
+            Image.fromarray(image).save(buffer, format="PNG")
+            with pytest.raises(urllib.error.HTTPError) as error:
+                post(f"{url}/filter?name=color2gray", buffer.getvalue())
+            assert error.value.code == 500
+            assert "BrokenProcessPool" in json.loads(error.value.read())["error"]
+        finally:
+            http.shutdown()
+            http.server_close()
+
+
+def test_http_rgba(url):
+    rng = np.random.default_rng(2)
+    rgba = rng.integers(0, 256, size=(20, 30, 4), dtype=np.uint8)
+    buffer = _io.BytesIO()
+    Image.fromarray(rgba).save(buffer, format="PNG")
+
+    result = post(f"{url}/filter?name=color2sepia", buffer.getvalue())
+    assert result.shape == rgba.shape
+    nt.assert_array_equal(result[:, :, 3], rgba[:, :, 3])
+    nt.assert_array_equal(result, numpy_filters.numpy_color2sepia(rgba))
+
+    # JPEG has no alpha, so only the colour channels come back
+    result = post(f"{url}/filter?name=color2sepia&format=jpg", buffer.getvalue())
+    assert result.shape == (20, 30, 3)
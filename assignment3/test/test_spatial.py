@@ -0,0 +1,113 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+import instapy
+from instapy import cli, io, numpy_filters, python_filters, spatial, tiled
+
+# (filter, parameters) covering every spatial filter
+cases = [
+    ("gaussian_blur", {"sigma": 1.5}),
+    ("box_blur", {"radius": 3}),
+    ("sharpen", {"amount": 0.5}),
+    ("sobel", {}),
+]
+
+
+def test_gaussian_kernel():
+    kernel = spatial.gaussian_kernel(2)
+    assert len(kernel) == 2 * spatial.gaussian_radius(2) + 1 == 13
+    assert sum(kernel) == pytest.approx(1)
+    assert kernel == kernel[::-1]
+    with pytest.raises(ValueError):
+        spatial.gaussian_kernel(0)
+
+
+def test_halo():
+    assert spatial.halo("gaussian_blur", sigma=1.5) == 5
+    assert spatial.halo("box_blur", radius=4) == 4
+    assert spatial.halo("sobel", precision="float32") == 1
+    assert spatial.halo("color2gray") == 0
+    with pytest.raises(ValueError):
+        spatial.halo("box_blur", radius=1.5)
+
+
+@pytest.mark.parametrize("implementation", ["numba", "parallel"])
+@pytest.mark.parametrize("filter, params", cases)
+def test_implementations(image, implementation, filter, params):
+    expected = instapy.get_filter(filter, "numpy")(image, **params)
+    result = instapy.get_filter(filter, implementation)(image, **params)
+    assert result.shape == image.shape
+    assert result.dtype == np.uint8
+    nt.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("filter, params", cases)
+def test_python(image, filter, params):
+    # the pure Python filters are slow, use a corner of the image
+    image = image[:30, :40]
+    expected = instapy.get_filter(filter, "numpy")(image, **params)
+    result = instapy.get_filter(filter, "python")(image, **params)
+    nt.assert_allclose(result, expected, atol=1)
+
+
+@pytest.mark.parametrize("filter, params", cases)
+def test_float32(image, filter, params):
+    reference = instapy.get_filter(filter, "numpy")(image, **params)
+    result = instapy.get_filter(filter, "numpy")(image, precision="float32", **params)
+    nt.assert_allclose(result, reference, atol=1)
+
+
+def test_box_blur(image):
+    radius = 2
+    result = numpy_filters.numpy_box_blur(image, radius=radius)
+    # brute-force mean over the square, with repeated edges
+    padded = np.pad(image, ((radius, radius), (radius, radius), (0, 0)), mode="edge")
+    height, width = image.shape[:2]
+    total = sum(
+        padded[i : i + height, j : j + width].astype(int)
+        for i in range(2 * radius + 1)
+        for j in range(2 * radius + 1)
+    )
+    nt.assert_array_equal(result, np.floor(total / 25 + 0.5))
+    # radius 0 is the identity
+    nt.assert_array_equal(python_filters.python_box_blur(image[:5, :5], radius=0), image[:5, :5])
+
+
+def test_flat_image():
+    image = np.full((20, 30, 3), 100, dtype=np.uint8)
+    nt.assert_array_equal(numpy_filters.numpy_gaussian_blur(image, sigma=3), image)
+    nt.assert_array_equal(numpy_filters.numpy_sharpen(image, amount=2), image)
+    assert not numpy_filters.numpy_sobel(image).any()
+
+
+def test_sobel_edge():
+    # a vertical edge from black to white
+    image = np.zeros((10, 10, 3), dtype=np.uint8)
+    image[:, 5:] = 255
+    edges = numpy_filters.numpy_sobel(image)
+    assert (edges[:, 4:6] == 255).all()
+    assert not edges[:, :3].any() and not edges[:, 7:].any()
+
+
+@pytest.mark.parametrize("filter, params", cases)
+def test_tiled(image, filter, params):
+    filter_function = instapy.get_filter(filter, "numpy")
+    halo = spatial.halo(filter, **params)
+    # 7 rows per band
+    tile_bytes = 8 * image.shape[1] * 3 * 7
+    result = tiled.filter_tiled(
+        lambda band: filter_function(band, **params), image, tile_bytes=tile_bytes, halo=halo
+    )
+    nt.assert_array_equal(result, filter_function(image, **params))
+
+
+def test_cli(image, tmp_path):
+    io.write_image(image, tmp_path / "in.png")
+    cli.main([str(tmp_path / "in.png"), "-b", "2", "-o", str(tmp_path / "out.png")])
+    nt.assert_array_equal(
+        io.read_image(tmp_path / "out.png"),
+        numpy_filters.numpy_gaussian_blur(image, sigma=2),
+    )
+    cli.main([str(tmp_path / "in.png"), "--sobel", "-t", "0.05", "-o", str(tmp_path / "out.npy")])
+    nt.assert_array_equal(np.load(tmp_path / "out.npy"), numpy_filters.numpy_sobel(image))
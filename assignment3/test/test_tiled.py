@@ -0,0 +1,42 @@
+import numpy as np
+import numpy.testing as nt
+import pytest
+
+from instapy import io, tiled
+from instapy.numpy_filters import numpy_color2sepia
+
+
+def test_iter_bands():
+    assert list(tiled.iter_bands(10, 4)) == [(0, 4), (4, 8), (8, 10)]
+    assert list(tiled.iter_bands(3, 5)) == [(0, 3)]
+
+
+def test_band_rows(image):
+    row_bytes = 8 * image.shape[1] * 3
+    assert tiled.band_rows(image, tile_bytes=10 * row_bytes) == 10
+    # always at least one row
+    assert tiled.band_rows(image, tile_bytes=1) == 1
+
+
+def test_filter_tiled(image):
+    tile_bytes = 8 * image.shape[1] * 3 * 7
+    result = tiled.filter_tiled(numpy_color2sepia, image, tile_bytes=tile_bytes)
+    nt.assert_array_equal(result, numpy_color2sepia(image))
+
+
+@pytest.mark.parametrize("out_name", ["out.npy", "out.png"])
+def test_run_tiled(image, tmp_path, out_name):
+    np.save(tmp_path / "in.npy", image)
+    out_file = tmp_path / out_name
+    tiled.run_tiled(
+        str(tmp_path / "in.npy"),
+        str(out_file),
+        implementation="numpy",
+        filter="color2sepia",
+        tile_bytes=100_000,
+    )
+    if out_name.endswith(".npy"):
+        result = io.read_image_memmap(out_file)
+    else:
+        result = io.read_image(out_file)
+    nt.assert_array_equal(result, numpy_color2sepia(image))
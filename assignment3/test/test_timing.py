@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from instapy import timing
+from instapy.numba_filters import numba_color2gray
+from instapy.numpy_filters import numpy_color2gray, numpy_color2sepia
+
+
+def test_time_one():
+    assert timing.time_one(sum, [1, 2, 3], calls=2) >= 0
+
+
+@pytest.mark.parametrize("filter", [numpy_color2gray, numpy_color2sepia])
+def test_measure_memory(image, filter):
+    memory = timing.measure_memory(filter, image)
+    # at least the result is allocated, and kept
+    assert memory["peak_bytes"] >= image.nbytes
+    assert memory["retained_bytes"] >= image.nbytes
+    assert memory["peak_ratio"] == memory["peak_bytes"] / image.nbytes
+    # at least the result's data (numpy also keeps a few small cached objects)
+    assert memory["retained_blocks"] >= 1
+
+
+def test_measure_memory_float32(image):
+    # float32 temporaries take half the memory
+    peak64 = timing.measure_memory(numpy_color2sepia, image)["peak_bytes"]
+    peak32 = timing.measure_memory(
+        numpy_color2sepia, image, precision="float32"
+    )["peak_bytes"]
+    assert peak32 < 0.75 * peak64
+
+
+def test_native_statistics_opt_in():
+    """Importing timing should not turn on numba's allocation statistics"""
+    code = "import os, instapy.timing; print(os.environ.get('NUMBA_NRT_STATS'))"
+    env = {k: v for k, v in os.environ.items() if k != "NUMBA_NRT_STATS"}
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True
+    )
+    assert result.stdout.strip() == "None"
+
+
+def test_measure_memory_native(image):
+    numba_color2gray(image)
+    memory = timing.measure_memory(numba_color2gray, image)
+    if memory["native_allocations"] is None:
+        pytest.skip("numba allocation statistics are disabled")
+    assert memory["native_allocations"] > 0
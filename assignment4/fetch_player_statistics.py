@@ -3,25 +3,22 @@
 import os
 import re
 from operator import itemgetter
-from typing import Dict, List
+from typing import Dict, List, Optional
 from urllib.parse import urljoin
 from collections import Counter
 
 import numpy as np
 from bs4 import BeautifulSoup
 from matplotlib import pyplot as plt
-from requesting_urls import get_html
+from page_cache import PageCache
+from requesting_urls import get_html, get_html_many_sync, set_cache
 from time_planner import extract_events
 
 ## --- Task 8, 9 and 10 --- ##
 
-try:
-    import requests_cache
-except ImportError:
-    print("install requests_cache to improve performance")
-    pass
-else:
-    requests_cache.install_cache()
+# keep the fetched pages, compressed, and only download them again
+# when Wikipedia says they changed
+set_cache(PageCache())
 
 base_url = "https://en.wikipedia.org"
 
@@ -39,15 +36,23 @@ def find_best_players(url: str) -> None:
     """
     # gets the teams
     teams = get_teams(url)
-    # Gets the player for every team and stores in dict (get_players)
-    all_players = {team["name"]: get_players(team["url"]) for team in teams}
+    # Gets the player for every team and stores in dict (get_players),
+    # fetching the team pages concurrently
+    team_pages = get_html_many_sync([team["url"] for team in teams])
+    all_players = {
+        team["name"]: get_players(team["url"], html=html)
+        for team, html in zip(teams, team_pages)
+    }
 
     # get player statistics for each player,
-    # using get_player_stats
+    # using get_player_stats, with all player pages fetched concurrently
+    player_urls = [player["url"] for players in all_players.values() for player in players]
+    player_pages = dict(zip(player_urls, get_html_many_sync(player_urls)))
     for team, players in all_players.items():
         print(team)
         for i in range(len(players)):
-            players[i].update(get_player_stats(players[i]["url"], team))
+            html = player_pages[players[i]["url"]]
+            players[i].update(get_player_stats(players[i]["url"], team, html=html))
 
     # at this point, we should have a dict of the form:
     # {
@@ -244,18 +249,20 @@ def get_teams(url: str) -> list:
     ]
 
 
-def get_players(team_url: str) -> list:
+def get_players(team_url: str, html: Optional[str] = None) -> list:
     """Get all the players from a team that were in the roster for semi finals.
 
     arguments:
         team_url (str) : the url for the team
+        html (str, optional) : the team page, if already fetched
     returns:
         player_infos (list) : list of player info dictionaries
             with form: {'name': player name, 'url': player wikipedia page url}
     """
     print(f"Finding players in {team_url}")
 
-    html = get_html(team_url)
+    if html is None:
+        html = get_html(team_url)
     soup = BeautifulSoup(html, "html.parser")
     table = soup.find(id="Roster").find_next("table", {"class": "toccolours"})
 
@@ -283,19 +290,21 @@ def get_players(team_url: str) -> list:
     return players
 
 
-def get_player_stats(player_url: str, team: str) -> dict:
+def get_player_stats(player_url: str, team: str, html: Optional[str] = None) -> dict:
     """Get the player stats for a player in a given team.
     
     arguments:
         player_url (str) : url for the wiki page of player
         team (str) : the name of the team the player plays for
+        html (str, optional) : the player page, if already fetched
     returns:
         stats (dict) : dictionary with the keys (at least): points, assists, and rebounds keys
     """
     print(f"Fetching stats for player in {player_url}")
 
     # Get the table with stats
-    html = get_html(player_url)
+    if html is None:
+        html = get_html(player_url)
     soup = BeautifulSoup(html, "html.parser")
 
     if soup.find(id="NBA") != None:
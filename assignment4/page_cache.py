@@ -0,0 +1,152 @@
+"""Cache of fetched HTML pages, for `requesting_urls.get_html`."""
+
+import math
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+# default cache file, in the working directory
+default_path = "page_cache.sqlite"
+
+# (URL pattern, seconds) pairs: pages whose URL matches a pattern are used
+# without asking the server for that long. Permanent links to one revision
+# of a Wikipedia page never change.
+default_ttls = ((r"[?&]oldid=\d+", math.inf),)
+
+
+@dataclass
+class CachedPage:
+    """A page in the cache.
+
+    Attributes:
+        url (str): the URL the page was requested with
+        final_url (str): the URL the page was served from, after redirects
+        html (str): the page
+        etag (str): the `ETag` header of the response, if any
+        last_modified (str): the `Last-Modified` header of the response, if any
+        fetched (float): when the page was last fetched or revalidated
+    """
+
+    url: str
+    final_url: str
+    html: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched: float
+
+    def validators(self) -> Dict[str, str]:
+        """Headers for a conditional request, answered by a 304 if unchanged."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """A cache of HTML pages in SQLite, stored compressed.
+
+    Pages are used without a request for the TTL of the first pattern
+    their URL matches (`ttls`, else `default_ttl`). After that, they are
+    revalidated with a conditional request, so the server only sends the
+    page again if it changed, and otherwise answers `304 Not Modified`.
+
+    Args:
+        path (str):
+            The SQLite database file, or ':memory:'.
+        ttls (sequence):
+            (regex, seconds) pairs, the first whose pattern is found
+            in a URL gives its time to live.
+        default_ttl (float):
+            Seconds to use other pages without revalidating them.
+            Default: 0, always revalidate.
+        level (int):
+            zlib compression level, 1 (fastest) to 9 (smallest).
+    """
+
+    def __init__(
+        self,
+        path: str = default_path,
+        ttls: Sequence[Tuple[str, float]] = default_ttls,
+        default_ttl: float = 0,
+        level: int = 6,
+    ):
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls]
+        self.default_ttl = default_ttl
+        self.level = level
+        # one connection, shared by the threads of `get_html_many`
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    final_url TEXT,
+                    body BLOB,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched REAL
+                )"""
+            )
+
+    def ttl(self, url: str) -> float:
+        """Seconds to use a page without revalidating it."""
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        """Whether a page can be used without revalidating it."""
+        return time.time() - page.fetched < self.ttl(page.url)
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """Get a page from the cache, fresh or not, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT final_url, body, etag, last_modified, fetched"
+                " FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        final_url, body, etag, last_modified, fetched = row
+        html = zlib.decompress(body).decode("utf-8")
+        return CachedPage(url, final_url, html, etag, last_modified, fetched)
+
+    def put(
+        self,
+        url: str,
+        html: str,
+        final_url: Optional[str] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        """Store a page, replacing any earlier version."""
+        body = zlib.compress(html.encode("utf-8"), self.level)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (url, final_url or url, body, etag, last_modified, time.time()),
+            )
+
+    def touch(self, url: str) -> None:
+        """Mark a page as just revalidated, after a 304."""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE pages SET fetched = ? WHERE url = ?", (time.time(), url)
+            )
+
+    def clear(self) -> None:
+        """Remove all pages."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM pages")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
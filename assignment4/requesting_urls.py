@@ -1,13 +1,117 @@
 """Task 1."""
 
-from typing import Dict, Optional
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from page_cache import PageCache
 
 ## -- Task 1 -- ##
 
+# (connect, read) timeouts in seconds
+default_timeout = (3.05, 30)
+# connections kept open per host, should be at least the number of
+# threads (or concurrent requests) sharing the session
+default_pool_size = 16
+# bytes read from the connection at a time, when streaming
+default_chunk_size = 64 * 1024
+# responses worth retrying: rate limited, or a temporary server error
+retry_statuses = (429, 500, 502, 503, 504)
+
+_session: Optional[requests.Session] = None
+_cache: Optional[PageCache] = None
+
+
+def make_session(
+    pool_size: int = default_pool_size,
+    retries: int = 3,
+    backoff_factor: float = 0.5,
+) -> requests.Session:
+    """Create a session with pooled connections and retries.
+
+    Connections are kept alive and reused, so repeated requests to the
+    same host do not pay for a new TCP (and TLS) handshake each time.
+    Failed connections and `retry_statuses` responses are retried with
+    exponential backoff (`backoff_factor * 2**n` seconds, or as long as
+    a `Retry-After` header asks for).
+
+    Args:
+        pool_size (int):
+            Connections kept open per host, and hosts kept in the pool.
+        retries (int):
+            How many times to retry a request.
+        backoff_factor (float):
+            Base of the waits between retries, in seconds.
+    Returns:
+        session (requests.Session):
+            The session.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=retry_statuses,
+        allowed_methods=["HEAD", "GET"],
+        # return the last response when out of retries, like requests.get
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    # created when called, so an installed requests_cache still applies
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Get the session shared by the scrapers, created on first use."""
+    global _session
+    if _session is None:
+        _session = make_session()
+    return _session
+
+
+def set_session(session: Optional[requests.Session]) -> None:
+    """Replace the shared session, e.g. with one from `make_session`.
+
+    With None, a default session is created on the next request.
+    """
+    global _session
+    _session = session
 
-def get_html(url: str, params: Optional[Dict] = None, output: Optional[str] = None) -> str:
+
+def get_cache() -> Optional[PageCache]:
+    """Get the page cache shared by the scrapers, or None if not caching."""
+    return _cache
+
+
+def set_cache(cache: Optional[PageCache]) -> None:
+    """Cache the pages `get_html` fetches, e.g. in a `page_cache.PageCache()`.
+
+    With None, pages are no longer cached.
+    """
+    global _cache
+    _cache = cache
+
+
+def get_html(
+    url: str,
+    params: Optional[Dict] = None,
+    output: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+    timeout: Union[float, Tuple[float, float]] = default_timeout,
+    cache: Optional[PageCache] = None,
+    stream: bool = False,
+    on_chunk: Optional[Callable[[bytes], None]] = None,
+) -> Optional[str]:
     """Get an HTML page and return its contents.
 
     Args:
@@ -17,22 +121,222 @@ def get_html(url: str, params: Optional[Dict] = None, output: Optional[str] = No
             URL parameters to add.
         output (str, optional):
             (optional) path where output should be saved.
+        session (requests.Session, optional):
+            The session to use. Default: the shared session (`get_session`).
+        timeout (float or tuple, optional):
+            Seconds to wait for the connection and for the response,
+            either one number or (connect, read).
+        cache (PageCache, optional):
+            The cache to use. Default: the shared cache (`set_cache`), if any.
+            Cached pages are used while fresh, and revalidated
+            with a conditional request after that.
+        stream (bool, optional):
+            Write the page to `output` in chunks as it arrives, without
+            holding it in memory, see `download`. Streamed pages are not
+            cached or returned.
+        on_chunk (callable, optional):
+            When streaming, called with each chunk of the page (bytes),
+            e.g. the `feed` method of an incremental parser.
     Returns:
         html (str):
-            The HTML of the page, as text.
+            The HTML of the page, as text, or None when streaming.
     """
-    # passing the optional parameters argument to the get function
-    response = requests.get(url, params=params)
+    if stream:
+        if not output:
+            raise ValueError("Streaming needs an output file")
+        download(
+            url, output, params=params, on_chunk=on_chunk, session=session, timeout=timeout
+        )
+        return None
 
-    html_str = response.text
+    if session is None:
+        session = get_session()
+    if cache is None:
+        cache = _cache
+
+    cached = None
+    headers = {}
+    if cache is not None:
+        # the full URL, with the parameters
+        url = requests.Request("GET", url, params=params).prepare().url
+        params = None
+        cached = cache.get(url)
+        if cached is not None:
+            headers = cached.validators()
+
+    if cached is not None and cache.is_fresh(cached):
+        response_url, html_str = cached.final_url, cached.html
+    else:
+        # passing the optional parameters argument to the get function
+        response = session.get(url, params=params, timeout=timeout, headers=headers)
+        if cached is not None and response.status_code == 304:
+            # unchanged, the server sent no body
+            cache.touch(url)
+            response_url, html_str = cached.final_url, cached.html
+        else:
+            response_url, html_str = response.url, response.text
+            if cache is not None and response.status_code == 200:
+                cache.put(
+                    url,
+                    html_str,
+                    final_url=response.url,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                )
 
     if output:
         # if output is specified, the response txt and url get printed to a
         # txt file with the name in `output`
         with open(output, "w") as outfile:
             print(f"Writing to: {output}")
-            outfile.write(response.url + "\n")
+            outfile.write(response_url + "\n")
             outfile.write(html_str)
 
     return html_str
 
+
+def download(
+    url: str,
+    output: str,
+    params: Optional[Dict] = None,
+    on_chunk: Optional[Callable[[bytes], None]] = None,
+    chunk_size: int = default_chunk_size,
+    session: Optional[requests.Session] = None,
+    timeout: Union[float, Tuple[float, float]] = default_timeout,
+) -> str:
+    """Stream a page to a file, in chunks as it arrives.
+
+    Only one chunk is held in memory at a time, whatever the size of the
+    page. Like `get_html`, the file starts with the URL of the page on its
+    own line, followed by the page, as the server sent it (in the page's
+    own encoding, decompressed).
+
+    Args:
+        url (str):
+            The URL to retrieve.
+        output (str):
+            Path where the page should be saved.
+        params (dict, optional):
+            URL parameters to add.
+        on_chunk (callable, optional):
+            Called with each chunk (bytes) after it is written,
+            e.g. the `feed` method of an incremental parser.
+        chunk_size (int, optional):
+            Bytes to read from the connection at a time.
+        session (requests.Session, optional):
+            The session to use. Default: the shared session (`get_session`).
+        timeout (float or tuple, optional):
+            Seconds to wait for the connection and for each chunk.
+    Returns:
+        url (str):
+            The URL the page was served from, after any redirects.
+    """
+    if session is None:
+        session = get_session()
+    with session.get(url, params=params, timeout=timeout, stream=True) as response:
+        with open(output, "wb") as outfile:
+            print(f"Writing to: {output}")
+            outfile.write(response.url.encode() + b"\n")
+            for chunk in response.iter_content(chunk_size):
+                outfile.write(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+        return response.url
+
+
+## -- Fetching many pages -- ##
+
+# default limits on requests in flight, in total and to any one host
+default_concurrency = 8
+default_per_host = 4
+
+
+async def iter_html_many(
+    urls: Iterable[str],
+    concurrency: int = default_concurrency,
+    per_host: int = default_per_host,
+    session: Optional[requests.Session] = None,
+    timeout: Union[float, Tuple[float, float]] = default_timeout,
+) -> AsyncIterator[Tuple[str, str]]:
+    """Fetch HTML pages concurrently, yielding them as they complete.
+
+    The requests run in a pool of `concurrency` threads sharing the
+    session's pooled connections, with at most `per_host` of them to any
+    one host at a time. The session's pool should be at least `per_host`
+    connections (see `make_session`), or extra connections are closed
+    after use instead of kept alive.
+
+    Args:
+        urls (iterable):
+            The URLs to retrieve.
+        concurrency (int):
+            The most requests in flight at a time.
+        per_host (int):
+            The most requests in flight to any one host at a time.
+        session (requests.Session, optional):
+            The session to use. Default: the shared session (`get_session`).
+        timeout (float or tuple, optional):
+            Seconds to wait for each connection and response, see `get_html`.
+    Yields:
+        (url, html) (tuple):
+            Each URL and the HTML of its page, in the order they complete.
+    """
+    urls = list(urls)
+    if session is None:
+        # create the shared session here, not racing in the threads
+        session = get_session()
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(concurrency)
+    host_limits = defaultdict(partial(asyncio.Semaphore, per_host))
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def fetch(url: str) -> Tuple[str, str]:
+        # wait for the host first, so a request waiting for a busy host
+        # does not hold one of the overall slots
+        async with host_limits[urlsplit(url).netloc], limit:
+            fetch_page = partial(get_html, url, session=session, timeout=timeout)
+            return url, await loop.run_in_executor(executor, fetch_page)
+
+    tasks = [asyncio.ensure_future(fetch(url)) for url in urls]
+    try:
+        for next_page in asyncio.as_completed(tasks):
+            yield await next_page
+    finally:
+        # when stopped early, or on an error, drop the remaining requests
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def get_html_many(
+    urls: Iterable[str],
+    concurrency: int = default_concurrency,
+    per_host: int = default_per_host,
+    session: Optional[requests.Session] = None,
+    timeout: Union[float, Tuple[float, float]] = default_timeout,
+) -> List[str]:
+    """Fetch HTML pages concurrently, see `iter_html_many`.
+
+    Returns:
+        htmls (list):
+            The HTML of each page, in the order of `urls`.
+    """
+    urls = list(urls)
+    pages = {}
+    async for url, html in iter_html_many(
+        urls, concurrency, per_host, session=session, timeout=timeout
+    ):
+        pages[url] = html
+    return [pages[url] for url in urls]
+
+
+def get_html_many_sync(urls: Iterable[str], **kwargs) -> List[str]:
+    """Fetch HTML pages concurrently, from code that is not async.
+
+    Takes the same arguments as `get_html_many`.
+
+    Returns:
+        htmls (list):
+            The HTML of each page, in the order of `urls`.
+    """
+    return asyncio.run(get_html_many(urls, **kwargs))
@@ -5,3 +5,119 @@ assignment4 = Path(__file__).parent.parent.absolute()
 
 # Ensure assignment4 dir is on sys.path
 sys.path.insert(0, str(assignment4))
+
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class LocalHandler(BaseHTTPRequestHandler):
+    """Serves small HTML pages, for testing without the network
+
+    - /page/<name>: a page with <name> in the title
+    - /flaky/<n>: 503 for the first n requests, then a page
+    - /slow/<name>: a page, after 0.1 seconds
+    - /etag/<name>, /modified/<name>: a page with an ETag or Last-Modified
+      header, or 304 Not Modified for a conditional request that matches
+    - /big/<n>: a page of n MiB, sent in 64 KiB writes
+    """
+
+    last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+
+    # keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+    # send the body without waiting for the client to ack the headers
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.requests[self.path] += 1
+        self.server.connections.add(self.client_address)
+        if self.path.startswith("/slow/"):
+            host = self.headers.get("Host")
+            with self.server.lock:
+                self.server.active += 1
+                self.server.max_active = max(self.server.max_active, self.server.active)
+                self.server.host_active[host] += 1
+                self.server.max_host_active[host] = max(
+                    self.server.max_host_active[host], self.server.host_active[host]
+                )
+            time.sleep(0.1)
+            with self.server.lock:
+                self.server.active -= 1
+                self.server.host_active[host] -= 1
+        if self.path.startswith("/big/"):
+            return self.send_big(int(self.path.rsplit("/", 1)[1]))
+        if self.path.startswith("/etag/"):
+            etag = f'"{self.path}-v1"'
+            if self.headers.get("If-None-Match") == etag:
+                return self.send_not_modified()
+            return self.send_page(200, f"<html>{self.path}</html>", ETag=etag)
+        if self.path.startswith("/modified/"):
+            if self.headers.get("If-Modified-Since") == self.last_modified:
+                return self.send_not_modified()
+            html = f"<html>{self.path}</html>"
+            return self.send_page(200, html, **{"Last-Modified": self.last_modified})
+        if self.path.startswith("/flaky/"):
+            failures = int(self.path.rsplit("/", 1)[1])
+            if self.server.requests[self.path] <= failures:
+                return self.send_page(503, "<html>try again</html>")
+        name = self.path.rsplit("/", 1)[1]
+        self.send_page(200, f"<!DOCTYPE html><html><title>{name}</title></html>")
+
+    def send_page(self, status, html, **headers):
+        body = html.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_big(self, mebibytes):
+        piece = b"<p>" + b"x" * (64 * 1024 - 8) + b"</p>\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(16 * mebibytes * len(piece)))
+        self.end_headers()
+        for _ in range(16 * mebibytes):
+            self.wfile.write(piece)
+
+    def send_not_modified(self):
+        self.server.not_modified[self.path] += 1
+        self.send_response(304)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    """A local HTTP server, with its base URL in `server.url`
+
+    `server.requests` counts the requests for each path,
+    `server.not_modified` counts the 304 responses for each path,
+    `server.connections` holds the client addresses seen,
+    `server.max_active` is the most /slow/ requests served at once,
+    and `server.max_host_active` the most for each Host header
+    (e.g. 127.0.0.1:port and localhost:port are two hosts).
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LocalHandler)
+    server.requests = Counter()
+    server.not_modified = Counter()
+    server.connections = set()
+    server.lock = threading.Lock()
+    server.active = server.max_active = 0
+    server.host_active = Counter()
+    server.max_host_active = Counter()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,61 @@
+import math
+
+import pytest
+from page_cache import PageCache
+from requesting_urls import get_html, make_session
+
+
+@pytest.fixture
+def cache():
+    cache = PageCache(":memory:")
+    yield cache
+    cache.close()
+
+
+def test_put_get(cache):
+    html = "<html>" + "spam " * 1000 + "</html>"
+    cache.put("https://example.com/a", html, etag='"1"')
+    page = cache.get("https://example.com/a")
+    assert page.html == html
+    assert page.etag == '"1"'
+    assert page.validators() == {"If-None-Match": '"1"'}
+    assert cache.get("https://example.com/b") is None
+
+    # stored compressed
+    [(size,)] = cache._db.execute("SELECT length(body) FROM pages").fetchall()
+    assert size < len(html) / 10
+
+
+def test_ttl():
+    cache = PageCache(":memory:", ttls=[(r"/static/", 60)], default_ttl=5)
+    assert cache.ttl("https://example.com/static/a.html") == 60
+    assert cache.ttl("https://example.com/other") == 5
+    assert PageCache(":memory:").ttl("https://w.org/w/index.php?title=X&oldid=1") == math.inf
+
+
+@pytest.mark.parametrize("kind", ["etag", "modified"])
+def test_revalidate(local_server, cache, kind):
+    url = f"{local_server.url}/{kind}/page"
+    first = get_html(url, cache=cache)
+    # stale (default TTL 0), so revalidated, and the server sends no body
+    assert get_html(url, cache=cache) == first
+    assert get_html(url, cache=cache) == first
+    assert local_server.requests[f"/{kind}/page"] == 3
+    assert local_server.not_modified[f"/{kind}/page"] == 2
+
+
+def test_fresh_pages_skip_requests(local_server, cache):
+    cache.default_ttl = 60
+    url = f"{local_server.url}/page/fresh"
+    first = get_html(url, cache=cache, params={"x": 1})
+    assert get_html(url, cache=cache, params={"x": 1}) == first
+    assert local_server.requests["/page/fresh?x=1"] == 1
+    # other parameters are another page
+    get_html(url, cache=cache, params={"x": 2})
+    assert local_server.requests["/page/fresh?x=2"] == 1
+
+
+def test_errors_not_cached(local_server, cache):
+    url = f"{local_server.url}/flaky/9"
+    assert "try again" in get_html(url, cache=cache, session=make_session(retries=0))
+    assert cache.get(url) is None
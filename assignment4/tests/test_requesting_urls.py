@@ -1,7 +1,17 @@
 # Test with no params
+import asyncio
+import tracemalloc
+
 import pytest
 from bs4 import BeautifulSoup
-from requesting_urls import get_html
+from requesting_urls import (
+    get_html,
+    get_html_many_sync,
+    get_session,
+    iter_html_many,
+    make_session,
+    set_session,
+)
 
 
 @pytest.mark.parametrize(
@@ -49,3 +59,89 @@ def test_get_html_output(tmpdir):
     assert "<html" in rest
     assert "Higher Level Programming" in rest
     assert rest.strip().endswith("</html>")
+
+
+def test_get_html_local(local_server):
+    html = get_html(f"{local_server.url}/page/Local")
+    assert "<title>Local</title>" in html
+
+
+def test_session_reuses_connections(local_server):
+    session = make_session()
+    for name in "abcde":
+        assert name in get_html(f"{local_server.url}/page/{name}", session=session)
+    # all five requests went over one kept-alive connection
+    assert len(local_server.connections) == 1
+
+
+def test_session_retries(local_server):
+    session = make_session(retries=3, backoff_factor=0)
+    html = get_html(f"{local_server.url}/flaky/2", session=session)
+    assert "<title>2</title>" in html
+    assert local_server.requests["/flaky/2"] == 3
+
+    # out of retries, the last response is returned
+    session = make_session(retries=1, backoff_factor=0)
+    assert "try again" in get_html(f"{local_server.url}/flaky/5", session=session)
+    assert local_server.requests["/flaky/5"] == 2
+
+
+def test_shared_session(local_server):
+    session = make_session()
+    set_session(session)
+    try:
+        assert get_session() is session
+        get_html(f"{local_server.url}/page/shared")
+    finally:
+        set_session(None)
+    assert get_session() is not session
+
+
+def test_get_html_many(local_server):
+    port = local_server.server_address[1]
+    # the same server as two hosts, with 8 pages each
+    hosts = [f"127.0.0.1:{port}", f"localhost:{port}"]
+    urls = [f"http://{host}/slow/{i}" for i in range(8) for host in hosts]
+    pages = get_html_many_sync(urls, concurrency=8, per_host=3)
+    # in order, whatever order they completed in
+    assert [f"<title>{i // 2}</title>" in page for i, page in enumerate(pages)] == [True] * 16
+    # up to the limit of each host at a time, and no more
+    assert dict(local_server.max_host_active) == {host: 3 for host in hosts}
+    assert local_server.max_active == 6
+
+
+def test_iter_html_many(local_server):
+    urls = [f"{local_server.url}/slow/{i}" for i in range(6)]
+
+    async def collect():
+        return [url async for url, _ in iter_html_many(urls, concurrency=2)]
+
+    completed = asyncio.run(collect())
+    assert sorted(completed) == sorted(urls)
+    assert local_server.max_active == 2
+
+
+def test_get_html_stream(local_server, tmp_path):
+    url = f"{local_server.url}/big/16"
+    dest = tmp_path / "big.html"
+    chunks = []
+    tracemalloc.start()
+    try:
+        result = get_html(
+            url, output=str(dest), stream=True, on_chunk=lambda c: chunks.append(len(c))
+        )
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert result is None
+    size = 16 * 2**20
+    assert sum(chunks) == size
+    # one chunk at a time in memory, not the 16 MiB page
+    assert peak < 2**20
+
+    with dest.open("rb") as f:
+        assert f.readline().decode().strip() == url
+        assert len(f.read()) == size
+
+    with pytest.raises(ValueError):
+        get_html(url, stream=True)